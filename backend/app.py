@@ -2,7 +2,16 @@ from flask import Flask
 from flask_cors import CORS
 
 from backend.db import init_app
-from backend.rate_limit import rate_limiter
+from backend.rate_limit import rate_limiter, init_app as init_rate_limit
+from backend.token_cache import init_app as init_token_cache
+from backend.passwords import init_app as init_passwords
+from backend.response_cache import init_app as init_response_cache
+from backend.export import init_app as init_export
+from backend.snapshot import init_app as init_snapshot
+from backend.idempotency import init_app as init_idempotency
+from backend.availability import init_app as init_availability_cache
+from backend.sql_trace import init_app as init_sql_trace
+from backend.request_metrics import prometheus_bp, init_app as init_request_metrics
 
 # Explicit blueprints
 from backend.routes import health_bp, auth_bp
@@ -11,24 +20,26 @@ from backend.routes_doctor import doctor_bp
 from backend.routes_admin import admin_bp
 from backend.metrics import metrics_bp
 
-from flask import g
-
-
-
 
 def create_app():
     app = Flask(__name__)
-    @app.teardown_appcontext
-    def close_db(exception):
-        db = g.pop("db", None)
-        if db is not None:
-            db.close()
     CORS(app)
 
-    # DB wiring ONLY (no schema creation here)
+    # DB wiring ONLY (no schema creation here): connection pool + teardown
     init_app(app)
+    init_sql_trace(app)
+
+    # Infra middleware (request timing first, so it sees rate-limited requests)
+    init_request_metrics(app)
+    init_rate_limit(app)
+    init_token_cache(app)
+    init_passwords(app)
+    init_response_cache(app)
+    init_export(app)
+    init_snapshot(app)
+    init_idempotency(app)
+    init_availability_cache(app)
 
-    # Infra middleware
     @app.before_request
     def apply_rate_limit():
         limited = rate_limiter()
@@ -50,6 +61,7 @@ def create_app():
     app.register_blueprint(doctor_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(metrics_bp)
+    app.register_blueprint(prometheus_bp)
 
     return app
 
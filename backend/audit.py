@@ -0,0 +1,237 @@
+# backend/audit.py
+
+"""
+Appointment audit log: the one place that writes, archives and reads it.
+
+- record() / record_many() append entries inside the caller's write
+  transaction, so an entry commits (or rolls back) with the change it
+  describes; record_many() is a single executemany for batch jobs
+- appointment_audit_logs in the main database only holds the
+  AUDIT_HOT_MONTHS most recent months; a beat job moves closed months,
+  oldest first, to the same table in a separate archive file, so inserts
+  and VACUUM of the main database cost the same however long the history
+- readers attach the archive and query both through union_sql(): the
+  archive and the hot table cover consecutive id ranges, so an ORDER BY
+  on indexed columns merges the two without sorting
+
+Rows are archived only after the daily rollups (backend/rollups.py) have
+applied them.
+"""
+
+import logging
+import os
+import time
+from datetime import date
+
+from backend import job_state, rollups
+from backend.config import (
+    AUDIT_ARCHIVE_PATH,
+    AUDIT_HOT_MONTHS,
+    AUDIT_ARCHIVE_CHUNK_ROWS,
+    AUDIT_ARCHIVE_MAX_CHUNKS_PER_RUN,
+    AUDIT_ARCHIVE_LEASE_SECONDS,
+)
+from backend.db import open_connection, write_transaction
+from backend.export import open_export_connection
+from backend.init_db import get_db_path
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "audit_archive"
+
+COLUMNS = ["id", "appointment_id", "actor_role", "actor_id", "action", "created_at"]
+_SELECT = ", ".join(COLUMNS)
+
+ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archive.appointment_audit_logs (
+        id INTEGER PRIMARY KEY,
+        appointment_id INTEGER NOT NULL,
+        actor_role TEXT NOT NULL,
+        actor_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        created_at DATETIME
+    );
+    CREATE INDEX IF NOT EXISTS archive.idx_audit_created
+        ON appointment_audit_logs (created_at);
+    CREATE INDEX IF NOT EXISTS archive.idx_audit_appointment
+        ON appointment_audit_logs (appointment_id);
+    CREATE INDEX IF NOT EXISTS archive.idx_audit_actor
+        ON appointment_audit_logs (actor_role, actor_id);
+"""
+
+
+# -------------------------
+# writing
+# -------------------------
+def record(db, appointment_id, actor_role, actor_id, action):
+    """
+    Append one entry. Does not commit.
+    """
+    record_many(db, [(appointment_id, actor_role, actor_id, action)])
+
+
+def record_many(db, entries):
+    """
+    Append (appointment_id, actor_role, actor_id, action) entries in one
+    statement. Does not commit.
+    """
+    db.executemany(
+        """
+        INSERT INTO appointment_audit_logs
+        (appointment_id, actor_role, actor_id, action)
+        VALUES (?, ?, ?, ?)
+        """,
+        entries
+    )
+
+
+# -------------------------
+# reading
+# -------------------------
+def archive_path():
+    return AUDIT_ARCHIVE_PATH or f"{get_db_path()}.audit-archive"
+
+
+def archive_exists():
+    """
+    Whether an archive file exists yet; decide once per request and pass
+    the answer to both open_reader() and union_sql().
+    """
+    return os.path.exists(archive_path())
+
+
+def open_reader(archived, db_path=None):
+    """
+    Read-only connection to the main database, with the archive attached
+    as `archive` if `archived`.
+    """
+    conn = open_export_connection(db_path)
+    if archived:
+        conn.execute("ATTACH DATABASE ? AS archive", (f"file:{archive_path()}?mode=ro",))
+    return conn
+
+
+def union_sql(archived, where="1"):
+    """
+    SELECT of every entry matching `where` (with `?` placeholders), from
+    the archive and the hot table. Returns (sql, copies): bind the
+    `where` parameters `copies` times; append ORDER BY / LIMIT as needed.
+    """
+    hot = f"SELECT {_SELECT} FROM main.appointment_audit_logs WHERE {where}"
+    if not archived:
+        return hot, 1
+
+    return (
+        f"""
+        SELECT {_SELECT} FROM archive.appointment_audit_logs WHERE {where}
+        UNION ALL
+        {hot}
+          -- left behind by an interrupted move, already in the archive
+          AND id > (SELECT COALESCE(MAX(id), 0) FROM archive.appointment_audit_logs)
+        """,
+        2,
+    )
+
+
+# -------------------------
+# archiving
+# -------------------------
+def archive_cutoff(today=None):
+    """
+    First day of the oldest month kept hot.
+    """
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - (AUDIT_HOT_MONTHS - 1)
+    return date(months // 12, months % 12 + 1, 1).isoformat()
+
+
+def move_closed_months(conn, cutoff, chunk_rows=AUDIT_ARCHIVE_CHUNK_ROWS, max_chunks=AUDIT_ARCHIVE_MAX_CHUNKS_PER_RUN):
+    """
+    Move entries created before `cutoff` and already rolled up from the
+    hot table to the archive attached to `conn`, in id order, one chunk
+    at a time. Returns how many were moved.
+
+    Transactions are atomic per file only (WAL), so each chunk is first
+    copied to the archive in a transaction that writes only the archive,
+    then deleted from the hot table in a second one. A crash in between
+    leaves the chunk in both files, never in neither: readers skip hot
+    rows the archive already holds, and the next run copies with INSERT
+    OR IGNORE and deletes the same id range again, which finishes the move.
+    """
+    moved = 0
+
+    for _ in range(max_chunks):
+        with write_transaction(conn):
+            rolled_up = job_state.get_watermark(conn, rollups.JOB_NAME) or 0
+            row = conn.execute(
+                """
+                SELECT MAX(id) AS upto, COUNT(*) AS n
+                FROM (
+                    SELECT id
+                    FROM main.appointment_audit_logs
+                    WHERE id <= ?
+                      AND created_at < ?
+                    ORDER BY id
+                    LIMIT ?
+                )
+                """,
+                (rolled_up, cutoff, chunk_rows)
+            ).fetchone()
+
+            if row["n"]:
+                conn.execute(
+                    f"""
+                    INSERT OR IGNORE INTO archive.appointment_audit_logs ({_SELECT})
+                    SELECT {_SELECT} FROM main.appointment_audit_logs WHERE id <= ?
+                    """,
+                    (row["upto"],)
+                )
+
+        if row["n"]:
+            # only once the archive copy is durable
+            with write_transaction(conn):
+                conn.execute(
+                    "DELETE FROM main.appointment_audit_logs WHERE id <= ?",
+                    (row["upto"],)
+                )
+
+        moved += row["n"]
+        if row["n"] < chunk_rows:
+            break
+
+    return moved
+
+
+def archive_closed_months(today=None, db_path=None):
+    """
+    One beat-triggered run: skips if another run holds the job lease,
+    otherwise moves closed months to the archive and records the run.
+    """
+    conn = open_connection(db_path or get_db_path())
+    owner = job_state.new_owner()
+
+    try:
+        if not job_state.acquire_lease(conn, JOB_NAME, owner, AUDIT_ARCHIVE_LEASE_SECONDS):
+            logger.info("audit_archive | skipped, another run holds the lease")
+            return {"skipped": True, "moved": 0}
+
+        start = time.perf_counter()
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path(),))
+            conn.executescript(ARCHIVE_SCHEMA)
+
+            cutoff = archive_cutoff(today)
+            moved = move_closed_months(conn, cutoff)
+            elapsed = time.perf_counter() - start
+            job_state.record_run(conn, JOB_NAME, moved, elapsed)
+        finally:
+            job_state.release_lease(conn, JOB_NAME, owner)
+    finally:
+        conn.close()
+
+    logger.info(
+        "audit_archive | before=%s | moved=%d | elapsed_ms=%.1f",
+        cutoff, moved, elapsed * 1000
+    )
+
+    return {"skipped": False, "moved": moved, "before": cutoff, "elapsed_ms": round(elapsed * 1000, 3)}
@@ -0,0 +1,91 @@
+# backend/availability.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from backend.config import AVAILABILITY_CACHE_TTL_SECONDS, AVAILABILITY_CACHE_SIZE
+
+
+class AvailabilityCache:
+    """
+    Short-TTL, bounded cache of free slots per (doctor_id, day).
+
+    Entries are dropped when a slot of that doctor/day is booked, freed or
+    created in this process; other workers converge within `ttl` seconds.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._entries = OrderedDict()  # (doctor_id, day) -> (expires, slots)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doctor_id, day, now=None):
+        now = time.monotonic() if now is None else now
+        key = (doctor_id, day)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, doctor_id, day, slots, now=None):
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            self._entries[(doctor_id, day)] = (now + self.ttl, slots)
+            self._entries.move_to_end((doctor_id, day))
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doctor_id, day):
+        with self._lock:
+            self._entries.pop((doctor_id, day), None)
+
+    def invalidate_doctor(self, doctor_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doctor_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def get_availability_cache():
+    return current_app.extensions["hms_availability_cache"]
+
+
+def slot_changed(doctor_id, slot_time):
+    """
+    Call after committing a write that frees, books or adds a slot.
+    """
+    get_availability_cache().invalidate(doctor_id, str(slot_time)[:10])
+
+
+def init_app(app):
+    app.extensions["hms_availability_cache"] = AvailabilityCache(
+        AVAILABILITY_CACHE_TTL_SECONDS,
+        AVAILABILITY_CACHE_SIZE,
+    )
@@ -1,14 +1,15 @@
 from celery import Celery
 from celery.schedules import crontab
 from backend.app import create_app
+from backend.config import REDIS_URL
 
 def make_celery():
     app = create_app()
 
     celery = Celery(
         app.import_name,
-        broker="redis://localhost:6379/0",
-        backend="redis://localhost:6379/0",
+        broker=REDIS_URL,
+        backend=REDIS_URL,
     )
 
     # -------------------------------
@@ -30,6 +31,34 @@ def make_celery():
                 "task": "scan_tomorrow_appointments_task",
                 "schedule": crontab(hour=18, minute=0),  # 6 PM IST
             },
+            "reconcile-stats-hourly": {
+                "task": "reconcile_stats_task",
+                "schedule": crontab(minute=5),
+            },
+            "drain-outbox-every-minute": {
+                "task": "drain_outbox_task",
+                "schedule": crontab(),
+            },
+            "roll-up-outcomes-every-5-mins": {
+                "task": "roll_up_outcomes_task",
+                "schedule": crontab(minute="*/5"),
+            },
+            "refresh-analytics-snapshot-every-5-mins": {
+                "task": "refresh_analytics_snapshot_task",
+                "schedule": crontab(minute="*/5"),
+            },
+            "archive-audit-logs-daily": {
+                "task": "archive_audit_logs_task",
+                "schedule": crontab(hour=3, minute=45),
+            },
+            "purge-idempotency-keys-hourly": {
+                "task": "purge_idempotency_keys_task",
+                "schedule": crontab(minute=20),
+            },
+            "purge-refresh-tokens-daily": {
+                "task": "purge_refresh_tokens_task",
+                "schedule": crontab(hour=3, minute=30),
+            },
         },
     )
 
@@ -1,6 +1,133 @@
 # backend/config.py
 
+import os
+
 SECRET_KEY = "hms-dev-secret"
 JWT_ALGO = "HS256"
-JWT_EXP_SECONDS = 3600
+JWT_EXP_SECONDS = 900  # access tokens; clients renew them with a refresh token
+REFRESH_TOKEN_SECONDS = 30 * 24 * 3600
+TOKEN_CACHE_SIZE = int(os.environ.get("HMS_TOKEN_CACHE_SIZE", 10_000))
+
+REDIS_URL = os.environ.get("HMS_REDIS_URL", "redis://localhost:6379/0")
+
+# --- DB CONNECTION POOL ---
+DB_POOL_SIZE = int(os.environ.get("HMS_DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("HMS_DB_POOL_TIMEOUT", 5))
+DB_POOL_MAX_USES = int(os.environ.get("HMS_DB_POOL_MAX_USES", 1000))
+
+# --- PASSWORD HASHING ---
+# KDF jobs running at once per worker process; beyond KDF_MAX_PENDING
+# queued or running jobs, logins get 503 instead of waiting. Kept below
+# DB_POOL_SIZE: logins about to look up or store a hash can then never
+# take every pooled connection.
+KDF_WORKERS = int(os.environ.get("HMS_KDF_WORKERS", 2))
+KDF_MAX_PENDING = max(1, min(
+    int(os.environ.get("HMS_KDF_MAX_PENDING", DB_POOL_SIZE // 2)),
+    DB_POOL_SIZE - 1,
+))
+KDF_TIMEOUT_SECONDS = 5
+
+# --- REQUEST METRICS ---
+# shared directory for merging /metrics across gunicorn workers (optional)
+METRICS_DIR = os.environ.get("HMS_METRICS_DIR")
+METRICS_FLUSH_SECONDS = 5
+
+# --- SQL TRACING ---
+SQL_TRACE_ENABLED = os.environ.get("HMS_SQL_TRACE", "0") == "1"
+SQL_SLOW_MS = float(os.environ.get("HMS_SQL_SLOW_MS", 100))
+SQL_N_PLUS_ONE_THRESHOLD = 10  # same statement this often in one request
+
+# --- RATE LIMITING ---
+RATE_LIMIT_ENABLED = os.environ.get("HMS_RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_WINDOW_SECONDS = 60
+RATE_LIMIT_DEFAULT = 60  # per IP per endpoint per window
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("HMS_RATE_LIMIT_MAX_KEYS", 100_000))
+RATE_LIMIT_PER_IP = None  # optional budget across all endpoints
+
+# "memory" (per process) or "redis" (shared across workers and hosts)
+RATE_LIMIT_BACKEND = os.environ.get("HMS_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.environ.get("HMS_RATE_LIMIT_REDIS_URL", REDIS_URL)
+RATE_LIMIT_REDIS_TIMEOUT = 0.05  # seconds; slow Redis falls back to memory
+RATE_LIMIT_REDIS_RETRY_SECONDS = 5
+
+# Per-endpoint overrides, keyed by Flask endpoint name
+RATE_LIMITS = {
+    "auth.admin_login": 10,
+    "auth.doctor_login": 10,
+    "patient.login_patient": 10,
+    "patient.register_patient": 10,
+}
+
+# --- IDEMPOTENCY KEYS ---
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600  # how long a retry replays the stored response
+IDEMPOTENCY_LOCK_SECONDS = 60  # a reservation whose request died is taken over after this
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("HMS_IDEMPOTENCY_CACHE_SIZE", 10_000))  # responses per process
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# --- AVAILABILITY SEARCH ---
+AVAILABILITY_CACHE_TTL_SECONDS = 30
+AVAILABILITY_CACHE_SIZE = 50_000  # (doctor, day) entries
+AVAILABILITY_MAX_DAYS = 31
+
+# --- RESPONSE CACHE (ETag / conditional GET) ---
+RESPONSE_CACHE_SIZE = int(os.environ.get("HMS_RESPONSE_CACHE_SIZE", 10_000))  # bodies per process
+RESPONSE_CACHE_VERSION_REFRESH_SECONDS = 1  # other processes' writes show up within this
+
+# --- EXPORTS ---
+EXPORT_BATCH_ROWS = 1000  # rows fetched and serialized per chunk
+EXPORT_MAX_CONCURRENT = int(os.environ.get("HMS_EXPORT_MAX_CONCURRENT", 2))  # per process
+
+# --- ANALYTICS SNAPSHOT ---
+# aggregate metrics read a periodic backup copy; older than the max age,
+# they fall back to the live database
+ANALYTICS_SNAPSHOT_PATH = os.environ.get("HMS_ANALYTICS_SNAPSHOT_PATH")  # default: <db path>.analytics
+ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS = float(os.environ.get("HMS_ANALYTICS_SNAPSHOT_MAX_AGE", 900))
+ANALYTICS_SNAPSHOT_PAGES_PER_STEP = 1000  # backup pages copied between pauses
+ANALYTICS_SNAPSHOT_STEP_PAUSE_SECONDS = 0.005
+ANALYTICS_SNAPSHOT_LEASE_SECONDS = 600
+
+# --- EMAIL OUTBOX ---
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_BATCHES_PER_RUN = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_SECONDS = 60  # doubled after every failed attempt
+OUTBOX_LEASE_SECONDS = 600  # claimed rows are retried if never confirmed
+
+# --- SMTP ---
+# point at a local debug server with e.g.
+#   HMS_SMTP_HOST=localhost HMS_SMTP_PORT=1025 HMS_SMTP_STARTTLS=0 HMS_SMTP_AUTH=0
+SMTP_HOST = os.environ.get("HMS_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("HMS_SMTP_PORT", 587))
+SMTP_STARTTLS = os.environ.get("HMS_SMTP_STARTTLS", "1") == "1"
+SMTP_AUTH = os.environ.get("HMS_SMTP_AUTH", "1") == "1"
+SMTP_TIMEOUT_SECONDS = 10
+SMTP_POOL_SIZE = int(os.environ.get("HMS_SMTP_POOL_SIZE", 2))  # sessions per worker process
+SMTP_IDLE_SECONDS = 60  # idle sessions older than this are closed, not reused
+SMTP_MAX_MESSAGES_PER_SESSION = 500  # reconnect afterwards; providers cap this
+
+# --- NO_SHOW SWEEPER ---
+NO_SHOW_GRACE_MINUTES = 15
+NO_SHOW_CHUNK_SIZE = 500  # appointments per short write transaction
+NO_SHOW_MAX_CHUNKS_PER_RUN = 200  # the rest resumes from the watermark next run
+NO_SHOW_LEASE_SECONDS = 300  # a crashed run stops blocking others after this
+
+# --- DAILY ROLLUPS ---
+ROLLUP_CHUNK_ROWS = 5000  # audit log rows per short write transaction
+ROLLUP_MAX_CHUNKS_PER_RUN = 200  # the rest resumes from the watermark next run
+ROLLUP_LEASE_SECONDS = 300
+ROLLUP_MAX_RANGE_DAYS = 3660  # widest /admin/metrics/*no-show-rate range
+ROLLUP_DEFAULT_RANGE_DAYS = 30
+
+# --- AUDIT LOG ARCHIVE ---
+# closed months beyond the most recent AUDIT_HOT_MONTHS move to a separate file
+AUDIT_ARCHIVE_PATH = os.environ.get("HMS_AUDIT_ARCHIVE_PATH")  # default: <db path>.audit-archive
+AUDIT_HOT_MONTHS = int(os.environ.get("HMS_AUDIT_HOT_MONTHS", 2))  # including the current one
+AUDIT_ARCHIVE_CHUNK_ROWS = 5000
+AUDIT_ARCHIVE_MAX_CHUNKS_PER_RUN = 200
+AUDIT_ARCHIVE_LEASE_SECONDS = 600
 
+# --- SCHEMA MIGRATIONS ---
+MIGRATION_CHUNK_ROWS = 1000  # rows copied/backfilled per short write transaction
+MIGRATION_CHUNK_PAUSE_SECONDS = 0.002  # between chunks, lets waiting writers in
+MIGRATION_DIRECT_MAX_ROWS = 20_000  # smaller tables are changed in one statement
+MIGRATION_EST_ROWS_PER_SECOND = 100_000  # dry-run estimates only
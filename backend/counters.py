@@ -0,0 +1,144 @@
+# backend/counters.py
+
+"""
+Incrementally maintained dashboard counters.
+
+A single `stats_counters` row is updated in the same transaction as every
+write that changes one of the numbers, so GET /admin/stats is a one-row
+read. reconcile() recomputes everything from scratch and reports drift.
+"""
+
+from backend.status import Status
+
+COUNTERS = (
+    "total_doctors",
+    "active_doctors",
+    "total_patients",
+    "total_appointments",
+    "active_appointments",
+    "cancelled_appointments",
+    "completed_appointments",
+    "no_show_appointments",
+)
+
+# Source-of-truth queries, used only by reconcile()
+RECOMPUTE_SQL = {
+    "total_doctors": "SELECT COUNT(*) FROM doctors",
+    "active_doctors": "SELECT COUNT(*) FROM doctors WHERE is_blacklisted = 0",
+    "total_patients": "SELECT COUNT(*) FROM users WHERE role = 'patient'",
+    "total_appointments": "SELECT COUNT(*) FROM appointments",
+    "active_appointments": f"SELECT COUNT(*) FROM appointments WHERE status = {Status.BOOKED.sql}",
+    "cancelled_appointments": f"SELECT COUNT(*) FROM appointments WHERE status = {Status.CANCELLED.sql}",
+    "completed_appointments": f"SELECT COUNT(*) FROM appointments WHERE status = {Status.COMPLETED.sql}",
+    "no_show_appointments": f"SELECT COUNT(*) FROM appointments WHERE status = {Status.NO_SHOW.sql}",
+}
+
+STATUS_COUNTERS = {
+    Status.BOOKED: "active_appointments",
+    Status.CANCELLED: "cancelled_appointments",
+    Status.COMPLETED: "completed_appointments",
+    Status.NO_SHOW: "no_show_appointments",
+}
+
+
+def _counter_for(status):
+    if status is None:
+        return None
+    return STATUS_COUNTERS[Status.parse(status)]
+
+
+def bump(db, **deltas):
+    """
+    Add deltas to counters, e.g. bump(db, total_patients=1).
+    Does not commit: callers bump inside their own transaction.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    unknown = set(deltas) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown counters: {sorted(unknown)}")
+
+    assignments = ", ".join(f"{name} = {name} + ?" for name in deltas)
+    db.execute(
+        f"""
+        UPDATE stats_counters
+        SET {assignments}, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+        """,
+        list(deltas.values())
+    )
+
+
+def record_transition(db, old_status, new_status, count=1):
+    """
+    Account for `count` appointments moving old_status -> new_status.
+    old_status=None means the appointments were just created.
+    """
+    deltas = {}
+
+    if old_status is None:
+        deltas["total_appointments"] = count
+
+    old_counter = _counter_for(old_status)
+    new_counter = _counter_for(new_status)
+
+    if old_counter != new_counter:
+        if old_counter:
+            deltas[old_counter] = -count
+        if new_counter:
+            deltas[new_counter] = count
+
+    bump(db, **deltas)
+
+
+def read(db):
+    row = db.execute(
+        f"SELECT {', '.join(COUNTERS)} FROM stats_counters WHERE id = 1"
+    ).fetchone()
+
+    if row is None:
+        return dict.fromkeys(COUNTERS, 0)
+
+    return dict(zip(COUNTERS, row))
+
+
+def recompute(db):
+    return {
+        name: db.execute(sql).fetchone()[0]
+        for name, sql in RECOMPUTE_SQL.items()
+    }
+
+
+def reconcile(db):
+    """
+    Recompute every counter from raw tables, overwrite the stored row
+    and return the drift as {counter: stored - actual} (non-zero only).
+    Commits.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        stored = read(db)
+        actual = recompute(db)
+
+        db.execute("INSERT OR IGNORE INTO stats_counters (id) VALUES (1)")
+        db.execute(
+            f"""
+            UPDATE stats_counters
+            SET {", ".join(f"{name} = ?" for name in COUNTERS)},
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1
+            """,
+            [actual[name] for name in COUNTERS]
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        name: stored[name] - actual[name]
+        for name in COUNTERS
+        if stored[name] != actual[name]
+    }
@@ -1,28 +1,289 @@
 import sqlite3
-from flask import g
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, jsonify
+
+from backend.config import (
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_MAX_USES,
+    SQL_TRACE_ENABLED,
+)
+from backend.init_db import get_db_path
+from backend.sql_trace import TracingConnection
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no pooled connection frees up within the wait timeout."""
+
+
+def open_connection(db_path, trace=False):
+    conn = sqlite3.connect(
+        db_path,
+        check_same_thread=False,
+        factory=TracingConnection if trace else sqlite3.Connection
+    )
+    conn.row_factory = sqlite3.Row
+
+    # --- HARDENING PRAGMAS ---
+    # (one script, applied once per pooled connection, never traced)
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA foreign_keys=ON;
+        PRAGMA temp_store=MEMORY;
+    """)
+
+    return conn
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of long-lived SQLite connections.
+
+    - connections are opened (and PRAGMAs applied) once, then reused
+    - at most `size` connections exist at any time
+    - checkout waits up to `timeout` seconds, then raises PoolTimeout
+    - connections are health-checked on checkout
+    - connections are recycled after `max_uses` checkouts or on error
+    - with `trace`, every connection reports its statements to sql_trace
+    """
+
+    def __init__(self, db_path, size, timeout, max_uses, trace=False):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.trace = trace
+
+        self._idle = deque()
+        self._uses = {}
+        self._open = 0
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def acquire(self):
+        while True:
+            conn = self._checkout()
+
+            if conn is None:
+                conn = self._create()
+
+            try:
+                # untraced: health checks are not application queries
+                sqlite3.Connection.execute(conn, "SELECT 1")
+            except sqlite3.Error:
+                self._discard(conn)
+                continue
+
+            return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._cond:
+            uses = self._uses.get(conn, 0) + 1
+            self._uses[conn] = uses
+
+            if not discard and uses < self.max_uses:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+
+            self._stats["discarded" if discard else "recycled"] += 1
+
+        self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self.size,
+                open=self._open,
+                idle=len(self._idle),
+                in_use=self._open - len(self._idle),
+            )
+
+    def close(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+
+        for conn in idle:
+            self._discard(conn)
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _checkout(self):
+        """
+        Return an idle connection, or None if the caller may open a new one.
+        """
+        with self._cond:
+            self._stats["checkouts"] += 1
+            waited = False
+
+            while not self._idle and self._open >= self.size:
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = time.perf_counter()
+
+                if not self._cond.wait(self.timeout):
+                    self._stats["timeouts"] += 1
+                    self._stats["wait_seconds"] += time.perf_counter() - waited
+                    raise PoolTimeout(
+                        f"No DB connection available within {self.timeout}s"
+                    )
+
+            if waited:
+                self._stats["wait_seconds"] += time.perf_counter() - waited
+
+            if self._idle:
+                return self._idle.pop()
+
+            # reserve the slot before connecting outside the lock
+            self._open += 1
+            return None
+
+    def _create(self):
+        try:
+            conn = open_connection(self.db_path, trace=self.trace)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._uses[conn] = 0
+            self._stats["created"] += 1
+
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+        with self._cond:
+            self._uses.pop(conn, None)
+            self._open -= 1
+            self._cond.notify()
+
+
+def get_pool():
+    return current_app.extensions["hms_db_pool"]
 
-DB_PATH = "hms.db"
 
 def get_db():
     if "db" not in g:
-        conn = sqlite3.connect(
-            DB_PATH,
-            check_same_thread=False
-        )
-        conn.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
 
-        # --- HARDENING PRAGMAS ---
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        conn.execute("PRAGMA foreign_keys=ON;")
-        conn.execute("PRAGMA temp_store=MEMORY;")
+    return g.db
 
-        g.db = conn
 
-    return g.db
+def release_db(exception=None):
+    """
+    Return the request's connection to the pool. Runs at teardown; views
+    also call it before slow work that needs no database (password KDFs),
+    and the next get_db() checks a connection out again.
+    """
+    db = g.pop("db", None)
+    if db is not None:
+        get_pool().release(db, discard=exception is not None)
+
+
+_write_lock_lock = threading.Lock()
+_write_lock = {"acquired": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def write_lock_stats():
+    """
+    Time spent waiting for the SQLite write lock in write_transaction,
+    for this worker process.
+    """
+    with _write_lock_lock:
+        return dict(_write_lock)
+
+
+@contextmanager
+def commit_hook(hook):
+    """
+    Within the block, every write_transaction on the request's connection
+    calls hook(db) just before it commits, so the hook's writes commit or
+    roll back together with the block's. Used by backend/idempotency.py.
+    """
+    hooks = g.setdefault("db_commit_hooks", [])
+    hooks.append(hook)
+    try:
+        yield
+    finally:
+        hooks.remove(hook)
+
+
+def _commit_hooks(db):
+    if not has_app_context() or db is not g.get("db"):
+        return ()
+    return list(g.get("db_commit_hooks", ()))
+
+
+@contextmanager
+def write_transaction(db):
+    """
+    Run a block in one short BEGIN IMMEDIATE transaction.
+
+    The write lock is taken up front, so check-then-write sequences inside
+    the block cannot interleave with other writers. Commits on success,
+    rolls back on any exception (including one from a commit_hook).
+    """
+    start = time.perf_counter()
+    db.execute("BEGIN IMMEDIATE")
+    waited = time.perf_counter() - start
+
+    with _write_lock_lock:
+        _write_lock["acquired"] += 1
+        _write_lock["wait_seconds"] += waited
+        _write_lock["max_wait_seconds"] = max(_write_lock["max_wait_seconds"], waited)
+
+    try:
+        yield db
+        for hook in _commit_hooks(db):
+            hook(db)
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
 
 def init_app(app):
-    # DB is initialized lazily via get_db()
-    # This hook exists only to satisfy app wiring
-    pass
+    app.extensions["hms_db_pool"] = ConnectionPool(
+        get_db_path(),
+        size=DB_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT_SECONDS,
+        max_uses=DB_POOL_MAX_USES,
+        trace=SQL_TRACE_ENABLED,
+    )
+
+    app.teardown_appcontext(release_db)
 
+    @app.errorhandler(PoolTimeout)
+    def pool_exhausted(exc):
+        return jsonify(error="Database busy, retry shortly"), 503
@@ -1,31 +1,263 @@
 import os
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
 
+from backend.config import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_STARTTLS,
+    SMTP_AUTH,
+    SMTP_TIMEOUT_SECONDS,
+    SMTP_POOL_SIZE,
+    SMTP_IDLE_SECONDS,
+    SMTP_MAX_MESSAGES_PER_SESSION,
+)
 
-SMTP_HOST = "smtp.gmail.com"
-SMTP_PORT = 587
 
+class _Session:
+    __slots__ = ("smtp", "last_used", "sent")
 
-def send_email(to_email: str, subject: str, body: str):
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SmtpPool:
     """
-    Send a plain-text email using Gmail SMTP.
-    Credentials are read from environment variables.
+    Authenticated SMTP sessions reused across messages, per worker process.
+
+    At most `size` sessions exist at once; senders beyond that wait.
+    Idle sessions are closed after `idle_timeout` seconds and every session
+    is recycled after `max_messages`. A session that drops mid-send is
+    replaced and the message retried once; if connecting fails, the rest
+    of the batch fails with that error instead of each message waiting
+    out its own connect timeout.
     """
 
+    def __init__(
+        self,
+        host,
+        port,
+        size=SMTP_POOL_SIZE,
+        idle_timeout=SMTP_IDLE_SECONDS,
+        max_messages=SMTP_MAX_MESSAGES_PER_SESSION,
+        starttls=SMTP_STARTTLS,
+        auth=SMTP_AUTH,
+        timeout=SMTP_TIMEOUT_SECONDS,
+        smtp_factory=smtplib.SMTP,
+    ):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.starttls = starttls
+        self.auth = auth
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # most recently used last
+        self._lock = threading.Lock()
+
+        self.connects = 0
+        self.messages = 0
+
+    def send_messages(self, messages):
+        """
+        Send EmailMessages over one session. Returns one entry per message:
+        None if accepted, otherwise the exception that rejected it.
+        """
+        results = []
+        if not messages:
+            return results
+
+        with self._slots:
+            session = self._checkout()
+            try:
+                for msg in messages:
+                    try:
+                        session, error = self._send(session, msg)
+                    except Exception as exc:
+                        # the server is unreachable: don't retry per message
+                        results.extend([exc] * (len(messages) - len(results)))
+                        break
+                    results.append(error)
+            finally:
+                self._checkin(session)
+
+        return results
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            _quit(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "connects": self.connects,
+                "messages": self.messages,
+            }
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _send(self, session, msg):
+        """
+        Send one message, returning (session, error). Connect failures
+        propagate so send_messages can fail the rest of the batch.
+        """
+        for attempt in (1, 2):
+            if session is None:
+                session = self._connect()
+
+            if session.sent >= self.max_messages:
+                _quit(session)
+                session = None
+                continue
+
+            try:
+                session.smtp.send_message(msg)
+            except smtplib.SMTPException as exc:
+                if not isinstance(exc, smtplib.SMTPServerDisconnected):
+                    # refused recipient/sender/data: the session is still fine
+                    return session, exc
+                error = exc
+            except OSError as exc:
+                error = exc
+            else:
+                session.sent += 1
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self.messages += 1
+                return session, None
+
+            # the session is unusable; reconnect and retry the message once
+            _quit(session)
+            session = None
+            if attempt == 2:
+                return None, error
+
+        return session, smtplib.SMTPServerDisconnected("could not send after reconnect")
+
+    def _checkout(self):
+        now = time.monotonic()
+        expired = []
+        session = None
+
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if now - candidate.last_used < self.idle_timeout:
+                    session = candidate
+                    break
+                expired.append(candidate)
+
+            # anything below the newest expired session is older still
+            if expired:
+                expired.extend(self._idle)
+                self._idle = []
+
+        for old in expired:
+            _quit(old)
+
+        # connected lazily by _send
+        return session
+
+    def _checkin(self, session):
+        if session is None:
+            return
+        with self._lock:
+            self._idle.append(session)
+
+    def _connect(self):
+        smtp = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.auth:
+                user, password = _credentials()
+                smtp.login(user, password)
+        except Exception:
+            _quit(_Session(smtp))
+            raise
+
+        with self._lock:
+            self.connects += 1
+        return _Session(smtp)
+
+
+def _quit(session):
+    try:
+        session.smtp.quit()
+    except Exception:
+        try:
+            session.smtp.close()
+        except Exception:
+            pass
+
+
+def _credentials():
     smtp_user = os.getenv("HMS_EMAIL_USER")
     smtp_password = os.getenv("HMS_EMAIL_PASSWORD")
 
     if not smtp_user or not smtp_password:
         raise RuntimeError("Email credentials not configured")
 
+    return smtp_user, smtp_password
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """
+    The pool of this process; a forked worker builds its own instead of
+    sharing its parent's sockets.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SmtpPool(SMTP_HOST, SMTP_PORT)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def build_message(to_email, subject, body):
     msg = EmailMessage()
-    msg["From"] = smtp_user
+    msg["From"] = os.getenv("HMS_EMAIL_FROM") or os.getenv("HMS_EMAIL_USER") or "hms@localhost"
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
+    return msg
+
+
+def send_emails(messages):
+    """
+    Send (to_email, subject, body) tuples over pooled SMTP sessions.
+    Returns one entry per message: None on success, else the exception.
+    """
+    return get_smtp_pool().send_messages(
+        [build_message(to_email, subject, body) for to_email, subject, body in messages]
+    )
+
+
+def send_email(to_email: str, subject: str, body: str):
+    """
+    Send a plain-text email over a pooled SMTP session.
+    Credentials are read from environment variables.
+    """
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.send_message(msg)
+    error = send_emails([(to_email, subject, body)])[0]
+    if error is not None:
+        raise error
@@ -0,0 +1,136 @@
+# backend/export.py
+
+"""
+Streaming CSV / NDJSON exports.
+
+An export reads through its own read-only SQLite connection, never a
+pooled one, so a long export does not hold a pool slot; in WAL mode its
+read snapshot does not block writers either. Rows are fetched
+EXPORT_BATCH_ROWS at a time and each batch is serialized (and optionally
+gzip-compressed) before the next is read, so memory stays flat however
+many rows are exported. At most EXPORT_MAX_CONCURRENT exports run per
+process; further ones get 503.
+"""
+
+import csv
+import io
+import json
+import sqlite3
+import threading
+import zlib
+
+from flask import Response, jsonify
+
+from backend.config import EXPORT_BATCH_ROWS, EXPORT_MAX_CONCURRENT
+from backend.init_db import get_db_path
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+class ExportBusy(RuntimeError):
+    """Raised when EXPORT_MAX_CONCURRENT exports are already running."""
+
+
+def open_export_connection(db_path=None):
+    conn = sqlite3.connect(
+        f"file:{db_path or get_db_path()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def _serialize(cur, columns, fmt, transforms):
+    """
+    Yield one text chunk per fetched batch.
+    """
+    names = [c[0] for c in cur.description]
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    while True:
+        batch = cur.fetchmany(EXPORT_BATCH_ROWS)
+        if not batch:
+            break
+
+        rows = [
+            [transforms[name](value) if name in transforms else value for name, value in zip(names, row)]
+            for row in batch
+        ]
+
+        if fmt == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(sql, params, columns, fmt, filename, gzip=False, transforms=None, db_path=None, connect=None):
+    """
+    Response streaming the rows of `sql`, with `columns` as CSV header /
+    NDJSON keys. `transforms` maps result column names to value converters;
+    `connect` replaces open_export_connection(db_path) to open the
+    read-only connection. Raises ExportBusy if too many exports are running.
+    """
+    if not _slots.acquire(blocking=False):
+        raise ExportBusy("Too many exports in progress")
+
+    conn = None
+    try:
+        conn = connect() if connect else open_export_connection(db_path)
+        cur = conn.execute(sql, params)
+    except BaseException:
+        if conn is not None:
+            conn.close()
+        _slots.release()
+        raise
+
+    chunks = (chunk.encode() for chunk in _serialize(cur, columns, fmt, transforms or {}))
+    if gzip:
+        chunks = _gzip(chunks)
+
+    response = Response(chunks, mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}.{fmt}"
+    if gzip:
+        response.headers["Content-Encoding"] = "gzip"
+
+    closed = []
+
+    def close():
+        # runs once the server is done with the body, finished or aborted
+        if not closed:
+            closed.append(True)
+            conn.close()
+            _slots.release()
+
+    response.call_on_close(close)
+    return response
+
+
+def init_app(app):
+    @app.errorhandler(ExportBusy)
+    def export_busy(exc):
+        response = jsonify(error="Too many exports in progress, retry shortly")
+        response.headers["Retry-After"] = "30"
+        return response, 503
@@ -0,0 +1,94 @@
+# backend/histogram.py
+
+import bisect
+
+# seconds; roughly x2.5 steps from 0.1 ms to 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# plain counts (queries per request, rows, ...)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Not thread-safe: callers lock or shard.
+
+    counts[i] holds observations <= bounds[i]; the last slot is +Inf.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """
+        Estimate the q-quantile (0..1) by interpolating inside its bucket.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+
+        return self.max
+
+    def summary(self, scale=1.0, digits=3):
+        """
+        count/mean/p50/p95/p99/max, values multiplied by `scale`
+        (e.g. 1000 to report seconds as milliseconds).
+        """
+        mean = self.sum / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean": round(mean * scale, digits),
+            "p50": round(self.percentile(0.50) * scale, digits),
+            "p95": round(self.percentile(0.95) * scale, digits),
+            "p99": round(self.percentile(0.99) * scale, digits),
+            "max": round(self.max * scale, digits),
+        }
+
+    def to_dict(self):
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(tuple(data["bounds"]))
+        hist.counts = list(data["counts"])
+        hist.count = data["count"]
+        hist.sum = data["sum"]
+        hist.max = data["max"]
+        return hist
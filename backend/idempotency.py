@@ -0,0 +1,342 @@
+# backend/idempotency.py
+
+"""
+Idempotency-Key support for retried writes (booking, cancels).
+
+The first request with a given key reserves it in idempotency_keys, runs,
+and stores its response there; a retry carrying the same key gets that
+response back (Idempotent-Replayed: true) without touching any domain
+table. Completed entries are also kept in a bounded per-process LRU, so
+a retry storm costs one dict lookup, or one primary-key read in another
+worker.
+
+- keys are scoped per user and expire after IDEMPOTENCY_TTL_SECONDS
+- the same key with a different method, path or body gets 422
+- a retry arriving while the first request still runs gets 409; a
+  reservation whose request died is taken over after
+  IDEMPOTENCY_LOCK_SECONDS
+- 5xx responses are not stored, so the client can retry them
+
+The view's domain write and the key's "applied" mark commit in the same
+transaction (a commit_hook on write_transaction); the response is stored
+right after. A request that dies in between leaves the key applied with
+no response: retries get 409 and never run the write twice. A request
+whose reservation was taken over cannot commit its write at all.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, jsonify, request
+
+from backend.config import (
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_LOCK_SECONDS,
+    IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+)
+from backend.db import commit_hook, get_db, write_transaction
+
+HEADER = "Idempotency-Key"
+
+
+class ReservationLost(RuntimeError):
+    """Raised, rolling the write back, when another request took the key over."""
+
+
+class IdempotencyCache:
+    """
+    Bounded LRU of completed responses:
+    (user_id, key) -> (fingerprint, status, body, mimetype, expires_at).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def get(self, scope, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is None:
+                return None
+            if entry[4] <= now:
+                del self._entries[scope]
+                return None
+
+            self._entries.move_to_end(scope)
+            self.hits += 1
+            return entry
+
+    def put(self, scope, entry):
+        with self._lock:
+            self._entries[scope] = entry
+            self._entries.move_to_end(scope)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "conflicts": self.conflicts,
+            }
+
+
+def get_idempotency_cache():
+    return current_app.extensions["hms_idempotency"]
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.get_data()):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.digest()
+
+
+def _load(db, scope):
+    """
+    Stored response of `scope`, or None if absent, expired or still running.
+    """
+    row = db.execute(
+        """
+        SELECT fingerprint, status_code, body, mimetype,
+               CAST(strftime('%s', expires_at) AS INTEGER) AS expires_at
+        FROM idempotency_keys
+        WHERE user_id = ?
+          AND key = ?
+          AND expires_at > CURRENT_TIMESTAMP
+          AND status_code IS NOT NULL
+        """,
+        scope
+    ).fetchone()
+
+    if row is None:
+        return None
+    return row["fingerprint"], row["status_code"], row["body"], row["mimetype"], row["expires_at"]
+
+
+def _reserve(db, scope, fingerprint):
+    """
+    Claim `scope` for this request: new, expired, or abandoned by a
+    request that never finished. Returns the reservation's locked_until,
+    which identifies it, or None if the key is taken.
+    """
+    with write_transaction(db):
+        row = db.execute(
+            f"""
+            INSERT INTO idempotency_keys (user_id, key, fingerprint, locked_until, expires_at)
+            VALUES (
+                ?, ?, ?,
+                datetime('now', '+{int(IDEMPOTENCY_LOCK_SECONDS)} seconds'),
+                datetime('now', '+{int(IDEMPOTENCY_TTL_SECONDS)} seconds')
+            )
+            ON CONFLICT (user_id, key) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                status_code = NULL,
+                body = NULL,
+                mimetype = NULL,
+                locked_until = excluded.locked_until,
+                expires_at = excluded.expires_at
+            WHERE expires_at <= CURRENT_TIMESTAMP
+               OR (status_code IS NULL AND locked_until <= CURRENT_TIMESTAMP)
+            RETURNING locked_until
+            """,
+            (*scope, fingerprint)
+        ).fetchone()
+
+    return row and row["locked_until"]
+
+
+def _applied_without_response(db, scope):
+    """
+    Whether the write of `scope` committed but its response was never
+    stored (locked_until cleared, no status).
+    """
+    return db.execute(
+        """
+        SELECT 1
+        FROM idempotency_keys
+        WHERE user_id = ?
+          AND key = ?
+          AND status_code IS NULL
+          AND locked_until IS NULL
+          AND expires_at > CURRENT_TIMESTAMP
+        """,
+        scope
+    ).fetchone() is not None
+
+
+class _Reservation:
+    """
+    This request's claim on a key. As a commit hook it marks the key
+    applied inside the view's write transaction, or aborts that
+    transaction if the claim was lost.
+    """
+
+    def __init__(self, scope, token):
+        self.scope = scope
+        self.token = token
+        self.applied = False
+
+    def __call__(self, db):
+        if self.applied:
+            return
+
+        marked = db.execute(
+            """
+            UPDATE idempotency_keys
+            SET locked_until = NULL
+            WHERE user_id = ?
+              AND key = ?
+              AND status_code IS NULL
+              AND locked_until = ?
+            RETURNING 1
+            """,
+            (*self.scope, self.token)
+        ).fetchone()
+
+        if marked is None:
+            raise ReservationLost(f"{HEADER} reservation was taken over")
+        self.applied = True
+
+    def owned(self):
+        """
+        WHERE clause (and params) matching the key row while this request
+        still holds it.
+        """
+        if self.applied:
+            return "user_id = ? AND key = ? AND status_code IS NULL AND locked_until IS NULL", self.scope
+        return "user_id = ? AND key = ? AND status_code IS NULL AND locked_until = ?", (*self.scope, self.token)
+
+
+def _replay(entry, fingerprint):
+    if entry[0] != fingerprint:
+        get_idempotency_cache().count("conflicts")
+        return jsonify(error=f"{HEADER} was already used for a different request"), 422
+
+    response = Response(entry[2], status=entry[1], mimetype=entry[3])
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(fn):
+    """
+    Honour an Idempotency-Key header on a write view. Goes under
+    @require_role: keys are scoped to request.user_id.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify(error=f"{HEADER} longer than {IDEMPOTENCY_KEY_MAX_LENGTH} characters"), 400
+
+        cache = get_idempotency_cache()
+        scope = (int(request.user_id), key)
+        fingerprint = _fingerprint()
+
+        entry = cache.get(scope)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        db = get_db()
+        entry = _load(db, scope)
+        token = None
+        if entry is None:
+            token = _reserve(db, scope, fingerprint)
+            if token is None:
+                # held by another request; it may have finished in the meantime
+                entry = _load(db, scope)
+                if entry is None:
+                    cache.count("conflicts")
+                    if _applied_without_response(db, scope):
+                        return jsonify(
+                            error=f"The request with this {HEADER} was applied but its response was lost; it will not run again"
+                        ), 409
+                    return jsonify(error=f"A request with this {HEADER} is still in progress"), 409
+
+        if entry is not None:
+            cache.count("db_hits")
+            cache.put(scope, entry)
+            return _replay(entry, fingerprint)
+
+        cache.count("misses")
+        reservation = _Reservation(scope, token)
+        try:
+            with commit_hook(reservation):
+                response = current_app.make_response(fn(*args, **kwargs))
+        except ReservationLost:
+            cache.count("conflicts")
+            return jsonify(error=f"A request with this {HEADER} is still in progress"), 409
+        except Exception:
+            _release(db, reservation)
+            raise
+
+        if db.in_transaction:
+            _release(db, reservation)
+            raise RuntimeError(f"{fn.__name__} left a transaction open: write through write_transaction")
+
+        if response.status_code >= 500:
+            # an applied write keeps its mark: retries get 409, not a rerun
+            _release(db, reservation)
+            return response
+
+        body = response.get_data()
+        where, params = reservation.owned()
+        with write_transaction(db):
+            db.execute(
+                f"""
+                UPDATE idempotency_keys
+                SET status_code = ?, body = ?, mimetype = ?, locked_until = NULL
+                WHERE {where}
+                """,
+                (response.status_code, body, response.mimetype, *params)
+            )
+        cache.put(scope, (fingerprint, response.status_code, body, response.mimetype, time.time() + IDEMPOTENCY_TTL_SECONDS))
+        return response
+    return wrapper
+
+
+def _release(db, reservation):
+    """
+    Drop the reservation unless the view's write already committed.
+    """
+    if db.in_transaction:
+        db.rollback()
+    if reservation.applied:
+        return
+
+    where, params = reservation.owned()
+    with write_transaction(db):
+        db.execute(f"DELETE FROM idempotency_keys WHERE {where}", params)
+
+
+def purge_expired(db):
+    return db.execute(
+        "DELETE FROM idempotency_keys WHERE expires_at <= CURRENT_TIMESTAMP"
+    ).rowcount
+
+
+def init_app(app):
+    app.extensions["hms_idempotency"] = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
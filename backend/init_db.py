@@ -2,6 +2,8 @@ import os
 import sqlite3
 from werkzeug.security import generate_password_hash
 
+from backend import counters, migrations
+
 
 def get_db_path():
     return os.environ.get("HMS_DB_PATH", "hms.db")
@@ -12,51 +14,8 @@ def init_db():
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
 
-    cur.executescript("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        role TEXT NOT NULL,
-        is_active INTEGER DEFAULT 1,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-
-    CREATE TABLE IF NOT EXISTS doctors (
-        user_id INTEGER PRIMARY KEY,
-        name TEXT,
-        specialization TEXT,
-        is_blacklisted INTEGER DEFAULT 0,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    );
-
-    CREATE TABLE IF NOT EXISTS doctor_slots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        doctor_id INTEGER NOT NULL,
-        slot_time TEXT NOT NULL,
-        is_booked INTEGER DEFAULT 0,
-        FOREIGN KEY(doctor_id) REFERENCES users(id)
-    );
-
-    CREATE TABLE IF NOT EXISTS appointments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        slot_id INTEGER NOT NULL,
-        patient_id INTEGER NOT NULL,
-        status TEXT NOT NULL DEFAULT 'booked',
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(slot_id) REFERENCES doctor_slots(id),
-        FOREIGN KEY(patient_id) REFERENCES users(id)
-    );
-
-    CREATE TABLE IF NOT EXISTS appointment_audit_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        appointment_id INTEGER NOT NULL,
-        actor_role TEXT NOT NULL,
-        actor_id INTEGER NOT NULL,
-        action TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
+    # schema: backend/migrations/NNNN_*.py, applied in order
+    migrations.migrate(conn)
 
     # seed admin
     cur.execute("SELECT id FROM users WHERE username = 'admin'")
@@ -80,23 +39,11 @@ def init_db():
             (doctor_user_id, "Dr. Test", "General Medicine")
         )
 
-    
-    cur.executescript("""
-    CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
-    CREATE INDEX IF NOT EXISTS idx_users_active ON users(is_active);
-
-    CREATE INDEX IF NOT EXISTS idx_doctors_blacklisted ON doctors(is_blacklisted);
-
-     -- Appointments: only index columns that actually exist
-    CREATE INDEX IF NOT EXISTS idx_appt_created_at ON appointments(created_at);
-    CREATE INDEX IF NOT EXISTS idx_appt_slot ON appointments(slot_id);
-    CREATE INDEX IF NOT EXISTS idx_appt_patient ON appointments(patient_id);
-    CREATE INDEX IF NOT EXISTS idx_appt_status ON appointments(status);
-
-    """)
+    conn.commit()
 
+    # (re)seed dashboard counters from the current data
+    counters.reconcile(conn)
 
-    conn.commit()
     conn.close()
 
 
@@ -0,0 +1,101 @@
+# backend/job_state.py
+
+"""
+Persistent state of periodic jobs: one job_state row per job name.
+
+- lease: a run takes the lease with one conditional UPDATE, so overlapping
+  beat ticks (or a second worker) skip instead of running concurrently;
+  a crashed run's lease simply expires
+- watermark: opaque JSON the job uses to resume where it stopped
+- last run: timing and row counts of the most recent completed run
+"""
+
+import json
+import os
+import socket
+import uuid
+
+from backend.db import write_transaction
+
+
+def new_owner():
+    """
+    A lease owner for one job run: host and pid for the operator, plus a
+    random suffix so two runs in the same process never share a lease.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+
+def acquire_lease(db, name, owner, seconds):
+    """
+    Take (or extend, if `owner` already holds it) the lease of job `name`.
+    Returns False if another owner holds an unexpired lease.
+    """
+    with write_transaction(db):
+        db.execute(
+            "INSERT OR IGNORE INTO job_state (name) VALUES (?)",
+            (name,)
+        )
+        cur = db.execute(
+            f"""
+            UPDATE job_state
+            SET lease_owner = ?,
+                lease_expires_at = datetime('now', '+{int(seconds)} seconds')
+            WHERE name = ?
+              AND (
+                  lease_owner IS NULL
+                  OR lease_owner = ?
+                  OR lease_expires_at <= datetime('now')
+              )
+            """,
+            (owner, name, owner)
+        )
+    return cur.rowcount == 1
+
+
+def release_lease(db, name, owner):
+    with write_transaction(db):
+        db.execute(
+            """
+            UPDATE job_state
+            SET lease_owner = NULL,
+                lease_expires_at = NULL
+            WHERE name = ?
+              AND lease_owner = ?
+            """,
+            (name, owner)
+        )
+
+
+def get_watermark(db, name):
+    row = db.execute(
+        "SELECT watermark FROM job_state WHERE name = ?",
+        (name,)
+    ).fetchone()
+    if row is None or row["watermark"] is None:
+        return None
+    return json.loads(row["watermark"])
+
+
+def set_watermark(db, name, watermark):
+    """
+    Does not commit: call inside the transaction whose work it records.
+    """
+    db.execute(
+        "UPDATE job_state SET watermark = ? WHERE name = ?",
+        (None if watermark is None else json.dumps(watermark), name)
+    )
+
+
+def record_run(db, name, rows, elapsed):
+    with write_transaction(db):
+        db.execute(
+            """
+            UPDATE job_state
+            SET last_run_at = CURRENT_TIMESTAMP,
+                last_run_rows = ?,
+                last_run_ms = ?
+            WHERE name = ?
+            """,
+            (rows, round(elapsed * 1000, 3), name)
+        )
@@ -1,22 +1,35 @@
-from flask import Blueprint, jsonify
-from backend.db import get_db
+from datetime import date, timedelta
+
+from flask import Blueprint, jsonify, request
+from backend import rollups
+from backend.config import ROLLUP_DEFAULT_RANGE_DAYS, ROLLUP_MAX_RANGE_DAYS, SQL_TRACE_ENABLED
+from backend.db import get_db, get_pool, write_lock_stats
+from backend.idempotency import get_idempotency_cache
+from backend.passwords import get_password_hasher
+from backend.response_cache import cached, get_response_cache
+from backend.snapshot import analytics_db, analytics_resources
+from backend.sql_trace import get_sql_trace
+from backend.status import Status
+from backend.request_metrics import get_request_metrics, summarize
 from backend.routes import require_role
+from backend.token_cache import get_token_cache
 
 metrics_bp = Blueprint("metrics", __name__, url_prefix="/admin/metrics")
 
 
 @metrics_bp.route("/no-shows", methods=["GET"])
 @require_role("admin")
+@cached(lambda: analytics_resources("appointments"))
 def no_show_counts():
     """
-    Aggregate count of NO_SHOW appointments
+    Aggregate count of NO_SHOW appointments (analytics snapshot)
     """
-    db = get_db()
+    db = analytics_db()
     row = db.execute(
-        """
+        f"""
         SELECT COUNT(*) AS total_no_shows
         FROM appointments
-        WHERE status = 'NO_SHOW'
+        WHERE status = {Status.NO_SHOW.sql}
         """
     ).fetchone()
 
@@ -27,11 +40,12 @@ def no_show_counts():
 
 @metrics_bp.route("/penalties", methods=["GET"])
 @require_role("admin")
+@cached(lambda: analytics_resources("penalties"))
 def penalties_per_patient():
     """
-    Penalty counts grouped by patient
+    Penalty counts grouped by patient (analytics snapshot)
     """
-    db = get_db()
+    db = analytics_db()
     rows = db.execute(
         """
         SELECT
@@ -54,18 +68,19 @@ def penalties_per_patient():
 
 @metrics_bp.route("/doctor-no-shows", methods=["GET"])
 @require_role("admin")
+@cached(lambda: analytics_resources("appointments"))
 def doctor_no_shows():
     """
-    NO_SHOW counts grouped by doctor
+    NO_SHOW counts grouped by doctor (analytics snapshot)
     """
-    db = get_db()
+    db = analytics_db()
     rows = db.execute(
-        """
+        f"""
         SELECT
             doctor_id,
             COUNT(*) AS no_show_count
         FROM appointments
-        WHERE status = 'NO_SHOW'
+        WHERE status = {Status.NO_SHOW.sql}
         GROUP BY doctor_id
         ORDER BY no_show_count DESC
         """
@@ -78,3 +93,130 @@ def doctor_no_shows():
         }
         for row in rows
     ])
+
+
+def _range_params(args):
+    """
+    (from, to, bucket) of a time-series request, or an error message.
+    `to` is exclusive; the default range is the last
+    ROLLUP_DEFAULT_RANGE_DAYS days up to today.
+    """
+    try:
+        end = date.fromisoformat(args["to"]) if args.get("to") else date.today() + timedelta(days=1)
+        start = (
+            date.fromisoformat(args["from"]) if args.get("from")
+            else end - timedelta(days=ROLLUP_DEFAULT_RANGE_DAYS)
+        )
+    except ValueError:
+        return None, "from / to must be ISO dates (YYYY-MM-DD)"
+
+    if not start < end:
+        return None, "from must be before to"
+    if (end - start).days > ROLLUP_MAX_RANGE_DAYS:
+        return None, f"Range too large (max {ROLLUP_MAX_RANGE_DAYS} days)"
+
+    bucket = args.get("bucket", "day")
+    if bucket not in rollups.BUCKETS:
+        return None, "bucket must be day, week or month"
+
+    return (start.isoformat(), end.isoformat(), bucket), None
+
+
+def _outcome_series(table, key=None):
+    params, error = _range_params(request.args)
+    if error:
+        return jsonify(error=error), 400
+    start, end, bucket = params
+
+    db = get_db()
+    return jsonify(dict(
+        rollups.series(db, table, start, end, bucket, key),
+        **{"from": start, "to": end, "bucket": bucket, "as_of": rollups.last_run(db)}
+    ))
+
+
+@metrics_bp.route("/no-show-rate", methods=["GET"])
+@require_role("admin")
+@cached(lambda: [rollups.ROLLUP_RESOURCE])
+def no_show_rate():
+    """
+    Outcome counts and no-show rate per day / week / month, over all
+    doctors or one (?doctor_id=), from the daily rollups
+    """
+    doctor_id = request.args.get("doctor_id", type=int)
+    return _outcome_series("daily_doctor_outcomes", doctor_id)
+
+
+@metrics_bp.route("/patients/<int:patient_id>/no-show-rate", methods=["GET"])
+@require_role("admin")
+@cached(lambda patient_id: [rollups.ROLLUP_RESOURCE])
+def patient_no_show_rate(patient_id):
+    """
+    One patient's outcome counts and no-show rate per day / week / month,
+    from the daily rollups
+    """
+    return _outcome_series("daily_patient_outcomes", patient_id)
+
+
+@metrics_bp.route("/db-pool", methods=["GET"])
+@require_role("admin")
+def db_pool_stats():
+    """
+    Connection pool usage and write-lock waits for this worker process
+    """
+    return jsonify(dict(get_pool().stats(), write_lock=write_lock_stats()))
+
+
+@metrics_bp.route("/token-cache", methods=["GET"])
+@require_role("admin")
+def token_cache_stats():
+    """
+    Verified-token cache size and hit rate for this worker process
+    """
+    return jsonify(get_token_cache().stats())
+
+
+@metrics_bp.route("/response-cache", methods=["GET"])
+@require_role("admin")
+def response_cache_stats():
+    """
+    ETag / response body cache hit rate for this worker process
+    """
+    return jsonify(get_response_cache().stats())
+
+
+@metrics_bp.route("/idempotency", methods=["GET"])
+@require_role("admin")
+def idempotency_stats():
+    """
+    Idempotency-Key replay counts and LRU size for this worker process
+    """
+    return jsonify(get_idempotency_cache().stats())
+
+
+@metrics_bp.route("/kdf", methods=["GET"])
+@require_role("admin")
+def kdf_stats():
+    """
+    Password-hashing executor load for this worker process
+    """
+    return jsonify(get_password_hasher().stats())
+
+
+@metrics_bp.route("/sql", methods=["GET"])
+@require_role("admin")
+def sql_trace_stats():
+    """
+    Per-endpoint query counts / SQL time and the heaviest statements
+    (requires HMS_SQL_TRACE=1)
+    """
+    return jsonify(enabled=SQL_TRACE_ENABLED, **get_sql_trace().snapshot())
+
+
+@metrics_bp.route("/requests", methods=["GET"])
+@require_role("admin")
+def request_latency():
+    """
+    Latency percentiles and status counts per endpoint, all workers
+    """
+    return jsonify(summarize(get_request_metrics().collect()))
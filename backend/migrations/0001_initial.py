@@ -0,0 +1,152 @@
+# backend/migrations/0001_initial.py
+
+"""
+Baseline: the schema as it stood when versioned migrations were introduced.
+Idempotent, so databases created by the old init_db pass through unchanged.
+"""
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL,
+    is_active INTEGER DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS doctors (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT,
+    specialization TEXT,
+    is_blacklisted INTEGER DEFAULT 0,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS doctor_slots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctor_id INTEGER NOT NULL,
+    slot_time TEXT NOT NULL,
+    end_time TEXT,
+    is_booked INTEGER DEFAULT 0,
+    FOREIGN KEY(doctor_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    slot_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    status INTEGER NOT NULL DEFAULT 1,  -- backend/status.py
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    end_datetime TEXT,
+    FOREIGN KEY(slot_id) REFERENCES doctor_slots(id),
+    FOREIGN KEY(patient_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS appointment_audit_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    appointment_id INTEGER NOT NULL,
+    actor_role TEXT NOT NULL,
+    actor_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS patient_no_show_penalties (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    appointment_id INTEGER NOT NULL UNIQUE,
+    patient_id INTEGER NOT NULL,
+    email_sent INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(appointment_id) REFERENCES appointments(id),
+    FOREIGN KEY(patient_id) REFERENCES users(id)
+);
+
+-- Transactional email outbox, see backend/outbox.py
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME
+);
+
+-- Watermarks and run leases of periodic jobs, see backend/job_state.py
+CREATE TABLE IF NOT EXISTS job_state (
+    name TEXT PRIMARY KEY,
+    watermark TEXT,
+    lease_owner TEXT,
+    lease_expires_at DATETIME,
+    last_run_at DATETIME,
+    last_run_rows INTEGER,
+    last_run_ms REAL
+);
+
+-- Single-row dashboard counters, see backend/counters.py
+CREATE TABLE IF NOT EXISTS stats_counters (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_doctors INTEGER NOT NULL DEFAULT 0,
+    active_doctors INTEGER NOT NULL DEFAULT 0,
+    total_patients INTEGER NOT NULL DEFAULT 0,
+    total_appointments INTEGER NOT NULL DEFAULT 0,
+    active_appointments INTEGER NOT NULL DEFAULT 0,
+    cancelled_appointments INTEGER NOT NULL DEFAULT 0,
+    completed_appointments INTEGER NOT NULL DEFAULT 0,
+    no_show_appointments INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# indexes on the appointment status live in 0002, after the status rebuild
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_users_active ON users(is_active);
+
+CREATE INDEX IF NOT EXISTS idx_doctors_blacklisted ON doctors(is_blacklisted);
+CREATE INDEX IF NOT EXISTS idx_doctors_specialization ON doctors(specialization);
+
+-- Slots: keyset ordering of appointment listings + per-doctor filters
+CREATE INDEX IF NOT EXISTS idx_slots_time ON doctor_slots(slot_time);
+CREATE INDEX IF NOT EXISTS idx_slots_doctor_time ON doctor_slots(doctor_id, slot_time);
+
+-- Availability search: only unbooked slots are indexed
+CREATE INDEX IF NOT EXISTS idx_slots_free ON doctor_slots(doctor_id, slot_time)
+    WHERE is_booked = 0;
+
+-- Penalties: per-patient reporting + unsent-email scan
+CREATE INDEX IF NOT EXISTS idx_penalties_patient ON patient_no_show_penalties(patient_id);
+CREATE INDEX IF NOT EXISTS idx_penalties_unsent ON patient_no_show_penalties(id)
+    WHERE email_sent = 0;
+
+-- Outbox: only rows still waiting to be (re)sent are indexed
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON email_outbox(next_attempt_at)
+    WHERE status IN ('pending', 'sending');
+"""
+
+
+def up(m):
+    m.execute(TABLES)
+
+    # columns added to the first release's tables
+    m.add_column("doctor_slots", "end_time", "TEXT")
+    m.add_column("appointments", "end_datetime", "TEXT")
+
+    # copied from the slot at booking time; backfill older rows
+    m.backfill(
+        "appointments",
+        """
+        end_datetime = (
+            SELECT COALESCE(s.end_time, s.slot_time)
+            FROM doctor_slots s
+            WHERE s.id = appointments.slot_id
+        )
+        """,
+        where="end_datetime IS NULL",
+    )
+
+    m.execute(INDEXES)
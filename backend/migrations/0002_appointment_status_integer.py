@@ -0,0 +1,54 @@
+# backend/migrations/0002_appointment_status_integer.py
+
+"""
+appointments.status as a small integer (backend/status.py) instead of free
+text in mixed spellings, plus partial indexes over the BOOKED subset.
+"""
+
+from backend.migrations import index_sql
+from backend.status import Status, legacy_text_case
+
+APPOINTMENTS = """
+CREATE TABLE {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    slot_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    status INTEGER NOT NULL DEFAULT 1,  -- backend/status.py
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    end_datetime TEXT,
+    FOREIGN KEY(slot_id) REFERENCES doctor_slots(id),
+    FOREIGN KEY(patient_id) REFERENCES users(id)
+)
+"""
+
+# Partial indexes over the hot BOOKED subset: queries must state the same
+# literal (Status.BOOKED.sql) for SQLite to use them
+INDEXES = [
+    ("idx_appt_created_at", ["created_at"], None, False),
+    ("idx_appt_slot", ["slot_id"], None, False),
+    ("idx_appt_patient", ["patient_id"], None, False),
+    ("idx_appt_status", ["status"], None, False),
+    # at most one active booking per slot, enforced by the schema
+    ("uq_appt_slot_active", ["slot_id"], f"status = {Status.BOOKED.sql}", True),
+    # NO_SHOW sweeper: booked appointments in end-time order
+    ("idx_appt_booked_end", ["end_datetime", "id"], f"status = {Status.BOOKED.sql}", False),
+]
+
+
+def up(m):
+    # (no table yet: 0001 creates it with the INTEGER column)
+    if m.columns("appointments").get("status", "INTEGER") != "INTEGER":
+        # unknown spellings map to NULL and abort the copy (NOT NULL)
+        m.rebuild_table(
+            "appointments",
+            APPOINTMENTS,
+            select={"status": legacy_text_case("{row}.status")},
+            indexes=[
+                index_sql(name, "{table}", columns, where, unique)
+                for name, columns, where, unique in INDEXES
+            ],
+        )
+        return
+
+    for name, columns, where, unique in INDEXES:
+        m.create_index(name, "appointments", columns, where=where, unique=unique)
@@ -0,0 +1,32 @@
+# backend/migrations/0003_appointment_doctor_and_date.py
+
+"""
+Denormalize doctor_id and the appointment day onto appointments, so
+per-doctor and per-day queries do not need to join doctor_slots.
+"""
+
+from backend.status import Status
+
+
+def up(m):
+    m.add_column("appointments", "doctor_id", "INTEGER")
+    m.add_column("appointments", "date", "TEXT")
+
+    m.backfill(
+        "appointments",
+        """
+        doctor_id = (SELECT s.doctor_id FROM doctor_slots s WHERE s.id = appointments.slot_id),
+        date = (SELECT substr(s.slot_time, 1, 10) FROM doctor_slots s WHERE s.id = appointments.slot_id)
+        """,
+        where="doctor_id IS NULL AND slot_id IN (SELECT id FROM doctor_slots)",
+    )
+
+    m.create_index("idx_appt_doctor_date", "appointments", ["doctor_id", "date"])
+
+    # reminder scan: tomorrow's booked appointments
+    m.create_index(
+        "idx_appt_booked_date",
+        "appointments",
+        ["date"],
+        where=f"status = {Status.BOOKED.sql}",
+    )
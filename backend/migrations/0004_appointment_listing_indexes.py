@@ -0,0 +1,12 @@
+# backend/migrations/0004_appointment_listing_indexes.py
+
+"""
+Indexes for GET /admin/appointments, which orders by (date, slot_time, id):
+rows come off an appointments index in day order, so only one day's rows
+are ever sorted, whatever the status filter.
+"""
+
+
+def up(m):
+    m.create_index("idx_appt_date", "appointments", ["date"])
+    m.create_index("idx_appt_status_date", "appointments", ["status", "date"])
@@ -0,0 +1,26 @@
+# backend/migrations/0005_refresh_tokens.py
+
+"""
+Refresh tokens (backend/refresh_tokens.py). Only a SHA-256 digest of each
+token is stored; tokens rotated from one login share a family_id.
+"""
+
+
+def up(m):
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_hash BLOB NOT NULL UNIQUE,
+            family_id INTEGER,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            expires_at DATETIME NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            revoked_at DATETIME,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+    """)
+
+    m.create_index("idx_refresh_user", "refresh_tokens", ["user_id"])
+    m.create_index("idx_refresh_family", "refresh_tokens", ["family_id"])
+    m.create_index("idx_refresh_expires", "refresh_tokens", ["expires_at"])
@@ -0,0 +1,18 @@
+# backend/migrations/0006_resource_versions.py
+
+"""
+Versions of cached read resources (backend/response_cache.py). Versions
+come from one increasing sequence, so a process catches up with
+`WHERE version > <highest seen>`.
+"""
+
+
+def up(m):
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS resource_versions (
+            resource TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+    """)
+
+    m.create_index("idx_resource_versions_version", "resource_versions", ["version"])
@@ -0,0 +1,9 @@
+# backend/migrations/0007_audit_log_created_index.py
+
+"""
+Audit log exports filter and order by created_at.
+"""
+
+
+def up(m):
+    m.create_index("idx_audit_created", "appointment_audit_logs", ["created_at"])
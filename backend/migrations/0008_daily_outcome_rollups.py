@@ -0,0 +1,36 @@
+# backend/migrations/0008_daily_outcome_rollups.py
+
+"""
+Daily appointment outcome rollups (backend/rollups.py), per doctor and
+per patient, keyed by the appointment's day. The primary keys serve
+ranges over all doctors; the (id, day) indexes serve one doctor's or
+one patient's series.
+"""
+
+OUTCOME_COLUMNS = """
+    completed INTEGER NOT NULL DEFAULT 0,
+    no_show INTEGER NOT NULL DEFAULT 0,
+    cancelled_by_patient INTEGER NOT NULL DEFAULT 0,
+    cancelled_by_admin INTEGER NOT NULL DEFAULT 0
+"""
+
+
+def up(m):
+    m.execute(f"""
+        CREATE TABLE IF NOT EXISTS daily_doctor_outcomes (
+            day TEXT NOT NULL,
+            doctor_id INTEGER NOT NULL,
+            {OUTCOME_COLUMNS},
+            PRIMARY KEY (day, doctor_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS daily_patient_outcomes (
+            day TEXT NOT NULL,
+            patient_id INTEGER NOT NULL,
+            {OUTCOME_COLUMNS},
+            PRIMARY KEY (day, patient_id)
+        ) WITHOUT ROWID;
+    """)
+
+    m.create_index("idx_doctor_outcomes_doctor_day", "daily_doctor_outcomes", ["doctor_id", "day"])
+    m.create_index("idx_patient_outcomes_patient_day", "daily_patient_outcomes", ["patient_id", "day"])
@@ -0,0 +1,11 @@
+# backend/migrations/0009_audit_log_lookup_indexes.py
+
+"""
+Audit log lookups by appointment and by actor (GET /admin/audit-logs).
+The archive file carries the same indexes (backend/audit.py).
+"""
+
+
+def up(m):
+    m.create_index("idx_audit_appointment", "appointment_audit_logs", ["appointment_id"])
+    m.create_index("idx_audit_actor", "appointment_audit_logs", ["actor_role", "actor_id"])
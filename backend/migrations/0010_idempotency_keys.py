@@ -0,0 +1,25 @@
+# backend/migrations/0010_idempotency_keys.py
+
+"""
+Stored responses of requests sent with an Idempotency-Key header
+(backend/idempotency.py). status_code is NULL while the first request
+runs; expired rows are purged by a beat task.
+"""
+
+
+def up(m):
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint BLOB NOT NULL,
+            status_code INTEGER,
+            body BLOB,
+            mimetype TEXT,
+            locked_until DATETIME,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID;
+    """)
+
+    m.create_index("idx_idempotency_expires", "idempotency_keys", ["expires_at"])
@@ -0,0 +1,467 @@
+# backend/migrations/__init__.py
+
+"""
+Versioned schema migrations.
+
+Migrations are the modules of this package named NNNN_description.py,
+applied in version order. Each defines `up(m)` and changes the schema only
+through the Migrator `m`; applied versions are recorded in schema_version.
+
+Large tables are never locked for long:
+- backfill() updates rows in key-ranged chunks, one short transaction each
+- create_index() on a large table, and rebuild_table(), copy the table in
+  chunks into an unindexed shadow table while triggers mirror concurrent
+  writes, then swap the two and build the final indexes in one
+  transaction; the live table keeps all its indexes until then
+
+Every operation is idempotent, so an interrupted migration is simply run
+again. With dry_run=True operations are not executed; each reports its
+estimated cost instead.
+
+    python -m backend.migrations [--dry-run] [--db PATH]
+"""
+
+import importlib
+import math
+import pkgutil
+import re
+import sqlite3
+import time
+
+from backend.config import (
+    MIGRATION_CHUNK_ROWS,
+    MIGRATION_CHUNK_PAUSE_SECONDS,
+    MIGRATION_DIRECT_MAX_ROWS,
+    MIGRATION_EST_ROWS_PER_SECOND,
+)
+
+_MODULE_NAME = re.compile(r"^(\d{4})_(\w+)$")
+
+SHADOW_SUFFIX = "__migrating"
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def discover():
+    """
+    [(version, module name)] of every migration in this package, in order.
+    """
+    found = {}
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(info.name)
+        if not match:
+            continue
+
+        version = int(match.group(1))
+        if version in found:
+            raise MigrationError(f"Duplicate migration version {version}: {info.name}, {found[version]}")
+        found[version] = info.name
+
+    return sorted(found.items())
+
+
+def index_sql(name, table, columns, where=None, unique=False):
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table}({', '.join(columns)})"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+class Migrator:
+    """
+    Schema operations for one migration. Needs an autocommit connection
+    (isolation_level=None); migrate() sets that up.
+    """
+
+    def __init__(
+        self,
+        conn,
+        dry_run=False,
+        chunk_rows=MIGRATION_CHUNK_ROWS,
+        pause=MIGRATION_CHUNK_PAUSE_SECONDS,
+        direct_max_rows=MIGRATION_DIRECT_MAX_ROWS,
+    ):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.chunk_rows = chunk_rows
+        self.pause = pause
+        self.direct_max_rows = direct_max_rows
+
+        self.plan = []  # dry run: one cost estimate per operation
+
+    # -------------------------
+    # introspection
+    # -------------------------
+    def table_exists(self, table):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)
+        ).fetchone() is not None
+
+    def index_exists(self, name):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+            (name,)
+        ).fetchone() is not None
+
+    def columns(self, table):
+        """
+        {column: declared type (upper-case)}
+        """
+        return {
+            row[1]: (row[2] or "").upper()
+            for row in self.conn.execute(f"PRAGMA table_info({table})")
+        }
+
+    def count(self, table, where=None):
+        if not self.table_exists(table):
+            return 0
+        sql = f"SELECT COUNT(*) FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        return self.conn.execute(sql).fetchone()[0]
+
+    # -------------------------
+    # operations
+    # -------------------------
+    def execute(self, script):
+        """
+        Run cheap, idempotent DDL (CREATE ... IF NOT EXISTS) in one transaction.
+        """
+        if self.dry_run:
+            self._estimate("execute", None, 0, online=False)
+            return
+
+        self.conn.executescript(f"BEGIN IMMEDIATE;\n{script}\nCOMMIT;")
+
+    def add_column(self, table, column, ddl):
+        # a schema-only change in SQLite: no rows are rewritten
+        if column in self.columns(table):
+            return
+
+        if self.dry_run:
+            self._estimate("add_column", f"{table}.{column}", 0, online=False)
+            return
+
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def backfill(self, table, assignments, where, key="id"):
+        """
+        UPDATE table SET <assignments> WHERE <where>, in key-ranged chunks.
+        `where` must stop matching once a row is done, so re-runs resume.
+        """
+        try:
+            rows = self.count(table, where)
+        except sqlite3.OperationalError:
+            if not self.dry_run:
+                raise
+            # planned against the current schema: the column comes from an
+            # earlier step that has not run yet, so every row needs it
+            rows = self.count(table)
+
+        online = rows > self.direct_max_rows
+
+        if self.dry_run:
+            self._estimate("backfill", table, rows, online)
+            return
+        if not rows:
+            return
+
+        sql = f"UPDATE {table} SET {assignments} WHERE ({where})"
+
+        if not online:
+            self._transaction(lambda: self.conn.execute(sql))
+            return
+
+        low, high = self.conn.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}").fetchone()
+        for start in range(low, high + 1, self.chunk_rows):
+            self._transaction(lambda: self.conn.execute(
+                f"{sql} AND {key} >= ? AND {key} < ?",
+                (start, start + self.chunk_rows)
+            ))
+            time.sleep(self.pause)
+
+    def create_index(self, name, table, columns, where=None, unique=False):
+        """
+        Small tables: plain CREATE INDEX. Large ones: online shadow rebuild,
+        so writers wait for one chunk at a time instead of the whole build.
+        """
+        if self.index_exists(name):
+            return
+
+        sql = index_sql(name, table, columns, where, unique)
+        rows = self.count(table)
+
+        if rows <= self.direct_max_rows:
+            if self.dry_run:
+                self._estimate("create_index", name, rows, online=False)
+                return
+            self._transaction(lambda: self.conn.execute(sql))
+            return
+
+        table_sql = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)
+        ).fetchone()[0]
+
+        self.rebuild_table(
+            table,
+            _retarget(table_sql, "TABLE", table),
+            indexes=[_retarget(s, "ON", table) for s in self._index_sqls(table)] + [
+                _retarget(sql, "ON", table)
+            ],
+            key=self._primary_key(table),
+            op="create_index",
+        )
+
+    def rebuild_table(self, table, create_sql, select=None, indexes=(), key="id", op="rebuild_table"):
+        """
+        Replace `table` by one created with `create_sql` (a template using
+        {table} for the name) carrying exactly `indexes` (templates too).
+
+        `select` maps new columns to SQL expressions over the old row,
+        written with {row} as its alias, e.g. {"status": "UPPER({row}.status)"};
+        other columns are copied as they are.
+
+        The new indexes are built on the fully copied shadow inside the
+        swap transaction, under their final names, so readers and writers
+        keep every old index, unique ones included, for the whole copy.
+        """
+        rows = self.count(table)
+        online = rows > self.direct_max_rows
+
+        if self.dry_run:
+            self._estimate(op, table, rows, online)
+            return
+
+        shadow = table + SHADOW_SUFFIX
+        self._drop_shadow(table)
+
+        columns = self._prepare_shadow(table, create_sql)
+        exprs = [(select or {}).get(col, f"{{row}}.{col}") for col in columns]
+
+        if online:
+            high = self._install_triggers(table, shadow, columns, exprs, key)
+            for start in range(0, (high or 0) + 1, self.chunk_rows):
+                self._transaction(lambda: self._copy_chunk(table, shadow, columns, exprs, key, start))
+                time.sleep(self.pause)
+            self._transaction(lambda: self._swap(table, shadow, indexes))
+        else:
+            def copy_and_swap():
+                self._copy_chunk(table, shadow, columns, exprs, key, None)
+                self._swap(table, shadow, indexes)
+            self._transaction(copy_and_swap)
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _transaction(self, work):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work()
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return result
+
+    def _estimate(self, op, target, rows, online):
+        seconds = rows / MIGRATION_EST_ROWS_PER_SECOND
+        chunks = max(1, math.ceil(rows / self.chunk_rows)) if online else 1
+        self.plan.append({
+            "op": op,
+            "target": target,
+            "rows": rows,
+            "mode": "online" if online else "direct",
+            "chunks": chunks,
+            "est_seconds": round(seconds, 3),
+            # longest time writers wait on this operation
+            "est_max_lock_ms": round(seconds / chunks * 1000, 3),
+        })
+
+    def _primary_key(self, table):
+        keys = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})") if row[5]]
+        if len(keys) != 1:
+            raise MigrationError(f"{table}: online rebuild needs a single-column primary key")
+        return keys[0]
+
+    def _index_sqls(self, table):
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)
+            )
+        ]
+
+    def _drop_shadow(self, table):
+        # left behind by an interrupted run: start over
+        shadow = table + SHADOW_SUFFIX
+        self.conn.executescript(f"""
+        BEGIN IMMEDIATE;
+        DROP TRIGGER IF EXISTS {shadow}_ins;
+        DROP TRIGGER IF EXISTS {shadow}_upd;
+        DROP TRIGGER IF EXISTS {shadow}_del;
+        DROP TABLE IF EXISTS {shadow};
+        COMMIT;
+        """)
+
+    def _prepare_shadow(self, table, create_sql):
+        """
+        Create the empty, unindexed shadow table; the live table's indexes
+        are left alone. Returns its columns.
+        """
+        shadow = table + SHADOW_SUFFIX
+        self._transaction(lambda: self.conn.execute(create_sql.format(table=shadow)))
+        return list(self.columns(shadow))
+
+    def _install_triggers(self, table, shadow, columns, exprs, key):
+        """
+        Mirror writes on `table` to `shadow` from now on. Returns the
+        highest rowid present when the triggers took effect: every row
+        above it is inserted through them, so copying up to it is enough.
+        """
+        cols = ", ".join(columns)
+        new_values = ", ".join(e.format(row="NEW") for e in exprs)
+
+        def install():
+            self.conn.execute(f"""
+            CREATE TRIGGER {shadow}_ins AFTER INSERT ON {table} BEGIN
+                INSERT INTO {shadow} ({cols}) VALUES ({new_values});
+            END
+            """)
+            self.conn.execute(f"""
+            CREATE TRIGGER {shadow}_upd AFTER UPDATE ON {table} BEGIN
+                UPDATE {shadow} SET ({cols}) = ({new_values}) WHERE {key} = OLD.{key};
+            END
+            """)
+            self.conn.execute(f"""
+            CREATE TRIGGER {shadow}_del AFTER DELETE ON {table} BEGIN
+                DELETE FROM {shadow} WHERE {key} = OLD.{key};
+            END
+            """)
+            # same transaction: no insert can land between the two
+            return self.conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0]
+
+        return self._transaction(install)
+
+    def _copy_chunk(self, table, shadow, columns, exprs, key, start):
+        """
+        Copy rows with rowid in [start, start + chunk_rows) (all rows if
+        start is None) that the triggers have not already mirrored.
+        """
+        sql = f"""
+            INSERT INTO {shadow} ({", ".join(columns)})
+            SELECT {", ".join(e.format(row="src") for e in exprs)}
+            FROM {table} AS src
+            WHERE NOT EXISTS (SELECT 1 FROM {shadow} n WHERE n.{key} = src.{key})
+        """
+        if start is None:
+            self.conn.execute(sql)
+        else:
+            self.conn.execute(
+                sql + " AND src.rowid >= ? AND src.rowid < ?",
+                (start, start + self.chunk_rows)
+            )
+
+    def _swap(self, table, shadow, indexes=()):
+        """
+        Replace `table` by `shadow` and build `indexes` on it. Runs inside
+        one transaction: the old indexes go with the old table, so the new
+        ones are created under the same names, and a failing build (say, a
+        unique index the converted rows violate) leaves the old table as is.
+        """
+        for suffix in ("ins", "upd", "del"):
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {shadow}_{suffix}")
+        self.conn.execute(f"DROP TABLE {table}")
+        self.conn.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+        for template in indexes:
+            self.conn.execute(template.format(table=table))
+
+
+def _retarget(sql, keyword, table):
+    """
+    Turn stored DDL for `table` into a template with {table} in its place.
+    """
+    if keyword == "TABLE":
+        keyword_re = r"TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    else:
+        keyword_re = rf"{keyword}\s+"
+
+    return re.sub(
+        rf"\b{keyword_re}\"?{re.escape(table)}\"?(?=\s*\()",
+        f"{keyword} {{table}}",
+        sql.replace("{", "{{").replace("}", "}}"),
+        count=1,
+        flags=re.I,
+    )
+
+
+def applied_versions(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return set()
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def migrate(conn, dry_run=False, **options):
+    """
+    Apply pending migrations in order. Returns one report per migration:
+    {version, name, duration_ms} or, for a dry run, {version, name, plan}.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    if conn.in_transaction:
+        conn.execute("COMMIT")
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+
+    try:
+        # a table swap drops and renames referenced tables
+        conn.execute("PRAGMA foreign_keys = OFF")
+
+        if not dry_run:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    duration_ms REAL
+                )
+            """)
+
+        applied = applied_versions(conn)
+        reports = []
+
+        for version, name in discover():
+            if version in applied:
+                continue
+
+            module = importlib.import_module(f"{__name__}.{name}")
+            migrator = Migrator(conn, dry_run=dry_run, **options)
+
+            start = time.perf_counter()
+            module.up(migrator)
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+
+            if dry_run:
+                reports.append({"version": version, "name": name, "plan": migrator.plan})
+                continue
+
+            conn.execute(
+                "INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                (version, name, elapsed_ms)
+            )
+            reports.append({"version": version, "name": name, "duration_ms": elapsed_ms})
+
+        return reports
+    finally:
+        # a failed execute() script can leave its transaction open, and
+        # PRAGMA foreign_keys is a no-op inside one
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.execute(f"PRAGMA foreign_keys = {int(foreign_keys)}")
+        conn.isolation_level = isolation_level
@@ -0,0 +1,25 @@
+# backend/migrations/__main__.py
+
+import argparse
+import json
+import sqlite3
+
+from backend.init_db import get_db_path
+from backend.migrations import migrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument("--db", default=None, help="database file (default: HMS_DB_PATH)")
+    parser.add_argument("--dry-run", action="store_true", help="report estimated cost only")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db or get_db_path())
+    try:
+        print(json.dumps(migrate(conn, dry_run=args.dry_run), indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
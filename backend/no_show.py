@@ -1,10 +1,31 @@
 # backend/no_show.py
 
+import logging
+import time
 from datetime import datetime, timedelta
-from backend.db import get_db
 
+from backend import audit, counters, job_state
+from backend.config import (
+    NO_SHOW_GRACE_MINUTES,
+    NO_SHOW_CHUNK_SIZE,
+    NO_SHOW_MAX_CHUNKS_PER_RUN,
+    NO_SHOW_LEASE_SECONDS,
+)
+from backend.db import get_db, write_transaction
+from backend.response_cache import appointments_changed
+from backend.status import Status
 
-def mark_no_show_appointments(now: datetime, grace_minutes: int) -> int:
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "no_show_sweep"
+
+
+def mark_no_show_appointments(
+    now: datetime,
+    grace_minutes: int,
+    chunk_size: int = NO_SHOW_CHUNK_SIZE,
+    max_chunks: int = NO_SHOW_MAX_CHUNKS_PER_RUN,
+) -> int:
     """
     Mark eligible appointments as NO_SHOW.
 
@@ -15,64 +36,91 @@ def mark_no_show_appointments(now: datetime, grace_minutes: int) -> int:
     - idempotent (safe to run repeatedly)
     - audit written only on successful transition
 
+    Work is done in chunks of `chunk_size` appointments, each in its own
+    short write transaction, walking idx_appt_booked_end in
+    (end_datetime, id) order. The position is persisted as the job
+    watermark after every chunk, so a run cut off by `max_chunks` (or a
+    crash) resumes there; a run that catches up clears it.
+
     Returns:
         int: number of appointments marked as NO_SHOW
     """
 
     db = get_db()
 
-    cutoff = now - timedelta(minutes=grace_minutes)
-
-    # Find eligible appointments
-    rows = db.execute(
-        """
-        SELECT id
-        FROM appointments
-        WHERE status = 'BOOKED'
-          AND end_datetime < ?
-        """,
-        (cutoff.isoformat(),)
-    ).fetchall()
-
-    if not rows:
-        return 0
-
-    appointment_ids = [row["id"] for row in rows]
-
-    # Update appointments to NO_SHOW
-    db.executemany(
-        """
-        UPDATE appointments
-        SET status = 'NO_SHOW'
-        WHERE id = ?
-          AND status = 'BOOKED'
-        """,
-        [(aid,) for aid in appointment_ids]
-    )
-
-    # Write audit logs for successful transitions
-    db.executemany(
-        """
-        INSERT INTO audit_logs (
-            actor_role,
-            actor_id,
-            action,
-            appointment_id
-        )
-        VALUES (?, ?, ?, ?)
-        """,
-        [
-            (
-                "admin",
-                None,
-                "ADMIN_MARKED_NO_SHOW",
-                aid,
-            )
-            for aid in appointment_ids
-        ]
-    )
+    cutoff = (now - timedelta(minutes=grace_minutes)).isoformat()
 
+    db.execute("INSERT OR IGNORE INTO job_state (name) VALUES (?)", (JOB_NAME,))
     db.commit()
 
-    return len(appointment_ids)
+    position = job_state.get_watermark(db, JOB_NAME) or ["", 0]
+    marked = 0
+
+    for _ in range(max_chunks):
+        with write_transaction(db):
+            rows = db.execute(
+                f"""
+                UPDATE appointments
+                SET status = {Status.NO_SHOW.sql}
+                WHERE id IN (
+                    -- pinned: without it the planner prefers idx_appt_status
+                    -- and sorts every booked row to take the first chunk
+                    SELECT id
+                    FROM appointments INDEXED BY idx_appt_booked_end
+                    WHERE status = {Status.BOOKED.sql}
+                      AND end_datetime < ?
+                      AND (end_datetime, id) > (?, ?)
+                    ORDER BY end_datetime, id
+                    LIMIT ?
+                )
+                RETURNING id, end_datetime, patient_id
+                """,
+                (cutoff, position[0], position[1], chunk_size)
+            ).fetchall()
+
+            if rows:
+                counters.record_transition(db, Status.BOOKED, Status.NO_SHOW, count=len(rows))
+                appointments_changed(db, *(row["patient_id"] for row in rows))
+
+                audit.record_many(db, [(row["id"], "system", 0, "NO_SHOW") for row in rows])
+
+                last = max((row["end_datetime"], row["id"]) for row in rows)
+                position = [last[0], last[1]]
+
+            caught_up = len(rows) < chunk_size
+            job_state.set_watermark(db, JOB_NAME, None if caught_up else position)
+
+        marked += len(rows)
+        if caught_up:
+            break
+
+    return marked
+
+
+def sweep_no_shows(now=None):
+    """
+    One beat-triggered sweep: skips if another run holds the job lease,
+    otherwise marks NO_SHOWs and records timing and row counts.
+    """
+
+    db = get_db()
+    owner = job_state.new_owner()
+
+    if not job_state.acquire_lease(db, JOB_NAME, owner, NO_SHOW_LEASE_SECONDS):
+        logger.info("no_show_sweep | skipped, another run holds the lease")
+        return {"skipped": True, "marked": 0}
+
+    start = time.perf_counter()
+    try:
+        marked = mark_no_show_appointments(
+            now or datetime.now(),
+            NO_SHOW_GRACE_MINUTES,
+        )
+        elapsed = time.perf_counter() - start
+        job_state.record_run(db, JOB_NAME, marked, elapsed)
+    finally:
+        job_state.release_lease(db, JOB_NAME, owner)
+
+    logger.info("no_show_sweep | marked=%d | elapsed_ms=%.1f", marked, elapsed * 1000)
 
+    return {"skipped": False, "marked": marked, "elapsed_ms": round(elapsed * 1000, 3)}
@@ -0,0 +1,141 @@
+# backend/outbox.py
+
+"""
+Transactional email outbox.
+
+Domain code writes email_outbox rows in the same transaction as the change
+that causes the email; nothing is queued if that transaction rolls back.
+A periodic drain claims due rows in batches and hands each batch to one
+Celery task, which reports results back with set-based UPDATEs.
+
+Row lifecycle:
+    pending -> sending (claimed, leased) -> sent
+                       \\-> pending (retry with backoff) -> ... -> failed
+"""
+
+from backend.config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_SECONDS,
+    OUTBOX_LEASE_SECONDS,
+)
+from backend.db import write_transaction
+
+
+def enqueue(db, select_sql, params=()):
+    """
+    Queue one email per row of `select_sql`, a SELECT of
+    (to_email, subject, body), in one set-based INSERT. Returns how many
+    were queued. Does not commit: call inside the domain transaction.
+    """
+    return db.execute(
+        f"""
+        INSERT INTO email_outbox (to_email, subject, body)
+        {select_sql}
+        """,
+        params
+    ).rowcount
+
+
+def claim_batches(db, max_batches, batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Lease up to max_batches * batch_size due rows and return their ids
+    split into batches. Rows whose lease expired (worker died mid-send)
+    are due again, so delivery is at-least-once.
+    """
+    with write_transaction(db):
+        rows = db.execute(
+            f"""
+            UPDATE email_outbox
+            SET status = 'sending',
+                next_attempt_at = datetime('now', '+{int(OUTBOX_LEASE_SECONDS)} seconds')
+            WHERE id IN (
+                SELECT id
+                FROM email_outbox
+                WHERE status IN ('pending', 'sending')
+                  AND next_attempt_at <= datetime('now')
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING id
+            """,
+            (max_batches * batch_size,)
+        ).fetchall()
+
+    ids = sorted(row["id"] for row in rows)
+    return [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+
+def load(db, ids):
+    if not ids:
+        return []
+
+    return db.execute(
+        f"""
+        SELECT id, to_email, subject, body
+        FROM email_outbox
+        WHERE id IN ({", ".join("?" * len(ids))})
+          AND status = 'sending'
+        ORDER BY id
+        """,
+        list(ids)
+    ).fetchall()
+
+
+def record_results(db, sent_ids, failures):
+    """
+    sent_ids: ids delivered; failures: [(id, error message)].
+    One set-based UPDATE for successes, one executemany for failures.
+    """
+    with write_transaction(db):
+        if sent_ids:
+            db.execute(
+                f"""
+                UPDATE email_outbox
+                SET status = 'sent',
+                    sent_at = CURRENT_TIMESTAMP,
+                    last_error = NULL
+                WHERE id IN ({", ".join("?" * len(sent_ids))})
+                """,
+                list(sent_ids)
+            )
+
+        if failures:
+            # backoff: OUTBOX_BACKOFF_SECONDS * 2^attempts
+            db.executemany(
+                f"""
+                UPDATE email_outbox
+                SET attempts = attempts + 1,
+                    last_error = ?,
+                    status = CASE
+                        WHEN attempts + 1 >= {int(OUTBOX_MAX_ATTEMPTS)} THEN 'failed'
+                        ELSE 'pending'
+                    END,
+                    next_attempt_at = datetime(
+                        'now',
+                        '+' || ({int(OUTBOX_BACKOFF_SECONDS)} << attempts) || ' seconds'
+                    )
+                WHERE id = ?
+                """,
+                [(str(error)[:500], outbox_id) for outbox_id, error in failures]
+            )
+
+
+def send_batch(db, ids, send_many):
+    """
+    Deliver claimed rows with send_many([(to_email, subject, body), ...]),
+    which returns one error (or None) per message, and record the outcome.
+    Returns (sent, failed) counts.
+    """
+    rows = load(db, ids)
+    errors = send_many([(row["to_email"], row["subject"], row["body"]) for row in rows])
+
+    sent_ids, failures = [], []
+    for row, error in zip(rows, errors):
+        if error is None:
+            sent_ids.append(row["id"])
+        else:
+            failures.append((row["id"], error))
+
+    record_results(db, sent_ids, failures)
+    return len(sent_ids), len(failures)
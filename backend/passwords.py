@@ -0,0 +1,121 @@
+# backend/passwords.py
+
+"""
+Password hashing off the request threads.
+
+check_password_hash / generate_password_hash are deliberately slow KDFs.
+They run on a small dedicated executor, so at most `workers` of them burn
+CPU at once however many logins arrive; a login storm queues behind that
+cap instead of starving booking traffic. Past `max_pending` queued or
+running jobs, callers get KdfBusy (503) straight away rather than piling
+up request threads.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from backend.config import KDF_WORKERS, KDF_MAX_PENDING, KDF_TIMEOUT_SECONDS
+
+
+class KdfBusy(RuntimeError):
+    """Raised when the KDF executor is saturated or too slow to answer."""
+
+
+class PasswordHasher:
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        # threads are started on first use, so this is safe to build pre-fork
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "pending": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, max_pending=self.max_pending)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise KdfBusy("Too many password checks in progress")
+
+        with self._lock:
+            self._stats["pending"] += 1
+
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except RuntimeError:  # executor shut down
+            with self._lock:
+                self._stats["pending"] -= 1
+            self._slots.release()
+            raise
+
+        future.add_done_callback(self._done)
+
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # the job still runs to completion and frees its slot then
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise KdfBusy(f"Password check not done within {self.timeout}s") from None
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._stats["busy_seconds"] += time.perf_counter() - start
+
+    def _done(self, future):
+        with self._lock:
+            self._stats["pending"] -= 1
+            if not future.cancelled():
+                self._stats["completed"] += 1
+        self._slots.release()
+
+
+def get_password_hasher():
+    return current_app.extensions["hms_passwords"]
+
+
+def init_app(app):
+    app.extensions["hms_passwords"] = PasswordHasher(
+        KDF_WORKERS,
+        max_pending=KDF_MAX_PENDING,
+        timeout=KDF_TIMEOUT_SECONDS,
+    )
+
+    @app.errorhandler(KdfBusy)
+    def kdf_busy(exc):
+        response = jsonify(error="Too many logins in progress, retry shortly")
+        response.headers["Retry-After"] = "1"
+        return response, 503
@@ -1,57 +1,62 @@
-from backend.db import get_db
-from backend.tasks import send_email_task
+from backend import outbox
+from backend.db import get_db, write_transaction
+from backend.response_cache import bump
+from backend.status import Status
+
+NO_SHOW_EMAIL_SUBJECT = "Appointment No-Show Recorded"
+NO_SHOW_EMAIL_BODY = (
+    "You missed a scheduled appointment. "
+    "If this was an error, please contact the clinic."
+)
 
 
 def apply_no_show_penalties():
     """
     Insert penalties for NO_SHOW appointments exactly once,
     and enqueue email only once per penalty.
+
+    Penalties, their outbox emails and the email_sent flags are written in
+    one transaction with set-based statements; delivery happens later,
+    when the outbox is drained (see backend/outbox.py).
     """
 
     db = get_db()
 
-    # 1) Insert penalties idempotently
-    db.execute(
-        """
-        INSERT OR IGNORE INTO patient_no_show_penalties (appointment_id, patient_id)
-        SELECT
-            a.id,
-            a.patient_id
-        FROM appointments a
-        WHERE a.status = 'NO_SHOW'
-        """
-    )
-
-    # 2) Find penalties that have not yet triggered email
-    rows = db.execute(
-        """
-        SELECT
-            p.id AS penalty_id,
-            u.username AS email
-        FROM patient_no_show_penalties p
-        JOIN users u ON u.id = p.patient_id
-        WHERE p.email_sent = 0
-        """
-    ).fetchall()
-
-    # 3) Enqueue email + mark as sent
-    for row in rows:
-        send_email_task.delay(
-            to_email=row["email"],
-            subject="Appointment No-Show Recorded",
-            body=(
-                "You missed a scheduled appointment. "
-                "If this was an error, please contact the clinic."
-            ),
+    with write_transaction(db):
+        # 1) Insert penalties idempotently
+        added = db.execute(
+            f"""
+            INSERT OR IGNORE INTO patient_no_show_penalties (appointment_id, patient_id)
+            SELECT
+                a.id,
+                a.patient_id
+            FROM appointments a
+            WHERE a.status = {Status.NO_SHOW.sql}
+            """
+        ).rowcount
+        if added:
+            bump(db, "penalties")
+
+        # 2) Queue one email per penalty that has not triggered one yet
+        queued = outbox.enqueue(
+            db,
+            """
+            SELECT u.username, ?, ?
+            FROM patient_no_show_penalties p
+            JOIN users u ON u.id = p.patient_id
+            WHERE p.email_sent = 0
+            ORDER BY p.id
+            """,
+            (NO_SHOW_EMAIL_SUBJECT, NO_SHOW_EMAIL_BODY)
         )
 
+        # 3) Mark them, in the same transaction as the outbox rows
         db.execute(
             """
             UPDATE patient_no_show_penalties
             SET email_sent = 1
-            WHERE id = ?
-            """,
-            (row["penalty_id"],)
+            WHERE email_sent = 0
+            """
         )
 
-    db.commit()
+    return queued
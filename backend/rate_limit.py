@@ -1,25 +1,257 @@
+import hashlib
+import logging
+import math
+import threading
 import time
-from flask import request, jsonify
+from collections import OrderedDict
 
-WINDOW_SECONDS = 60
-MAX_REQUESTS = 60  # per IP per endpoint
+import redis
+from flask import current_app, request, jsonify
 
+from backend.config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_WINDOW_SECONDS,
+    RATE_LIMIT_DEFAULT,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_PER_IP,
+    RATE_LIMITS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_REDIS_TIMEOUT,
+    RATE_LIMIT_REDIS_RETRY_SECONDS,
+)
 
-_request_log = {}
+logger = logging.getLogger(__name__)
+
+
+def retry_after(previous, current, limit, elapsed, window):
+    """
+    Seconds until a sliding-window estimate drops below `limit`.
+    """
+    if previous and current < limit:
+        # wait until enough of the previous window has slid out
+        needed = 1 - (limit - current) / previous
+        return max(1, math.ceil((needed - elapsed) * window))
+
+    return max(1, math.ceil((1 - elapsed) * window))
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter limiter with bounded memory.
+
+    Each key keeps two fixed-window counters (previous + current); the
+    request rate is estimated by weighting the previous window by how much
+    of it still overlaps the sliding window. O(1) work per request.
+
+    Keys live in an LRU; idle keys (untouched for two windows) and keys
+    beyond `max_keys` are evicted from the cold end.
+    """
+
+    def __init__(self, window=RATE_LIMIT_WINDOW_SECONDS, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [window_index, previous_count, current_count, last_seen]
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, now=None):
+        """
+        Count one request for `key`.
+
+        Returns 0 if allowed, otherwise the seconds until a retry may succeed.
+        """
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+
+        with self._lock:
+            state = self._keys.get(key)
+
+            if state is None:
+                state = [index, 0, 0, now]
+                self._keys[key] = state
+            else:
+                self._keys.move_to_end(key)
+                self._roll(state, index)
+
+            estimate = state[1] * (1 - elapsed) + state[2]
+            state[3] = now
+
+            if estimate >= limit:
+                wait = retry_after(state[1], state[2], limit, elapsed, self.window)
+            else:
+                state[2] += 1
+                wait = 0
+
+            self._evict(now)
+
+        return wait
+
+    def hit_many(self, checks, now=None):
+        """
+        Count one request against each (key, limit) pair.
+        """
+        return [self.hit(key, limit, now) for key, limit in checks]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _roll(self, state, index):
+        if state[0] == index:
+            return
+
+        # one window later the current counter becomes the previous one;
+        # any bigger gap means both counters are stale
+        state[1] = state[2] if state[0] == index - 1 else 0
+        state[2] = 0
+        state[0] = index
+
+    def _evict(self, now):
+        idle_cutoff = now - 2 * self.window
+
+        while self._keys:
+            key, state = next(iter(self._keys.items()))
+            if len(self._keys) <= self.max_keys and state[3] > idle_cutoff:
+                break
+            del self._keys[key]
+
+
+# Same sliding-window algorithm as SlidingWindowLimiter, executed atomically
+# inside Redis: one round trip, no read-modify-write race between workers.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local elapsed = tonumber(ARGV[2])
+
+if previous * (1 - elapsed) + current >= limit then
+    return {0, previous, current}
+end
+
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return {1, previous, current}
+"""
+
+
+class RedisLimiter:
+    """
+    Sliding-window limiter shared by every worker through Redis.
+
+    If Redis is unreachable or slow, checks fall back to a local
+    SlidingWindowLimiter and Redis is retried after `retry_seconds`.
+    """
+
+    def __init__(
+        self,
+        client,
+        fallback,
+        window=RATE_LIMIT_WINDOW_SECONDS,
+        retry_seconds=RATE_LIMIT_REDIS_RETRY_SECONDS,
+        prefix="hms:rl",
+    ):
+        self.client = client
+        self.fallback = fallback
+        self.window = window
+        self.retry_seconds = retry_seconds
+        self.prefix = prefix
+        # called by SHA, never registered on the pipeline: redis-py would
+        # send SCRIPT EXISTS first, a second round trip per request
+        self._sha = hashlib.sha1(SLIDING_WINDOW_SCRIPT.encode()).hexdigest()
+        self._down_until = 0.0
+
+    def hit(self, key, limit, now=None):
+        return self.hit_many([(key, limit)], now)[0]
+
+    def hit_many(self, checks, now=None):
+        """
+        Check every (key, limit) pair in a single pipelined round trip.
+        """
+        now = time.time() if now is None else now
+
+        if now < self._down_until:
+            return self.fallback.hit_many(checks, now)
+
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+
+        try:
+            try:
+                results = self._evaluate(checks, index, elapsed)
+            except redis.exceptions.NoScriptError:
+                # first use on this server, or its script cache was flushed
+                self.client.script_load(SLIDING_WINDOW_SCRIPT)
+                results = self._evaluate(checks, index, elapsed)
+        except redis.RedisError as exc:
+            logger.warning("rate limiter: Redis unavailable, using local fallback (%s)", exc)
+            self._down_until = now + self.retry_seconds
+            return self.fallback.hit_many(checks, now)
+
+        waits = []
+        for (key, limit), (allowed, previous, current) in zip(checks, results):
+            if allowed:
+                waits.append(0)
+            else:
+                waits.append(retry_after(previous, current, limit, elapsed, self.window))
+
+        return waits
+
+    def _evaluate(self, checks, index, elapsed):
+        pipe = self.client.pipeline(transaction=False)
+        for key, limit in checks:
+            pipe.evalsha(
+                self._sha,
+                2,
+                f"{self.prefix}:{key}:{index}",
+                f"{self.prefix}:{key}:{index - 1}",
+                limit,
+                elapsed,
+                self.window * 2,
+            )
+        return pipe.execute()
+
+
+def make_limiter():
+    local = SlidingWindowLimiter()
+
+    if RATE_LIMIT_BACKEND != "redis":
+        return local
+
+    client = redis.Redis.from_url(
+        RATE_LIMIT_REDIS_URL,
+        socket_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+        socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+    )
+    return RedisLimiter(client, fallback=local)
+
+
+def limit_for(endpoint):
+    return RATE_LIMITS.get(endpoint, RATE_LIMIT_DEFAULT)
+
+
+def init_app(app):
+    app.extensions["hms_rate_limiter"] = make_limiter()
 
 
 def rate_limiter():
-    key = f"{request.remote_addr}:{request.endpoint}"
-    now = time.time()
+    if not RATE_LIMIT_ENABLED:
+        return None
 
-    window_start = now - WINDOW_SECONDS
-    timestamps = _request_log.get(key, [])
+    checks = [
+        (f"{request.remote_addr}:{request.endpoint}", limit_for(request.endpoint)),
+    ]
+    if RATE_LIMIT_PER_IP:
+        checks.append((f"{request.remote_addr}:*", RATE_LIMIT_PER_IP))
 
-    # prune old requests
-    timestamps = [ts for ts in timestamps if ts > window_start]
+    limiter = current_app.extensions["hms_rate_limiter"]
+    wait = max(limiter.hit_many(checks))
 
-    if len(timestamps) >= MAX_REQUESTS:
-        return jsonify(error="Rate limit exceeded"), 429
+    if wait:
+        response = jsonify(error="Rate limit exceeded")
+        response.headers["Retry-After"] = str(wait)
+        return response, 429
 
-    timestamps.append(now)
-    _request_log[key] = timestamps
+    return None
@@ -0,0 +1,139 @@
+# backend/refresh_tokens.py
+
+"""
+Long-lived refresh tokens next to short-lived JWT access tokens.
+
+A login runs the password KDF once and starts a token family; afterwards
+POST /auth/refresh trades a refresh token for a new access token with one
+indexed lookup, no KDF. Tokens are opaque random strings stored only as
+SHA-256 digests and rotate on every use: presenting an already rotated
+token means a copy leaked, so its whole family is revoked.
+
+None of these functions commit: call them inside write_transaction.
+"""
+
+import hashlib
+import secrets
+
+from backend.config import REFRESH_TOKEN_SECONDS
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+def issue(db, user_id, role, family_id=None):
+    """
+    New refresh token for `user_id`; starts a new family unless given one.
+    """
+    token = secrets.token_urlsafe(32)
+
+    row = db.execute(
+        f"""
+        INSERT INTO refresh_tokens (token_hash, family_id, user_id, role, expires_at)
+        VALUES (?, ?, ?, ?, datetime('now', '+{int(REFRESH_TOKEN_SECONDS)} seconds'))
+        RETURNING id
+        """,
+        (_digest(token), family_id, user_id, role)
+    ).fetchone()
+
+    if family_id is None:
+        db.execute(
+            "UPDATE refresh_tokens SET family_id = id WHERE id = ?",
+            (row["id"],)
+        )
+
+    return token
+
+
+def rotate(db, token):
+    """
+    Spend `token`: returns (user_id, role, new refresh token), or None if
+    it is unknown, expired, revoked or its account may no longer log in.
+    """
+    row = db.execute(
+        """
+        UPDATE refresh_tokens
+        SET revoked_at = CURRENT_TIMESTAMP
+        WHERE token_hash = ?
+          AND revoked_at IS NULL
+          AND expires_at > CURRENT_TIMESTAMP
+        RETURNING family_id, user_id, role
+        """,
+        (_digest(token),)
+    ).fetchone()
+
+    if row is None:
+        spent = db.execute(
+            "SELECT family_id FROM refresh_tokens WHERE token_hash = ? AND revoked_at IS NOT NULL",
+            (_digest(token),)
+        ).fetchone()
+        if spent:
+            _revoke_family(db, spent["family_id"])
+        return None
+
+    if not _may_log_in(db, row["user_id"], row["role"]):
+        _revoke_family(db, row["family_id"])
+        return None
+
+    return row["user_id"], row["role"], issue(db, row["user_id"], row["role"], row["family_id"])
+
+
+def revoke(db, token):
+    """
+    End the session `token` belongs to (logout).
+    """
+    row = db.execute(
+        "SELECT family_id FROM refresh_tokens WHERE token_hash = ?",
+        (_digest(token),)
+    ).fetchone()
+    if row:
+        _revoke_family(db, row["family_id"])
+
+
+def revoke_user(db, user_id):
+    db.execute(
+        """
+        UPDATE refresh_tokens
+        SET revoked_at = CURRENT_TIMESTAMP
+        WHERE user_id = ?
+          AND revoked_at IS NULL
+        """,
+        (user_id,)
+    )
+
+
+def purge_expired(db):
+    """
+    Delete expired tokens; revoked ones are kept until then for reuse detection.
+    """
+    return db.execute(
+        "DELETE FROM refresh_tokens WHERE expires_at <= CURRENT_TIMESTAMP"
+    ).rowcount
+
+
+def _revoke_family(db, family_id):
+    db.execute(
+        """
+        UPDATE refresh_tokens
+        SET revoked_at = CURRENT_TIMESTAMP
+        WHERE family_id = ?
+          AND revoked_at IS NULL
+        """,
+        (family_id,)
+    )
+
+
+def _may_log_in(db, user_id, role):
+    row = db.execute(
+        """
+        SELECT u.is_active, d.is_blacklisted
+        FROM users u
+        LEFT JOIN doctors d ON d.user_id = u.id
+        WHERE u.id = ?
+          AND u.role = ?
+        """,
+        (user_id, role)
+    ).fetchone()
+
+    return bool(row and row["is_active"] and not row["is_blacklisted"])
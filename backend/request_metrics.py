@@ -0,0 +1,392 @@
+# backend/request_metrics.py
+
+import fcntl
+import glob
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, g, request
+
+from backend.config import METRICS_DIR, METRICS_FLUSH_SECONDS
+from backend.histogram import Histogram, LATENCY_BUCKETS
+
+# bytes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+FILE_PREFIX = "hms-metrics-"
+# counts of workers that have exited, and the files already folded in
+RETIRED_FILE = "hms-metrics-retired.json"
+LOCK_FILE = "hms-metrics.lock"
+
+prometheus_bp = Blueprint("prometheus", __name__)
+
+
+class RequestMetrics:
+    """
+    Request latency / response size histograms and status counters,
+    labeled by blueprint and endpoint.
+
+    Each thread records into its own shard, so the request path takes no
+    lock; shards are merged only when metrics are read. Shards of threads
+    that have exited are folded into one retired total, so thread-per-
+    request servers keep as many shards as they have live threads. With a
+    metrics directory, every worker process periodically writes its merged
+    snapshot there and readers merge all workers' files. Files of workers
+    that have exited on this host are folded into one retired file, so
+    counters never go backwards when a worker recycles.
+    """
+
+    def __init__(self, metrics_dir=None, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.metrics_dir = metrics_dir
+        self.flush_seconds = flush_seconds
+
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._shards = []  # [(thread, shard)]
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = 0.0
+
+    def observe(self, blueprint, endpoint, method, status, seconds, size):
+        self._reset_after_fork()
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._new_shard()
+
+        entry = shard.get((blueprint, endpoint))
+        if entry is None:
+            entry = shard[(blueprint, endpoint)] = _new_entry()
+
+        entry["latency"].observe(seconds)
+        if size is not None:
+            entry["size"].observe(size)
+
+        statuses = entry["status"]
+        statuses[(method, status)] = statuses.get((method, status), 0) + 1
+
+    def snapshot(self):
+        """
+        This process's metrics, all threads merged.
+        """
+        merged = {}
+        with self._shards_lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            for key, entry in self._retired.items():
+                _merge_entry(merged.setdefault(key, _new_entry()), entry)
+
+        for shard in shards:
+            for key, entry in list(shard.items()):
+                _merge_entry(merged.setdefault(key, _new_entry()), entry)
+
+        return merged
+
+    def collect(self):
+        """
+        Metrics of every worker sharing the metrics directory.
+        """
+        merged = self.snapshot()
+
+        if not self.metrics_dir:
+            return merged
+
+        own = self._path(os.getpid())
+        with open(os.path.join(self.metrics_dir, LOCK_FILE), "a") as lock:
+            # one collector at a time: folding rewrites the retired file
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._fold_exited()
+
+            for path in glob.glob(os.path.join(self.metrics_dir, f"{FILE_PREFIX}*.json")):
+                if path == own:
+                    continue
+                if os.path.basename(path) == RETIRED_FILE:
+                    other = _load(path)["metrics"]
+                else:
+                    other = _load(path)
+                for key, entry in other.items():
+                    _merge_entry(merged.setdefault(key, _new_entry()), entry)
+
+        return merged
+
+    def maybe_flush(self, now=None):
+        """
+        Write this worker's snapshot to the metrics directory at most every
+        `flush_seconds`. Never blocks: a concurrent flush wins.
+        """
+        if not self.metrics_dir:
+            return
+
+        now = time.monotonic() if now is None else now
+        if now < self._next_flush or not self._flush_lock.acquire(blocking=False):
+            return
+
+        try:
+            self._next_flush = now + self.flush_seconds
+            self._reset_after_fork()
+
+            _write(self.metrics_dir, self._path(os.getpid()), _encode(self.snapshot()))
+        finally:
+            self._flush_lock.release()
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _new_shard(self):
+        shard = {}
+        self._local.shard = shard
+        with self._shards_lock:
+            self._prune()
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _prune(self):
+        # a dead thread writes no more: fold its shard away (lock held)
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+                continue
+            for key, entry in shard.items():
+                _merge_entry(self._retired.setdefault(key, _new_entry()), entry)
+        self._shards = live
+
+    def _fold_exited(self):
+        """
+        Merge the files of workers that exited on this host into the
+        retired file, then remove them (collect() holds the lock). The
+        retired file lists what it already holds, so a fold cut short
+        before the removals never counts a file twice.
+        """
+        retired_path = os.path.join(self.metrics_dir, RETIRED_FILE)
+        exited = [
+            path
+            for path in glob.glob(os.path.join(self.metrics_dir, f"{FILE_PREFIX}*.json"))
+            if _writer_exited(path)
+        ]
+        if not exited:
+            return
+
+        retired = _load(retired_path) if os.path.exists(retired_path) else {"metrics": {}, "folded": []}
+        folded = set(retired["folded"])
+
+        for path in exited:
+            name = os.path.basename(path)
+            if name in folded:
+                continue
+            for key, entry in _load(path).items():
+                _merge_entry(retired["metrics"].setdefault(key, _new_entry()), entry)
+            folded.add(name)
+
+        _write(self.metrics_dir, retired_path, {
+            "metrics": _encode(retired["metrics"]),
+            # only names still on disk can be seen again
+            "folded": sorted(n for n in folded if os.path.exists(os.path.join(self.metrics_dir, n))),
+        })
+        for path in exited:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _reset_after_fork(self):
+        # a forked worker must not re-report its parent's counts
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._local = threading.local()
+            with self._shards_lock:
+                self._shards = []
+                self._retired = {}
+
+    def _path(self, pid):
+        return os.path.join(self.metrics_dir, f"{FILE_PREFIX}{socket.gethostname()}-{pid}.json")
+
+
+def _writer_exited(path):
+    """
+    Whether metrics file `path` was written by a worker of this host that
+    no longer runs. Files of other hosts, sharing the directory, are left
+    to their own collectors.
+    """
+    host, _, pid = os.path.basename(path)[len(FILE_PREFIX):-len(".json")].rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _load(path):
+    """
+    Decoded metrics file (the retired file: {"metrics", "folded"}); empty
+    if it vanished or is unreadable.
+    """
+    retired = os.path.basename(path) == RETIRED_FILE
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {"metrics": {}, "folded": []} if retired else {}
+
+    if retired:
+        return {"metrics": _decode(data["metrics"]), "folded": data["folded"]}
+    return _decode(data)
+
+
+def _write(directory, path, data):
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def _new_entry():
+    return {
+        "latency": Histogram(LATENCY_BUCKETS),
+        "size": Histogram(SIZE_BUCKETS),
+        "status": {},
+    }
+
+
+def _merge_entry(into, entry):
+    into["latency"].merge(entry["latency"])
+    into["size"].merge(entry["size"])
+    for key, n in list(entry["status"].items()):
+        into["status"][key] = into["status"].get(key, 0) + n
+
+
+def _encode(metrics):
+    return [
+        {
+            "blueprint": blueprint,
+            "endpoint": endpoint,
+            "latency": entry["latency"].to_dict(),
+            "size": entry["size"].to_dict(),
+            "status": [[method, status, n] for (method, status), n in entry["status"].items()],
+        }
+        for (blueprint, endpoint), entry in metrics.items()
+    ]
+
+
+def _decode(data):
+    return {
+        (item["blueprint"], item["endpoint"]): {
+            "latency": Histogram.from_dict(item["latency"]),
+            "size": Histogram.from_dict(item["size"]),
+            "status": {(method, status): n for method, status, n in item["status"]},
+        }
+        for item in data
+    }
+
+
+def _labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+
+
+def _histogram_lines(name, labels, hist):
+    cumulative = 0
+    for bound, n in zip(hist.bounds, hist.counts):
+        cumulative += n
+        yield f"{name}_bucket{{{labels},le=\"{bound}\"}} {cumulative}"
+    yield f"{name}_bucket{{{labels},le=\"+Inf\"}} {hist.count}"
+    yield f"{name}_sum{{{labels}}} {hist.sum}"
+    yield f"{name}_count{{{labels}}} {hist.count}"
+
+
+def render_prometheus(metrics):
+    lines = [
+        "# HELP hms_http_request_duration_seconds Request latency.",
+        "# TYPE hms_http_request_duration_seconds histogram",
+    ]
+    for (blueprint, endpoint), entry in sorted(metrics.items()):
+        labels = _labels(blueprint=blueprint, endpoint=endpoint)
+        lines.extend(_histogram_lines("hms_http_request_duration_seconds", labels, entry["latency"]))
+
+    lines += [
+        "# HELP hms_http_response_size_bytes Response body size.",
+        "# TYPE hms_http_response_size_bytes histogram",
+    ]
+    for (blueprint, endpoint), entry in sorted(metrics.items()):
+        labels = _labels(blueprint=blueprint, endpoint=endpoint)
+        lines.extend(_histogram_lines("hms_http_response_size_bytes", labels, entry["size"]))
+
+    lines += [
+        "# HELP hms_http_requests_total Requests by status code.",
+        "# TYPE hms_http_requests_total counter",
+    ]
+    for (blueprint, endpoint), entry in sorted(metrics.items()):
+        for (method, status), n in sorted(entry["status"].items()):
+            labels = _labels(blueprint=blueprint, endpoint=endpoint, method=method, status=status)
+            lines.append(f"hms_http_requests_total{{{labels}}} {n}")
+
+    return "\n".join(lines) + "\n"
+
+
+def summarize(metrics):
+    """
+    p50/p95/p99 latency (ms) and status counts per endpoint, for JSON views.
+    """
+    return {
+        endpoint: {
+            "blueprint": blueprint,
+            "latency_ms": entry["latency"].summary(scale=1000),
+            "status": {
+                f"{method} {status}": n
+                for (method, status), n in sorted(entry["status"].items())
+            },
+        }
+        for (blueprint, endpoint), entry in sorted(metrics.items())
+    }
+
+
+def get_request_metrics():
+    return current_app.extensions["hms_request_metrics"]
+
+
+@prometheus_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(
+        render_prometheus(get_request_metrics().collect()),
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
+def init_app(app):
+    metrics = RequestMetrics(METRICS_DIR)
+    app.extensions["hms_request_metrics"] = metrics
+
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+
+        metrics.observe(
+            request.blueprint or "",
+            request.endpoint or "<unmatched>",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            None if response.is_streamed else response.calculate_content_length(),
+        )
+        metrics.maybe_flush()
+        return response
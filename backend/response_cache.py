@@ -0,0 +1,206 @@
+# backend/response_cache.py
+
+"""
+ETag / conditional GET for read endpoints polled by the web client.
+
+- every cached resource ("patients", "appointments", "patient:<id>", ...)
+  has a version in resource_versions, bumped by bump() in the same
+  transaction as the write that changes it
+- each process keeps a copy of the versions, refreshed incrementally at
+  most every RESPONSE_CACHE_VERSION_REFRESH_SECONDS, and right away after
+  one of its own requests bumped something
+- @cached(...) derives a strong ETag from the versions of the resources a
+  response depends on: a matching If-None-Match gets 304, and a bounded LRU
+  of serialized bodies answers repeat GETs; neither touches SQLite
+
+Writes made through another process become visible here within the
+refresh interval.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, request
+
+from backend.config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_VERSION_REFRESH_SECONDS
+from backend.db import get_db
+
+
+def bump(db, *resources):
+    """
+    Give `resources` new versions. Does not commit: callers bump inside
+    the transaction of the write itself.
+    """
+    db.executemany(
+        """
+        INSERT INTO resource_versions (resource, version)
+        VALUES (?, (SELECT COALESCE(MAX(version), 0) + 1 FROM resource_versions))
+        ON CONFLICT(resource) DO UPDATE SET version = excluded.version
+        """,
+        [(resource,) for resource in resources]
+    )
+    if has_app_context():
+        g.versions_bumped = True
+
+
+def patient_appointments(patient_id):
+    return f"patient_appointments:{patient_id}"
+
+
+def appointments_changed(db, *patient_ids):
+    """
+    bump() for a write to the appointments of `patient_ids`.
+    """
+    bump(db, "appointments", *sorted({patient_appointments(p) for p in patient_ids}))
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized response bodies plus this process's view of
+    resource versions.
+    """
+
+    def __init__(self, max_size, refresh_seconds):
+        self.max_size = max_size
+        self.refresh_seconds = refresh_seconds
+
+        self._entries = OrderedDict()  # key -> (etag, body, mimetype)
+        self._versions = {}  # resource -> version
+        self._seen = 0  # highest version loaded
+        self._refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    def versions(self, db_factory, resources, now=None):
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            due = now - self._refreshed_at >= self.refresh_seconds
+            if due:
+                # claim the refresh so concurrent readers keep the old view
+                self._refreshed_at = now
+            seen = self._seen
+
+        if due:
+            rows = db_factory().execute(
+                "SELECT resource, version FROM resource_versions WHERE version > ?",
+                (seen,)
+            ).fetchall()
+
+            with self._lock:
+                for resource, version in rows:
+                    self._versions[resource] = max(version, self._versions.get(resource, 0))
+                    self._seen = max(self._seen, version)
+
+        with self._lock:
+            return tuple(self._versions.get(r, 0) for r in resources)
+
+    def expire_versions(self):
+        """
+        Force a refresh on the next lookup (after this process wrote).
+        """
+        with self._lock:
+            self._refreshed_at = float("-inf")
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, etag, body, mimetype):
+        with self._lock:
+            self._entries[key] = (etag, body, mimetype)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.not_modified + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "not_modified": self.not_modified,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.not_modified) / total, 4) if total else 0.0,
+                "resources": len(self._versions),
+            }
+
+
+def get_response_cache():
+    return current_app.extensions["hms_response_cache"]
+
+
+def etag_for(key, versions):
+    """
+    Strong ETag (unquoted) of a response identified by `key`.
+    """
+    return hashlib.sha256(repr((key, versions)).encode()).hexdigest()[:32]
+
+
+def cached(resources):
+    """
+    Cache a GET view by the versions of `resources(**view_kwargs)`, a list
+    of resource names. Goes under @require_role, so auth still runs first.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            names = resources(**kwargs)
+            key = (request.endpoint, request.full_path, tuple(names))
+            etag = etag_for(key, cache.versions(get_db, names))
+
+            if request.if_none_match.contains(etag):
+                cache.count_not_modified()
+                return _with_etag(Response(status=304), etag)
+
+            entry = cache.get(key, etag)
+            if entry is not None:
+                return _with_etag(Response(entry[1], mimetype=entry[2]), etag)
+
+            response = current_app.make_response(fn(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            cache.put(key, etag, response.get_data(), response.mimetype)
+            return _with_etag(response, etag)
+        return wrapper
+    return decorator
+
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    # browsers keep the body but revalidate on every poll
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def init_app(app):
+    app.extensions["hms_response_cache"] = ResponseCache(
+        RESPONSE_CACHE_SIZE,
+        RESPONSE_CACHE_VERSION_REFRESH_SECONDS,
+    )
+
+    @app.teardown_request
+    def expire_after_own_writes(exception=None):
+        if g.pop("versions_bumped", False):
+            get_response_cache().expire_versions()
@@ -0,0 +1,182 @@
+# backend/rollups.py
+
+"""
+Daily appointment outcome rollups for trend metrics.
+
+daily_doctor_outcomes and daily_patient_outcomes hold, per appointment
+day, how many appointments were completed, marked NO_SHOW or cancelled
+(by the patient / by an admin). A beat job folds new
+appointment_audit_logs rows into them, in chunks of ROLLUP_CHUNK_ROWS
+log ids, each chunk in one short write transaction that also advances the
+job watermark (the last log id applied). The log is append-only, so the
+sums stay exact and a run cut off (or crashed) resumes where it stopped.
+
+series() answers range queries by summing rollup rows, never raw
+appointments.
+"""
+
+import logging
+import time
+
+from backend import job_state
+from backend.config import (
+    ROLLUP_CHUNK_ROWS,
+    ROLLUP_MAX_CHUNKS_PER_RUN,
+    ROLLUP_LEASE_SECONDS,
+)
+from backend.db import get_db, write_transaction
+from backend.response_cache import bump
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "daily_rollups"
+
+# resource_versions entry bumped whenever rollups change
+ROLLUP_RESOURCE = "rollups"
+
+# rollup column -> appointment_audit_logs.action
+OUTCOMES = {
+    "completed": "COMPLETED",
+    "no_show": "NO_SHOW",
+    "cancelled_by_patient": "CANCELLED_BY_PATIENT",
+    "cancelled_by_admin": "CANCELLED_BY_ADMIN",
+}
+
+# rollup table -> appointments column it is keyed by, besides the day
+TABLES = {
+    "daily_doctor_outcomes": "doctor_id",
+    "daily_patient_outcomes": "patient_id",
+}
+
+# bucket -> SQL expression giving the first day of the bucket
+BUCKETS = {
+    "day": "day",
+    "week": "date(day, '-6 days', 'weekday 1')",  # weeks start on Monday
+    "month": "substr(day, 1, 7) || '-01'",
+}
+
+
+def _apply_sql(table, key):
+    sums = ", ".join(f"SUM(l.action = '{action}')" for action in OUTCOMES.values())
+    updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in OUTCOMES)
+    return f"""
+        INSERT INTO {table} (day, {key}, {", ".join(OUTCOMES)})
+        SELECT a.date, a.{key}, {sums}
+        FROM appointment_audit_logs l
+        JOIN appointments a ON a.id = l.appointment_id
+        WHERE l.id > ?
+          AND l.id <= ?
+          AND a.date IS NOT NULL
+          AND a.{key} IS NOT NULL
+        GROUP BY a.date, a.{key}
+        ON CONFLICT (day, {key}) DO UPDATE SET {updates}
+    """
+
+
+def roll_up(db, chunk_rows=ROLLUP_CHUNK_ROWS, max_chunks=ROLLUP_MAX_CHUNKS_PER_RUN):
+    """
+    Apply audit log rows past the watermark. Returns how many were applied.
+    """
+    db.execute("INSERT OR IGNORE INTO job_state (name) VALUES (?)", (JOB_NAME,))
+    db.commit()
+
+    applied = 0
+
+    for _ in range(max_chunks):
+        with write_transaction(db):
+            last_id = job_state.get_watermark(db, JOB_NAME) or 0
+            row = db.execute(
+                """
+                SELECT MAX(id) AS upto, COUNT(*) AS n
+                FROM (
+                    SELECT id
+                    FROM appointment_audit_logs
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                )
+                """,
+                (last_id, chunk_rows)
+            ).fetchone()
+
+            if row["n"]:
+                for table, key in TABLES.items():
+                    db.execute(_apply_sql(table, key), (last_id, row["upto"]))
+                job_state.set_watermark(db, JOB_NAME, row["upto"])
+                bump(db, ROLLUP_RESOURCE)
+
+        applied += row["n"]
+        if row["n"] < chunk_rows:
+            break
+
+    return applied
+
+
+def run_rollups():
+    """
+    One beat-triggered run: skips if another run holds the job lease,
+    otherwise catches the rollups up and records timing and row counts.
+    """
+
+    db = get_db()
+    owner = job_state.new_owner()
+
+    if not job_state.acquire_lease(db, JOB_NAME, owner, ROLLUP_LEASE_SECONDS):
+        logger.info("daily_rollups | skipped, another run holds the lease")
+        return {"skipped": True, "applied": 0}
+
+    start = time.perf_counter()
+    try:
+        applied = roll_up(db)
+        elapsed = time.perf_counter() - start
+        job_state.record_run(db, JOB_NAME, applied, elapsed)
+    finally:
+        job_state.release_lease(db, JOB_NAME, owner)
+
+    logger.info("daily_rollups | applied=%d | elapsed_ms=%.1f", applied, elapsed * 1000)
+
+    return {"skipped": False, "applied": applied, "elapsed_ms": round(elapsed * 1000, 3)}
+
+
+def _with_rate(counts):
+    # share of attended-or-missed appointments that were missed
+    decided = counts["completed"] + counts["no_show"]
+    counts["no_show_rate"] = round(counts["no_show"] / decided, 4) if decided else None
+    return counts
+
+
+def series(db, table, start, end, bucket, key=None):
+    """
+    Outcome counts and no-show rate per bucket for days in [start, end),
+    for one doctor / patient (`key`) or, with key=None, all of them.
+    """
+    key_column = TABLES[table]
+    where = "day >= ? AND day < ?"
+    params = [start, end]
+    if key is not None:
+        where = f"{key_column} = ? AND {where}"
+        params.insert(0, key)
+
+    rows = db.execute(
+        f"""
+        SELECT {BUCKETS[bucket]} AS period, {", ".join(f"SUM({col}) AS {col}" for col in OUTCOMES)}
+        FROM {table}
+        WHERE {where}
+        GROUP BY period
+        ORDER BY period
+        """,
+        params
+    ).fetchall()
+
+    points = [_with_rate({"period": row["period"], **{col: row[col] for col in OUTCOMES}}) for row in rows]
+    totals = _with_rate({col: sum(p[col] for p in points) for col in OUTCOMES})
+
+    return {"series": points, "totals": totals}
+
+
+def last_run(db):
+    row = db.execute(
+        "SELECT last_run_at FROM job_state WHERE name = ?",
+        (JOB_NAME,)
+    ).fetchone()
+    return row["last_run_at"] if row else None
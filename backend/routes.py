@@ -1,10 +1,12 @@
 # ROUTES VERSION: patient auth removed (CI sync)
 
 from flask import Blueprint, jsonify, request
-from werkzeug.security import check_password_hash
-from backend.db import get_db
+from backend import refresh_tokens
+from backend.db import get_db, release_db, write_transaction
 from backend.config import SECRET_KEY, JWT_ALGO, JWT_EXP_SECONDS
-from datetime import datetime, timedelta
+from backend.passwords import get_password_hasher
+from backend.token_cache import get_token_cache
+from datetime import datetime, timedelta, timezone
 import jwt
 from functools import wraps
 
@@ -16,14 +18,32 @@ auth_bp = Blueprint("auth", __name__)
 # AUTH UTIL
 # =========================
 def make_token(user_id, role):
+    now = datetime.now(timezone.utc)
     payload = {
         "sub": str(user_id),
         "role": role,
-        "exp": datetime.utcnow() + timedelta(seconds=JWT_EXP_SECONDS)
+        # sub-second, so a token issued right after a revocation (same
+        # second) still postdates it; see TokenCache.invalidate_user
+        "iat": now.timestamp(),
+        "exp": now + timedelta(seconds=JWT_EXP_SECONDS)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGO)
 
 
+def issue_tokens(db, user_id, role):
+    """
+    Access token plus a refresh token starting a new session. Commits.
+    """
+    with write_transaction(db):
+        refresh_token = refresh_tokens.issue(db, user_id, role)
+
+    return {
+        "token": make_token(user_id, role),
+        "refresh_token": refresh_token,
+        "expires_in": JWT_EXP_SECONDS,
+    }
+
+
 def require_role(expected_role):
     def decorator(fn):
         @wraps(fn)
@@ -34,13 +54,21 @@ def require_role(expected_role):
                 return jsonify(error="Missing or invalid Authorization header"), 401
 
             token = auth_header.split(" ", 1)[1]
+            cache = get_token_cache()
 
-            try:
-                payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGO])
-            except jwt.ExpiredSignatureError:
-                return jsonify(error="Token expired"), 401
-            except Exception:
-                return jsonify(error="Invalid token"), 401
+            # verified claims are cached until the token itself expires
+            payload = cache.get(token)
+
+            if payload is None:
+                try:
+                    payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGO])
+                except jwt.ExpiredSignatureError:
+                    return jsonify(error="Token expired"), 401
+                except Exception:
+                    return jsonify(error="Invalid token"), 401
+
+                if not cache.put(token, payload):
+                    return jsonify(error="Token revoked"), 401
 
             if payload.get("role") != expected_role:
                 return jsonify(error="Forbidden"), 403
@@ -75,21 +103,20 @@ def admin_login():
     if not username or not password:
         return jsonify(error="Username and password required"), 400
 
-    db = get_db()
-    row = db.execute(
+    row = get_db().execute(
         "SELECT id, password_hash FROM users WHERE username=? AND role='admin' AND is_active=1",
         (username,)
     ).fetchone()
+    # the KDF can take seconds: do not hold a pooled connection meanwhile
+    release_db()
 
-    if not row or not check_password_hash(row["password_hash"], password):
+    if not row or not get_password_hasher().check(row["password_hash"], password):
         return jsonify(error="Invalid credentials"), 401
 
-    token = make_token(row["id"], "admin")
-
     return jsonify(
         admin_id=row["id"],
-        token=token,
-        message="Admin login successful"
+        message="Admin login successful",
+        **issue_tokens(get_db(), row["id"], "admin")
     )
 
 
@@ -111,8 +138,7 @@ def doctor_login():
     if not username or not password:
         return jsonify(error="Username and password required"), 400
 
-    db = get_db()
-    row = db.execute(
+    row = get_db().execute(
         """
         SELECT u.id, u.password_hash, d.is_blacklisted
         FROM users u
@@ -123,6 +149,7 @@ def doctor_login():
         """,
         (username,)
     ).fetchone()
+    release_db()
 
     if not row:
         return jsonify(error="Invalid credentials"), 401
@@ -130,15 +157,13 @@ def doctor_login():
     if row["is_blacklisted"]:
         return jsonify(error="Doctor is blacklisted"), 403
 
-    if not check_password_hash(row["password_hash"], password):
+    if not get_password_hasher().check(row["password_hash"], password):
         return jsonify(error="Invalid credentials"), 401
 
-    token = make_token(row["id"], "doctor")
-
     return jsonify(
         doctor_id=row["id"],
-        token=token,
-        message="Doctor login successful"
+        message="Doctor login successful",
+        **issue_tokens(get_db(), row["id"], "doctor")
     )
 
 
@@ -147,3 +172,48 @@ def doctor_login():
 def doctor_me():
     return jsonify(doctor_id=request.user_id, role="doctor")
 
+
+# =========================
+# TOKEN REFRESH
+# =========================
+@auth_bp.route("/auth/refresh", methods=["POST"])
+def refresh():
+    """
+    Trade a refresh token for a new access token and a new refresh token;
+    the presented one is spent. No password KDF runs here.
+    """
+    token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if not token:
+        return jsonify(error="refresh_token required"), 400
+
+    db = get_db()
+    with write_transaction(db):
+        rotated = refresh_tokens.rotate(db, token)
+
+    if rotated is None:
+        return jsonify(error="Invalid refresh token"), 401
+
+    user_id, role, refresh_token = rotated
+
+    return jsonify(
+        token=make_token(user_id, role),
+        refresh_token=refresh_token,
+        expires_in=JWT_EXP_SECONDS,
+    )
+
+
+@auth_bp.route("/auth/logout", methods=["POST"])
+def logout():
+    """
+    Revoke the session of a refresh token. Access tokens already issued
+    stay valid until they expire (at most JWT_EXP_SECONDS).
+    """
+    token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if not token:
+        return jsonify(error="refresh_token required"), 400
+
+    db = get_db()
+    with write_transaction(db):
+        refresh_tokens.revoke(db, token)
+
+    return jsonify(message="Logged out")
@@ -1,17 +1,135 @@
-from flask import Blueprint, jsonify, request
-from backend.db import get_db
+import base64
+import json
+from datetime import date
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from backend import audit, counters, export, refresh_tokens
+from backend.availability import slot_changed
+from backend.db import get_db, write_transaction
+from backend.idempotency import idempotent
+from backend.response_cache import appointments_changed, bump, cached
 from backend.routes import require_role
+from backend.slots import release_slot
+from backend.status import Status
+from backend.token_cache import get_token_cache
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
 
+APPOINTMENTS_PAGE_MAX = 500
+AUDIT_PAGE_MAX = 500
+STREAM_BATCH_SIZE = 500
+
+
+def _appointment_json(r):
+    return {
+        "appointment_id": r["appointment_id"],
+        "status": Status(r["status"]).label,
+        "start_datetime": r["start_datetime"],
+        "patient": {
+            "id": r["patient_id"],
+            "username": r["patient_name"],
+        },
+        "doctor": {
+            "id": r["doctor_id"],
+            "username": r["doctor_name"],
+        },
+    }
+
+
+def encode_cursor(slot_time, appointment_id):
+    raw = json.dumps([slot_time, appointment_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        slot_time, appointment_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return str(slot_time), int(appointment_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _stream_rows(cur, fmt):
+    """
+    Yield rows from an open cursor as NDJSON lines or one JSON array,
+    STREAM_BATCH_SIZE rows at a time.
+    """
+    if fmt == "json":
+        yield "["
+
+    first = True
+    while True:
+        batch = cur.fetchmany(STREAM_BATCH_SIZE)
+        if not batch:
+            break
+
+        for r in batch:
+            item = json.dumps(_appointment_json(r))
+            if fmt == "ndjson":
+                yield item + "\n"
+            else:
+                yield item if first else "," + item
+            first = False
+
+    if fmt == "json":
+        yield "]"
+
+
 @admin_bp.route("/appointments", methods=["GET"])
 @require_role("admin")
 def list_appointments():
-    db = get_db()
-
-    rows = db.execute(
-        """
+    """
+    Query params (all optional):
+    - status, doctor_id
+    - from / to: bounds on start_datetime (ISO strings, `to` exclusive)
+    - limit / cursor: keyset pagination on (start_datetime, appointment_id)
+    - format: json (default) | ndjson
+
+    Without `limit` the full result is streamed, never materialized.
+    """
+    args = request.args
+    fmt = args.get("format", "json")
+    if fmt not in ("json", "ndjson"):
+        return jsonify(error="format must be json or ndjson"), 400
+
+    where = []
+    params = []
+
+    if args.get("status"):
+        try:
+            status = Status.parse(args["status"])
+        except ValueError as exc:
+            return jsonify(error=str(exc)), 400
+        where.append(f"a.status = {status.sql}")
+
+    doctor_id = args.get("doctor_id", type=int)
+    if doctor_id is not None:
+        where.append("a.doctor_id = ?")
+        params.append(doctor_id)
+
+    # a.date (the slot's day) bounds keep the appointments indexes usable
+    if args.get("from"):
+        where.append("a.date >= ? AND s.slot_time >= ?")
+        params += [args["from"][:10], args["from"]]
+
+    if args.get("to"):
+        where.append("a.date <= ? AND s.slot_time < ?")
+        params += [args["to"][:10], args["to"]]
+
+    limit = args.get("limit", type=int)
+    if limit is not None and not 1 <= limit <= APPOINTMENTS_PAGE_MAX:
+        return jsonify(error=f"limit must be between 1 and {APPOINTMENTS_PAGE_MAX}"), 400
+
+    if args.get("cursor"):
+        after = decode_cursor(args["cursor"])
+        if after is None:
+            return jsonify(error="Invalid cursor"), 400
+
+        where.append("a.date >= ? AND (a.date, s.slot_time, a.id) > (?, ?, ?)")
+        params += [after[0][:10], after[0][:10], after[0], after[1]]
+
+    sql = """
         SELECT
             a.id            AS appointment_id,
             a.status        AS status,
@@ -27,63 +145,231 @@ def list_appointments():
         JOIN doctor_slots s ON s.id = a.slot_id
         JOIN users pu ON pu.id = a.patient_id
         JOIN users du ON du.id = s.doctor_id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # a.date is the slot_time's day, so this is slot_time order; leading
+    # with it lets idx_appt_date / idx_appt_status_date / idx_appt_doctor_date
+    # deliver rows in day order and only each day's rows get sorted
+    sql += " ORDER BY a.date ASC, s.slot_time ASC, a.id ASC"
 
-        ORDER BY s.slot_time ASC, a.id ASC
-        """
-    ).fetchall()
+    db = get_db()
+
+    if limit is None:
+        cur = db.execute(sql, params)
+        mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+        return Response(stream_with_context(_stream_rows(cur, fmt)), mimetype=mimetype)
+
+    rows = db.execute(sql + " LIMIT ?", params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["start_datetime"], last["appointment_id"])
+
+    return jsonify(
+        items=[_appointment_json(r) for r in rows],
+        next_cursor=next_cursor,
+    ), 200
+
+
+def _export_params(args):
+    """
+    (format, gzip, from, to) of an export request, or an error message.
+    `from` / `to` are ISO dates, `to` exclusive.
+    """
+    fmt = args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return None, "format must be csv or ndjson"
+
+    bounds = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        if value:
+            try:
+                value = date.fromisoformat(value).isoformat()
+            except ValueError:
+                return None, f"{name} must be an ISO date (YYYY-MM-DD)"
+        bounds.append(value)
+
+    return (fmt, args.get("gzip") == "1", *bounds), None
+
+
+@admin_bp.route("/export/appointments", methods=["GET"])
+@require_role("admin")
+def export_appointments():
+    """
+    Every appointment, or those whose slot day is in [from, to), as a CSV
+    or NDJSON download streamed in constant memory (backend/export.py).
+    """
+    params, error = _export_params(request.args)
+    if error:
+        return jsonify(error=error), 400
+    fmt, gzip, start, end = params
+
+    where, values = [], []
+    if start:
+        where.append("a.date >= ?")
+        values.append(start)
+    if end:
+        where.append("a.date < ?")
+        values.append(end)
+
+    # (date, id) is idx_appt_date order: no sort, whatever the row count
+    sql = """
+        SELECT
+            a.id, a.status, s.slot_time, a.end_datetime,
+            a.patient_id, pu.username, s.doctor_id, du.username, a.created_at
+        FROM appointments a
+        JOIN doctor_slots s ON s.id = a.slot_id
+        JOIN users pu ON pu.id = a.patient_id
+        JOIN users du ON du.id = s.doctor_id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY a.date, a.id"
+
+    return export.stream(
+        sql, values,
+        columns=[
+            "appointment_id", "status", "start_datetime", "end_datetime",
+            "patient_id", "patient_username", "doctor_id", "doctor_username", "created_at",
+        ],
+        fmt=fmt,
+        gzip=gzip,
+        filename="appointments",
+        transforms={"status": lambda value: Status(value).label},
+    )
+
+
+@admin_bp.route("/export/audit-logs", methods=["GET"])
+@require_role("admin")
+def export_audit_logs():
+    """
+    The audit log, archive included, optionally created in [from, to),
+    streamed like export_appointments.
+    """
+    params, error = _export_params(request.args)
+    if error:
+        return jsonify(error=error), 400
+    fmt, gzip, start, end = params
+
+    where, values = [], []
+    if start:
+        where.append("created_at >= ?")
+        values.append(start)
+    if end:
+        where.append("created_at < ?")
+        values.append(end)
+
+    archived = audit.archive_exists()
+    sql, copies = audit.union_sql(archived, " AND ".join(where) or "1")
+
+    return export.stream(
+        sql + " ORDER BY created_at, id", values * copies,
+        columns=audit.COLUMNS,
+        fmt=fmt,
+        gzip=gzip,
+        filename="audit-logs",
+        connect=lambda: audit.open_reader(archived),
+    )
 
-    return jsonify([
-        {
-            "appointment_id": r["appointment_id"],
-            "status": r["status"],
-            "start_datetime": r["start_datetime"],
-            "patient": {
-                "id": r["patient_id"],
-                "username": r["patient_name"],
-            },
-            "doctor": {
-                "id": r["doctor_id"],
-                "username": r["doctor_name"],
-            },
-        }
-        for r in rows
-    ]), 200
+
+@admin_bp.route("/audit-logs", methods=["GET"])
+@require_role("admin")
+def audit_logs():
+    """
+    Audit entries, archive included, newest first. Query params:
+    - appointment_id, or actor_role + actor_id (one is required)
+    - limit / cursor: keyset pagination on id
+    """
+    args = request.args
+    where, values = [], []
+
+    appointment_id = args.get("appointment_id", type=int)
+    actor_id = args.get("actor_id", type=int)
+    if appointment_id is not None:
+        where.append("appointment_id = ?")
+        values.append(appointment_id)
+    elif args.get("actor_role") and actor_id is not None:
+        where.append("actor_role = ? AND actor_id = ?")
+        values += [args["actor_role"], actor_id]
+    else:
+        return jsonify(error="appointment_id or actor_role + actor_id required"), 400
+
+    limit = args.get("limit", 100, type=int)
+    if not 1 <= limit <= AUDIT_PAGE_MAX:
+        return jsonify(error=f"limit must be between 1 and {AUDIT_PAGE_MAX}"), 400
+
+    if args.get("cursor"):
+        cursor = args.get("cursor", type=int)
+        if cursor is None:
+            return jsonify(error="Invalid cursor"), 400
+        where.append("id < ?")
+        values.append(cursor)
+
+    archived = audit.archive_exists()
+    sql, copies = audit.union_sql(archived, " AND ".join(where))
+
+    conn = audit.open_reader(archived)
+    try:
+        rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", values * copies + [limit + 1]).fetchall()
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+
+    return jsonify(
+        items=[dict(zip(audit.COLUMNS, row)) for row in rows],
+        next_cursor=next_cursor,
+    ), 200
 
 
 @admin_bp.route("/appointments/<int:appointment_id>/cancel", methods=["PATCH"])
 @require_role("admin")
+@idempotent
 def cancel_appointment(appointment_id):
     db = get_db()
 
-    row = db.execute(
-        """
-        SELECT id, status
-        FROM appointments
-        WHERE id = ?
-        """,
-        (appointment_id,)
-    ).fetchone()
-
-    if not row:
-        return jsonify(error="Appointment not found"), 404
-
-    # update appointment
-    db.execute(
-        "UPDATE appointments SET status = 'cancelled' WHERE id = ?",
-        (appointment_id,)
-    )
+    with write_transaction(db):
+        exists = db.execute(
+            "SELECT 1 FROM appointments WHERE id = ?",
+            (appointment_id,)
+        ).fetchone()
 
-    # audit log
-    db.execute(
-        """
-        INSERT INTO appointment_audit_logs
-        (appointment_id, actor_role, actor_id, action)
-        VALUES (?, 'admin', ?, 'CANCELLED_BY_ADMIN')
-        """,
-        (appointment_id, request.user_id)
-    )
+        if not exists:
+            return jsonify(error="Appointment not found"), 404
 
-    db.commit()
+        # only an active booking can be cancelled: a concurrent cancel, or
+        # a complete / NO_SHOW that got there first, leaves nothing to do
+        cancelled = db.execute(
+            f"""
+            UPDATE appointments
+            SET status = {Status.CANCELLED.sql}
+            WHERE id = ?
+              AND status = {Status.BOOKED.sql}
+            RETURNING slot_id, patient_id
+            """,
+            (appointment_id,)
+        ).fetchone()
+
+        if not cancelled:
+            return jsonify(error="Only booked appointments can be cancelled"), 409
+
+        counters.record_transition(db, Status.BOOKED, Status.CANCELLED)
+        appointments_changed(db, cancelled["patient_id"])
+
+        # an active booking gives its slot back
+        released = release_slot(db, cancelled["slot_id"])
+
+        audit.record(db, appointment_id, "admin", request.user_id, "CANCELLED_BY_ADMIN")
+
+    if released:
+        slot_changed(released["doctor_id"], released["slot_time"])
 
     return jsonify(
         message="Appointment cancelled",
@@ -96,43 +382,21 @@ def cancel_appointment(appointment_id):
 @require_role("admin")
 def admin_stats():
     db = get_db()
-
-    total_doctors = db.execute(
-        "SELECT COUNT(*) FROM doctors"
-    ).fetchone()[0]
-
-    active_doctors = db.execute(
-        "SELECT COUNT(*) FROM doctors WHERE is_blacklisted = 0"
-    ).fetchone()[0]
-
-    total_patients = db.execute(
-        "SELECT COUNT(*) FROM users WHERE role = 'patient'"
-    ).fetchone()[0]
-
-    total_appointments = db.execute(
-        "SELECT COUNT(*) FROM appointments"
-    ).fetchone()[0]
-
-    active_appointments = db.execute(
-        "SELECT COUNT(*) FROM appointments WHERE status = 'BOOKED'"
-    ).fetchone()[0]
-
-    cancelled_appointments = db.execute(
-        "SELECT COUNT(*) FROM appointments WHERE status LIKE 'CANCEL%'"
-    ).fetchone()[0]
+    stats = counters.read(db)
 
     return jsonify({
-        "total_doctors": total_doctors,
-        "active_doctors": active_doctors,
-        "total_patients": total_patients,
-        "total_appointments": total_appointments,
-        "active_appointments": active_appointments,
-        "cancelled_appointments": cancelled_appointments
+        "total_doctors": stats["total_doctors"],
+        "active_doctors": stats["active_doctors"],
+        "total_patients": stats["total_patients"],
+        "total_appointments": stats["total_appointments"],
+        "active_appointments": stats["active_appointments"],
+        "cancelled_appointments": stats["cancelled_appointments"]
     }), 200
 
 
 @admin_bp.route("/patients", methods=["GET"])
 @require_role("admin")
+@cached(lambda: ["patients"])
 def list_patients():
     db = get_db()
     rows = db.execute(
@@ -171,7 +435,10 @@ def deactivate_patient(patient_id):
     if cur.rowcount == 0:
         return jsonify(error="Patient not found"), 404
 
+    refresh_tokens.revoke_user(db, patient_id)
+    bump(db, "patients")
     db.commit()
+    get_token_cache().invalidate_user(patient_id)
     return jsonify(message="Patient deactivated")
 
 
@@ -187,5 +454,50 @@ def activate_patient(patient_id):
     if cur.rowcount == 0:
         return jsonify(error="Patient not found"), 404
 
+    bump(db, "patients")
     db.commit()
-    return jsonify(message="Patient activated")
\ No newline at end of file
+    return jsonify(message="Patient activated")
+
+@admin_bp.route("/doctors/<int:doctor_id>/blacklist", methods=["POST"])
+@require_role("admin")
+def blacklist_doctor(doctor_id):
+    db = get_db()
+    cur = db.execute(
+        "UPDATE doctors SET is_blacklisted = 1 WHERE user_id = ? AND is_blacklisted = 0",
+        (doctor_id,),
+    )
+
+    if cur.rowcount:
+        counters.bump(db, active_doctors=-1)
+    elif not _doctor_exists(db, doctor_id):
+        return jsonify(error="Doctor not found"), 404
+
+    refresh_tokens.revoke_user(db, doctor_id)
+    db.commit()
+    get_token_cache().invalidate_user(doctor_id)
+    return jsonify(message="Doctor blacklisted")
+
+
+@admin_bp.route("/doctors/<int:doctor_id>/unblacklist", methods=["POST"])
+@require_role("admin")
+def unblacklist_doctor(doctor_id):
+    db = get_db()
+    cur = db.execute(
+        "UPDATE doctors SET is_blacklisted = 0 WHERE user_id = ? AND is_blacklisted = 1",
+        (doctor_id,),
+    )
+
+    if cur.rowcount:
+        counters.bump(db, active_doctors=1)
+    elif not _doctor_exists(db, doctor_id):
+        return jsonify(error="Doctor not found"), 404
+
+    db.commit()
+    return jsonify(message="Doctor unblacklisted")
+
+
+def _doctor_exists(db, doctor_id):
+    return db.execute(
+        "SELECT 1 FROM doctors WHERE user_id = ?",
+        (doctor_id,),
+    ).fetchone() is not None
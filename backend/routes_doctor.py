@@ -1,6 +1,18 @@
+from datetime import datetime, timedelta
+
 from flask import Blueprint, jsonify, request
-from backend.db import get_db
+from backend import audit, counters
+from backend.db import get_db, write_transaction
+from backend.response_cache import appointments_changed
 from backend.routes import require_role
+from backend.availability import get_availability_cache, slot_changed
+from backend.slots import (
+    RecurrenceError,
+    parse_recurrence,
+    expand_recurrence,
+    split_overlapping,
+)
+from backend.status import Status
 
 doctor_bp = Blueprint("doctor", __name__, url_prefix="/doctor")
 
@@ -19,12 +31,13 @@ def create_slot():
     db = get_db()
     cur = db.execute(
         """
-        INSERT INTO doctor_slots (doctor_id, slot_time, is_booked)
-        VALUES (?, ?, 0)
+        INSERT INTO doctor_slots (doctor_id, slot_time, end_time, is_booked)
+        VALUES (?, ?, ?, 0)
         """,
-        (request.user_id, start)
+        (request.user_id, start, end)
     )
     db.commit()
+    slot_changed(request.user_id, start)
 
     return jsonify(
         slot_id=cur.lastrowid,
@@ -34,51 +47,130 @@ def create_slot():
     ), 201
 
 
-@doctor_bp.route("/appointments/<int:appointment_id>/complete", methods=["POST"])
+@doctor_bp.route("/slots/bulk", methods=["POST"])
 @require_role("doctor")
-def complete_appointment(appointment_id):
-    db = get_db()
+def create_recurring_slots():
+    """
+    Expand a recurrence spec (see backend.slots.parse_recurrence) and insert
+    every slot in one transaction. Slots overlapping the doctor's existing
+    slots are skipped, or with "on_overlap": "reject" nothing is inserted.
+    """
+    data = request.get_json() or {}
 
-    row = db.execute(
-        """
-        SELECT a.id, a.status, s.doctor_id
-        FROM appointments a
-        JOIN doctor_slots s ON s.id = a.slot_id
-        WHERE a.id = ?
-        """,
-        (appointment_id,)
-    ).fetchone()
+    on_overlap = data.get("on_overlap", "skip")
+    if on_overlap not in ("skip", "reject"):
+        return jsonify(error="on_overlap must be skip or reject"), 400
 
-    if not row:
-        return jsonify(error="Appointment not found"), 404
+    try:
+        spec = parse_recurrence(data)
+        new_slots, excluded_days = expand_recurrence(spec)
+    except RecurrenceError as exc:
+        return jsonify(error=str(exc)), 400
 
-    if row["doctor_id"] != int(request.user_id):
-        return jsonify(error="Forbidden"), 403
+    db = get_db()
 
-    if row["status"] != "booked":
-        return jsonify(error="Only booked appointments can be completed"), 400
+    with write_transaction(db):
+        rows = db.execute(
+            """
+            SELECT slot_time, end_time
+            FROM doctor_slots
+            WHERE doctor_id = ?
+              AND slot_time >= ?
+              AND slot_time < ?
+            ORDER BY slot_time
+            """,
+            (
+                request.user_id,
+                (spec["start_date"] - timedelta(days=1)).isoformat(),
+                (spec["end_date"] + timedelta(days=1)).isoformat(),
+            )
+        ).fetchall()
+
+        existing = []
+        for row in rows:
+            try:
+                existing.append((
+                    datetime.fromisoformat(row["slot_time"]),
+                    datetime.fromisoformat(row["end_time"]) if row["end_time"] else None,
+                ))
+            except ValueError:
+                continue
+
+        free, overlapping = split_overlapping(new_slots, existing)
+
+        if overlapping and on_overlap == "reject":
+            return jsonify(
+                error="Recurrence overlaps existing slots",
+                overlapping=len(overlapping)
+            ), 409
+
+        db.executemany(
+            """
+            INSERT INTO doctor_slots (doctor_id, slot_time, end_time, is_booked)
+            VALUES (?, ?, ?, 0)
+            """,
+            [
+                (request.user_id, start.isoformat(), end.isoformat())
+                for start, end in free
+            ]
+        )
+
+    get_availability_cache().invalidate_doctor(request.user_id)
 
-    # update appointment
-    db.execute(
-        "UPDATE appointments SET status = 'completed' WHERE id = ?",
-        (appointment_id,)
-    )
+    return jsonify(
+        doctor_id=request.user_id,
+        created=len(free),
+        skipped_overlapping=len(overlapping),
+        excluded_days=excluded_days
+    ), 201
 
-    # audit log
-    db.execute(
-        """
-        INSERT INTO appointment_audit_logs
-        (appointment_id, actor_role, actor_id, action)
-        VALUES (?, 'doctor', ?, 'COMPLETED')
-        """,
-        (appointment_id, request.user_id)
-    )
 
-    db.commit()
+@doctor_bp.route("/appointments/<int:appointment_id>/complete", methods=["POST"])
+@require_role("doctor")
+def complete_appointment(appointment_id):
+    db = get_db()
+
+    with write_transaction(db):
+        row = db.execute(
+            """
+            SELECT s.doctor_id
+            FROM appointments a
+            JOIN doctor_slots s ON s.id = a.slot_id
+            WHERE a.id = ?
+            """,
+            (appointment_id,)
+        ).fetchone()
+
+        if not row:
+            return jsonify(error="Appointment not found"), 404
+
+        if row["doctor_id"] != int(request.user_id):
+            return jsonify(error="Forbidden"), 403
+
+        # conditional on BOOKED: the NO_SHOW sweeper or another request
+        # may have moved it on since
+        updated = db.execute(
+            f"""
+            UPDATE appointments
+            SET status = {Status.COMPLETED.sql}
+            WHERE id = ?
+              AND status = {Status.BOOKED.sql}
+            RETURNING patient_id
+            """,
+            (appointment_id,)
+        ).fetchone()
+
+        if not updated:
+            return jsonify(error="Only booked appointments can be completed"), 409
+
+        counters.record_transition(db, Status.BOOKED, Status.COMPLETED)
+        appointments_changed(db, updated["patient_id"])
+
+        audit.record(db, appointment_id, "doctor", request.user_id, "COMPLETED")
 
     return jsonify(
         appointment_id=appointment_id,
-        status="COMPLETED"
+        status=Status.COMPLETED.label
     )
 
 
@@ -87,44 +179,45 @@ def complete_appointment(appointment_id):
 def mark_no_show(appointment_id):
     db = get_db()
 
-    row = db.execute(
-        """
-        SELECT a.id, a.status, s.doctor_id
-        FROM appointments a
-        JOIN doctor_slots s ON s.id = a.slot_id
-        WHERE a.id = ?
-        """,
-        (appointment_id,)
-    ).fetchone()
-
-    if not row:
-        return jsonify(error="Appointment not found"), 404
-
-    if row["doctor_id"] != int(request.user_id):
-        return jsonify(error="Forbidden"), 403
-
-    if row["status"] != "booked":
-        return jsonify(error="Only booked appointments can be marked no-show"), 400
-
-    # update appointment
-    db.execute(
-        "UPDATE appointments SET status = 'no_show' WHERE id = ?",
-        (appointment_id,)
-    )
-
-    # audit log
-    db.execute(
-        """
-        INSERT INTO appointment_audit_logs
-        (appointment_id, actor_role, actor_id, action)
-        VALUES (?, 'doctor', ?, 'NO_SHOW')
-        """,
-        (appointment_id, request.user_id)
-    )
-
-    db.commit()
+    with write_transaction(db):
+        row = db.execute(
+            """
+            SELECT s.doctor_id
+            FROM appointments a
+            JOIN doctor_slots s ON s.id = a.slot_id
+            WHERE a.id = ?
+            """,
+            (appointment_id,)
+        ).fetchone()
+
+        if not row:
+            return jsonify(error="Appointment not found"), 404
+
+        if row["doctor_id"] != int(request.user_id):
+            return jsonify(error="Forbidden"), 403
+
+        # conditional on BOOKED: the NO_SHOW sweeper or another request
+        # may have moved it on since
+        updated = db.execute(
+            f"""
+            UPDATE appointments
+            SET status = {Status.NO_SHOW.sql}
+            WHERE id = ?
+              AND status = {Status.BOOKED.sql}
+            RETURNING patient_id
+            """,
+            (appointment_id,)
+        ).fetchone()
+
+        if not updated:
+            return jsonify(error="Only booked appointments can be marked no-show"), 409
+
+        counters.record_transition(db, Status.BOOKED, Status.NO_SHOW)
+        appointments_changed(db, updated["patient_id"])
+
+        audit.record(db, appointment_id, "doctor", request.user_id, "NO_SHOW")
 
     return jsonify(
         appointment_id=appointment_id,
-        status="NO_SHOW"
+        status=Status.NO_SHOW.label
     )
@@ -1,10 +1,17 @@
+import sqlite3
+from datetime import date, timedelta
+
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from backend.db import get_db
-from backend.routes import require_role
-from backend.config import SECRET_KEY, JWT_ALGO, JWT_EXP_SECONDS
-from datetime import datetime, timedelta
-import jwt
+from backend import audit, counters
+from backend.response_cache import appointments_changed, bump, cached, patient_appointments
+from backend.db import get_db, release_db, write_transaction
+from backend.idempotency import idempotent
+from backend.passwords import get_password_hasher
+from backend.routes import require_role, issue_tokens
+from backend.availability import get_availability_cache, slot_changed
+from backend.config import AVAILABILITY_MAX_DAYS
+from backend.slots import release_slot
+from backend.status import Status
 
 patient_bp = Blueprint("patient", __name__, url_prefix="/patient")
 
@@ -18,9 +25,7 @@ def register_patient():
     if not username or not password:
         return jsonify(error="Username and password required"), 400
 
-    db = get_db()
-
-    existing = db.execute(
+    existing = get_db().execute(
         "SELECT id FROM users WHERE username=?",
         (username,)
     ).fetchone()
@@ -28,16 +33,25 @@ def register_patient():
     if existing:
         return jsonify(error="Username already exists"), 400
 
-    password_hash = generate_password_hash(password)
+    # the KDF can take seconds: do not hold a pooled connection meanwhile
+    release_db()
+    password_hash = get_password_hasher().hash(password)
 
-    db.execute(
-        """
-        INSERT INTO users (username, password_hash, role, is_active)
-        VALUES (?, ?, 'patient', 1)
-        """,
-        (username, password_hash)
-    )
-    db.commit()
+    db = get_db()
+    try:
+        with write_transaction(db):
+            db.execute(
+                """
+                INSERT INTO users (username, password_hash, role, is_active)
+                VALUES (?, ?, 'patient', 1)
+                """,
+                (username, password_hash)
+            )
+            counters.bump(db, total_patients=1)
+            bump(db, "patients")
+    except sqlite3.IntegrityError:
+        # registered by a concurrent request while the hash was computed
+        return jsonify(error="Username already exists"), 400
 
     return jsonify(message="Patient registered successfully"), 201
 
@@ -51,8 +65,7 @@ def login_patient():
     if not username or not password:
         return jsonify(error="Username and password required"), 400
 
-    db = get_db()
-    row = db.execute(
+    row = get_db().execute(
         """
         SELECT id, password_hash
         FROM users
@@ -62,27 +75,21 @@ def login_patient():
         """,
         (username,)
     ).fetchone()
+    release_db()
 
-    if not row or not check_password_hash(row["password_hash"], password):
+    if not row or not get_password_hasher().check(row["password_hash"], password):
         return jsonify(error="Invalid credentials"), 401
 
-    payload = {
-        "sub": str(row["id"]),
-        "role": "patient",
-        "exp": datetime.utcnow() + timedelta(seconds=JWT_EXP_SECONDS)
-    }
-
-    token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGO)
-
     return jsonify(
         patient_id=row["id"],
-        token=token,
-        message="Patient login successful"
+        message="Patient login successful",
+        **issue_tokens(get_db(), row["id"], "patient")
     )
 
 
 @patient_bp.route("/appointments", methods=["POST"])
 @require_role("patient")
+@idempotent
 def book_appointment():
     data = request.get_json(force=True)
 
@@ -96,35 +103,54 @@ def book_appointment():
     # SLOT-BASED PATH (preferred)
     # --------------------------------------
     if slot_id:
-        slot = db.execute(
-            """
-            SELECT id, doctor_id, is_booked
-            FROM doctor_slots
-            WHERE id = ?
-            """,
-            (slot_id,)
-        ).fetchone()
-
-        if not slot:
-            return jsonify(error="Slot not found"), 404
+        try:
+            with write_transaction(db):
+                # claim the slot only if it is still free: one conditional write
+                claimed = db.execute(
+                    """
+                    UPDATE doctor_slots
+                    SET is_booked = 1
+                    WHERE id = ?
+                      AND is_booked = 0
+                    RETURNING doctor_id, slot_time, end_time
+                    """,
+                    (slot_id,)
+                ).fetchone()
+
+                if claimed:
+                    db.execute(
+                        """
+                        INSERT INTO appointments
+                        (patient_id, slot_id, status, end_datetime, doctor_id, date)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            request.user_id,
+                            slot_id,
+                            Status.BOOKED,
+                            claimed["end_time"] or claimed["slot_time"],
+                            claimed["doctor_id"],
+                            claimed["slot_time"][:10],
+                        )
+                    )
+                    counters.record_transition(db, None, Status.BOOKED)
+                    appointments_changed(db, request.user_id)
+        except sqlite3.IntegrityError:
+            # uq_appt_slot_active: someone else holds an active booking
+            claimed = None
+
+        if not claimed:
+            slot = db.execute(
+                "SELECT id FROM doctor_slots WHERE id = ?",
+                (slot_id,)
+            ).fetchone()
+
+            if not slot:
+                return jsonify(error="Slot not found"), 404
 
-        if slot["is_booked"]:
             return jsonify(error="Slot already booked"), 409
 
-        db.execute(
-            "UPDATE doctor_slots SET is_booked = 1 WHERE id = ?",
-            (slot_id,)
-        )
-
-        db.execute(
-            """
-            INSERT INTO appointments (patient_id, slot_id, status)
-            VALUES (?, ?, 'booked')
-            """,
-            (request.user_id, slot_id)
-        )
-
-        db.commit()
+        slot_changed(claimed["doctor_id"], claimed["slot_time"])
 
         return jsonify(
             message="Appointment booked",
@@ -137,24 +163,26 @@ def book_appointment():
     if not doctor_id or not start:
         return jsonify(error="Missing fields"), 400
 
-    cur = db.execute(
-        """
-        INSERT INTO doctor_slots (doctor_id, slot_time, is_booked)
-        VALUES (?, ?, 1)
-        """,
-        (doctor_id, start)
-    )
-    new_slot_id = cur.lastrowid
-
-    db.execute(
-        """
-        INSERT INTO appointments (patient_id, slot_id, status)
-        VALUES (?, ?, 'booked')
-        """,
-        (request.user_id, new_slot_id)
-    )
+    with write_transaction(db):
+        cur = db.execute(
+            """
+            INSERT INTO doctor_slots (doctor_id, slot_time, is_booked)
+            VALUES (?, ?, 1)
+            """,
+            (doctor_id, start)
+        )
+        new_slot_id = cur.lastrowid
 
-    db.commit()
+        db.execute(
+            """
+            INSERT INTO appointments
+            (patient_id, slot_id, status, end_datetime, doctor_id, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (request.user_id, new_slot_id, Status.BOOKED, start, doctor_id, start[:10])
+        )
+        counters.record_transition(db, None, Status.BOOKED)
+        appointments_changed(db, request.user_id)
 
     return jsonify(
         message="Appointment booked",
@@ -164,6 +192,7 @@ def book_appointment():
 
 @patient_bp.route("/appointments", methods=["GET"])
 @require_role("patient")
+@cached(lambda: [patient_appointments(request.user_id)])
 def list_patient_appointments():
     db = get_db()
 
@@ -186,7 +215,7 @@ def list_patient_appointments():
     return jsonify([
         {
             "appointment_id": r["appointment_id"],
-            "status": r["status"],
+            "status": Status(r["status"]).label,
             "start_datetime": r["start_datetime"],
             "doctor": r["doctor_name"]
         }
@@ -196,43 +225,149 @@ def list_patient_appointments():
 
 @patient_bp.route("/appointments/<int:appointment_id>/cancel", methods=["PATCH"])
 @require_role("patient")
+@idempotent
 def cancel_appointment_by_patient(appointment_id):
     db = get_db()
 
-    row = db.execute(
-        """
-        SELECT id, patient_id, status
-        FROM appointments
-        WHERE id = ?
-        """,
-        (appointment_id,)
-    ).fetchone()
+    with write_transaction(db):
+        row = db.execute(
+            "SELECT patient_id FROM appointments WHERE id = ?",
+            (appointment_id,)
+        ).fetchone()
 
-    if not row:
-        return jsonify(error="Appointment not found"), 404
+        if not row:
+            return jsonify(error="Appointment not found"), 404
 
-    if row["patient_id"] != request.user_id:
-        return jsonify(error="Forbidden"), 403
+        if row["patient_id"] != request.user_id:
+            return jsonify(error="Forbidden"), 403
 
-    # update appointment
-    db.execute(
-        "UPDATE appointments SET status = 'cancelled' WHERE id = ?",
-        (appointment_id,)
-    )
+        # only an active booking can be cancelled: a concurrent cancel, or
+        # a complete / NO_SHOW that got there first, leaves nothing to do
+        cancelled = db.execute(
+            f"""
+            UPDATE appointments
+            SET status = {Status.CANCELLED.sql}
+            WHERE id = ?
+              AND status = {Status.BOOKED.sql}
+            RETURNING slot_id, patient_id
+            """,
+            (appointment_id,)
+        ).fetchone()
 
-    # audit log
-    db.execute(
-        """
-        INSERT INTO appointment_audit_logs
-        (appointment_id, actor_role, actor_id, action)
-        VALUES (?, 'patient', ?, 'CANCELLED_BY_PATIENT')
-        """,
-        (appointment_id, request.user_id)
-    )
+        if not cancelled:
+            return jsonify(error="Only booked appointments can be cancelled"), 409
+
+        counters.record_transition(db, Status.BOOKED, Status.CANCELLED)
+        appointments_changed(db, cancelled["patient_id"])
+
+        # an active booking gives its slot back
+        released = release_slot(db, cancelled["slot_id"])
 
-    db.commit()
+        audit.record(db, appointment_id, "patient", request.user_id, "CANCELLED_BY_PATIENT")
+
+    if released:
+        slot_changed(released["doctor_id"], released["slot_time"])
 
     return jsonify(
         message="Appointment cancelled",
         status="CANCELLED_BY_PATIENT"
     ), 200
+
+
+@patient_bp.route("/availability", methods=["GET"])
+@require_role("patient")
+def search_availability():
+    """
+    Free slots per doctor.
+
+    Query params (all optional):
+    - doctor_id, specialization
+    - from / to: ISO dates, inclusive (default: the next 7 days)
+    """
+    args = request.args
+
+    try:
+        day_from = date.fromisoformat(args["from"]) if args.get("from") else date.today()
+        day_to = date.fromisoformat(args["to"]) if args.get("to") else day_from + timedelta(days=6)
+    except ValueError:
+        return jsonify(error="from/to must be ISO dates"), 400
+
+    span = (day_to - day_from).days + 1
+    if not 1 <= span <= AVAILABILITY_MAX_DAYS:
+        return jsonify(error=f"Date range must cover 1 to {AVAILABILITY_MAX_DAYS} days"), 400
+
+    days = [(day_from + timedelta(days=i)).isoformat() for i in range(span)]
+
+    where = ["is_blacklisted = 0"]
+    params = []
+
+    doctor_id = args.get("doctor_id", type=int)
+    if doctor_id is not None:
+        where.append("user_id = ?")
+        params.append(doctor_id)
+
+    if args.get("specialization"):
+        where.append("specialization = ?")
+        params.append(args["specialization"])
+
+    db = get_db()
+    doctors = db.execute(
+        f"""
+        SELECT user_id, name, specialization
+        FROM doctors
+        WHERE {" AND ".join(where)}
+        ORDER BY user_id
+        """,
+        params
+    ).fetchall()
+
+    cache = get_availability_cache()
+    found = {}
+    missing = []
+
+    for doctor in doctors:
+        per_day = [cache.get(doctor["user_id"], day) for day in days]
+        if any(slots is None for slots in per_day):
+            missing.append(doctor["user_id"])
+        else:
+            found[doctor["user_id"]] = [slot for slots in per_day for slot in slots]
+
+    if missing:
+        # one range scan of the partial index over unbooked slots
+        rows = db.execute(
+            f"""
+            SELECT id, doctor_id, slot_time, end_time
+            FROM doctor_slots
+            WHERE is_booked = 0
+              AND doctor_id IN ({", ".join("?" * len(missing))})
+              AND slot_time >= ?
+              AND slot_time < ?
+            ORDER BY doctor_id, slot_time
+            """,
+            missing + [days[0], (day_to + timedelta(days=1)).isoformat()]
+        ).fetchall()
+
+        fresh = {(doc_id, day): [] for doc_id in missing for day in days}
+        for r in rows:
+            fresh[(r["doctor_id"], r["slot_time"][:10])].append({
+                "slot_id": r["id"],
+                "start_datetime": r["slot_time"],
+                "end_datetime": r["end_time"],
+            })
+
+        for (doc_id, day), slots in fresh.items():
+            cache.put(doc_id, day, slots)
+
+        for doc_id in missing:
+            found[doc_id] = [slot for day in days for slot in fresh[(doc_id, day)]]
+
+    return jsonify([
+        {
+            "doctor_id": doctor["user_id"],
+            "name": doctor["name"],
+            "specialization": doctor["specialization"],
+            "slots": found[doctor["user_id"]],
+        }
+        for doctor in doctors
+        if found[doctor["user_id"]]
+    ]), 200
@@ -0,0 +1,142 @@
+# backend/slots.py
+
+from datetime import date, datetime, time, timedelta
+
+BULK_SLOTS_MAX = 5000
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def parse_recurrence(data):
+    """
+    Validate a recurrence spec:
+
+        {
+            "start_date": "2030-01-01",      # inclusive
+            "end_date": "2030-01-31",        # inclusive
+            "days_of_week": [0, 1, 2, 3, 4], # Monday = 0
+            "start_time": "09:00",
+            "end_time": "17:00",
+            "slot_minutes": 30,
+            "exclude_dates": ["2030-01-15"]  # optional
+        }
+    """
+    try:
+        spec = {
+            "start_date": date.fromisoformat(data["start_date"]),
+            "end_date": date.fromisoformat(data["end_date"]),
+            "days_of_week": {int(d) for d in data["days_of_week"]},
+            "start_time": time.fromisoformat(data["start_time"]),
+            "end_time": time.fromisoformat(data["end_time"]),
+            "slot_minutes": int(data["slot_minutes"]),
+            "exclude_dates": {
+                date.fromisoformat(d) for d in data.get("exclude_dates") or []
+            },
+        }
+    except KeyError as exc:
+        raise RecurrenceError(f"{exc.args[0]} required")
+    except (TypeError, ValueError):
+        raise RecurrenceError("Invalid recurrence spec")
+
+    if spec["end_date"] < spec["start_date"]:
+        raise RecurrenceError("end_date must not be before start_date")
+    if not spec["days_of_week"] or not spec["days_of_week"] <= set(range(7)):
+        raise RecurrenceError("days_of_week must be weekday numbers 0-6 (Monday = 0)")
+    if spec["start_time"] >= spec["end_time"]:
+        raise RecurrenceError("start_time must be before end_time")
+    if spec["slot_minutes"] <= 0:
+        raise RecurrenceError("slot_minutes must be positive")
+
+    return spec
+
+
+def expand_recurrence(spec):
+    """
+    Return (slots, excluded_days) where slots is a sorted list of
+    (start, end) datetimes. Raises RecurrenceError above BULK_SLOTS_MAX.
+    """
+    length = timedelta(minutes=spec["slot_minutes"])
+    slots = []
+    excluded_days = 0
+
+    day = spec["start_date"]
+    while day <= spec["end_date"]:
+        if day.weekday() in spec["days_of_week"]:
+            if day in spec["exclude_dates"]:
+                excluded_days += 1
+            else:
+                start = datetime.combine(day, spec["start_time"])
+                day_end = datetime.combine(day, spec["end_time"])
+
+                while start + length <= day_end:
+                    slots.append((start, start + length))
+                    start += length
+
+                    if len(slots) > BULK_SLOTS_MAX:
+                        raise RecurrenceError(
+                            f"Recurrence expands to more than {BULK_SLOTS_MAX} slots"
+                        )
+
+        day += timedelta(days=1)
+
+    return slots, excluded_days
+
+
+def _overlaps(start, end, other_start, other_end):
+    if other_end is None or other_end <= other_start:
+        # legacy slots without an end are instants
+        return start <= other_start < end
+    return other_start < end and start < other_end
+
+
+def _finished_before(other, start):
+    other_start, other_end = other
+    if other_end is None or other_end <= other_start:
+        return other_start < start
+    return other_end <= start
+
+
+def split_overlapping(new_slots, existing):
+    """
+    Partition sorted new (start, end) slots against existing (start, end)
+    slots sorted by start, in one merge pass. Returns (free, overlapping).
+    """
+    free, overlapping = [], []
+    i = 0
+
+    for start, end in new_slots:
+        # new slots only move forward, so finished existing slots at the
+        # head of the list can never clash again
+        while i < len(existing) and _finished_before(existing[i], start):
+            i += 1
+
+        clash = False
+        j = i
+        while j < len(existing) and existing[j][0] < end:
+            if _overlaps(start, end, *existing[j]):
+                clash = True
+                break
+            j += 1
+
+        (overlapping if clash else free).append((start, end))
+
+    return free, overlapping
+
+
+def release_slot(db, slot_id):
+    """
+    Mark a booked slot free again. Returns (doctor_id, slot_time) of the
+    released slot, or None if it was not booked. Does not commit.
+    """
+    return db.execute(
+        """
+        UPDATE doctor_slots
+        SET is_booked = 0
+        WHERE id = ?
+          AND is_booked = 1
+        RETURNING doctor_id, slot_time
+        """,
+        (slot_id,)
+    ).fetchone()
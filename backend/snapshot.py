@@ -0,0 +1,188 @@
+# backend/snapshot.py
+
+"""
+Read-only analytics snapshot of the database.
+
+A beat task copies the live database with the online backup API,
+ANALYTICS_SNAPSHOT_PAGES_PER_STEP pages per step with a short pause in
+between, into a temporary file that is then renamed over the previous
+snapshot. The copy runs inside one read transaction on the source: in WAL
+mode its view does not change, so commits in the meantime neither wait
+for it nor force the backup to restart.
+
+Aggregate metrics endpoints read the snapshot through analytics_db(). If
+it is missing or older than ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS they read
+the live database instead. Either way the response carries X-Snapshot-Age
+(seconds; 0 when served live).
+"""
+
+import logging
+import os
+import sqlite3
+import time
+
+from flask import g
+
+from backend import job_state
+from backend.config import (
+    ANALYTICS_SNAPSHOT_PATH,
+    ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS,
+    ANALYTICS_SNAPSHOT_PAGES_PER_STEP,
+    ANALYTICS_SNAPSHOT_STEP_PAUSE_SECONDS,
+    ANALYTICS_SNAPSHOT_LEASE_SECONDS,
+)
+from backend.db import get_db, write_transaction
+from backend.init_db import get_db_path
+from backend.response_cache import bump
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "analytics_snapshot"
+
+# resource_versions entry bumped whenever a new snapshot is in place
+SNAPSHOT_RESOURCE = "analytics_snapshot"
+
+
+def snapshot_path():
+    return ANALYTICS_SNAPSHOT_PATH or f"{get_db_path()}.analytics"
+
+
+def take_snapshot(db_path=None, path=None):
+    """
+    Copy the database at `db_path` to `path`, replacing any previous
+    snapshot atomically. Returns the page count and backup steps taken.
+    """
+    path = path or snapshot_path()
+    tmp = f"{path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)  # left behind by a crashed run
+
+    source = sqlite3.connect(db_path or get_db_path(), isolation_level=None)
+    dest = sqlite3.connect(tmp)
+    steps = 0
+
+    def pace(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if remaining:
+            time.sleep(ANALYTICS_SNAPSHOT_STEP_PAUSE_SECONDS)
+
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        source.backup(dest, pages=ANALYTICS_SNAPSHOT_PAGES_PER_STEP, progress=pace)
+        source.execute("COMMIT")
+
+        # the copy inherits WAL mode; a rollback-journal file can be
+        # opened immutable, with no -wal / -shm next to it
+        dest.execute("PRAGMA journal_mode=DELETE")
+        pages = dest.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        source.close()
+        dest.close()
+
+    os.replace(tmp, path)
+    return {"pages": pages, "steps": steps}
+
+
+def refresh_snapshot():
+    """
+    One beat-triggered refresh: skips if another run holds the job lease,
+    otherwise takes a snapshot and bumps SNAPSHOT_RESOURCE.
+    """
+
+    db = get_db()
+    owner = job_state.new_owner()
+
+    if not job_state.acquire_lease(db, JOB_NAME, owner, ANALYTICS_SNAPSHOT_LEASE_SECONDS):
+        logger.info("analytics_snapshot | skipped, another run holds the lease")
+        return {"skipped": True}
+
+    start = time.perf_counter()
+    try:
+        result = take_snapshot()
+        elapsed = time.perf_counter() - start
+        with write_transaction(db):
+            bump(db, SNAPSHOT_RESOURCE)
+        job_state.record_run(db, JOB_NAME, result["pages"], elapsed)
+    finally:
+        job_state.release_lease(db, JOB_NAME, owner)
+
+    logger.info(
+        "analytics_snapshot | pages=%d | steps=%d | elapsed_ms=%.1f",
+        result["pages"], result["steps"], elapsed * 1000
+    )
+
+    return dict(result, skipped=False, elapsed_ms=round(elapsed * 1000, 3))
+
+
+def snapshot_age(path=None, now=None):
+    """
+    Seconds since the snapshot at `path` was taken, or None if there is none.
+    """
+    try:
+        taken_at = os.path.getmtime(path or snapshot_path())
+    except FileNotFoundError:
+        return None
+    return max(0.0, (time.time() if now is None else now) - taken_at)
+
+
+def open_snapshot_connection(path=None):
+    # immutable is safe: a refresh renames a new file into place, it
+    # never writes to one a reader may have open
+    conn = sqlite3.connect(
+        f"file:{path or snapshot_path()}?mode=ro&immutable=1",
+        uri=True,
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _snapshot_age_for_request():
+    """
+    Age of the snapshot this request reads, or None to read live; decided
+    once per request so ETag and body agree.
+    """
+    if "snapshot_age" not in g:
+        age = snapshot_age()
+        g.snapshot_age = age if age is not None and age <= ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS else None
+    return g.snapshot_age
+
+
+def analytics_resources(*live_resources):
+    """
+    @cached resources of an analytics view: the snapshot version while it
+    is read, otherwise the live resources it depends on.
+    """
+    if _snapshot_age_for_request() is None:
+        return list(live_resources)
+    return [SNAPSHOT_RESOURCE]
+
+
+def analytics_db():
+    """
+    Connection for aggregate queries: the snapshot if fresh enough,
+    otherwise the pooled live connection.
+    """
+    if _snapshot_age_for_request() is None:
+        return get_db()
+
+    if "snapshot_db" not in g:
+        g.snapshot_db = open_snapshot_connection()
+    return g.snapshot_db
+
+
+def init_app(app):
+    @app.after_request
+    def snapshot_age_header(response):
+        if "snapshot_age" in g:
+            age = g.snapshot_age
+            response.headers["X-Snapshot-Age"] = "0" if age is None else str(int(age))
+        return response
+
+    @app.teardown_appcontext
+    def close_snapshot(exception=None):
+        conn = g.pop("snapshot_db", None)
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,245 @@
+# backend/sql_trace.py
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+from backend.config import SQL_SLOW_MS, SQL_N_PLUS_ONE_THRESHOLD
+from backend.histogram import Histogram, COUNT_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "INSERT", "DELETE", "REPLACE")
+
+TOP_STATEMENTS = 50
+
+
+def normalize(sql):
+    """
+    One line per statement shape: collapse whitespace and IN-lists.
+    """
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _PLACEHOLDER_LIST.sub("(?, ...)", sql)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    Times execute()/executemany() and counts rows as they are fetched.
+    """
+
+    _event = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._event = _record(self, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._event = _record(self, sql, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+    def _count(self, n):
+        if self._event is not None:
+            self._event["rows"] += n
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose cursors report every statement to sql_trace.
+    Pass as `factory=` to sqlite3.connect.
+    """
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    # the C shortcuts bypass cursor(), so route them explicitly
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _record(cursor, sql, params, elapsed):
+    event = {
+        "sql": sql,
+        "elapsed": elapsed,
+        "rows": max(cursor.rowcount, 0),
+    }
+
+    if elapsed * 1000 >= SQL_SLOW_MS:
+        _log_slow(cursor.connection, sql, params, elapsed)
+
+    if has_app_context():
+        g.setdefault("sql_events", []).append(event)
+
+    return event
+
+
+def _log_slow(conn, sql, params, elapsed):
+    plan = []
+    if params is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+        try:
+            # a plain cursor: the EXPLAIN itself is not traced
+            plan = [
+                row[3]
+                for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params)
+            ]
+        except sqlite3.Error:
+            pass
+
+    logger.warning(
+        "slow query | %.1f ms | endpoint=%s | %s | plan=%s",
+        elapsed * 1000,
+        _endpoint(),
+        normalize(sql),
+        " / ".join(plan) or "n/a",
+    )
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or "<unmatched>"
+    return "<app-context>"
+
+
+class SqlTraceStats:
+    """
+    Per-endpoint and per-statement aggregates. Requests buffer their events
+    in `g` and merge them here once, at teardown.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._statements = {}
+
+    def flush(self, endpoint, events):
+        per_statement = {}  # normalized sql -> [calls, rows, latencies]
+        for event in events:
+            st = per_statement.setdefault(normalize(event["sql"]), [0, 0, []])
+            st[0] += 1
+            st[1] += event["rows"]
+            st[2].append(event["elapsed"])
+
+        repeated = {
+            key: calls
+            for key, (calls, _, _) in per_statement.items()
+            if calls >= SQL_N_PLUS_ONE_THRESHOLD
+        }
+        if repeated:
+            logger.warning("possible N+1 | endpoint=%s | %s", endpoint, repeated)
+
+        with self._lock:
+            ep = self._endpoints.get(endpoint)
+            if ep is None:
+                ep = self._endpoints[endpoint] = {
+                    "requests": 0,
+                    "n_plus_one": 0,
+                    "queries": Histogram(COUNT_BUCKETS),
+                    "sql_time": Histogram(),
+                }
+            ep["requests"] += 1
+            ep["n_plus_one"] += bool(repeated)
+            ep["queries"].observe(len(events))
+            ep["sql_time"].observe(sum(e["elapsed"] for e in events))
+
+            for key, (calls, rows, latencies) in per_statement.items():
+                st = self._statements.get(key)
+                if st is None:
+                    st = self._statements[key] = {
+                        "calls": 0,
+                        "rows": 0,
+                        "latency": Histogram(),
+                        "endpoints": set(),
+                    }
+                st["calls"] += calls
+                st["rows"] += rows
+                st["endpoints"].add(endpoint)
+                for latency in latencies:
+                    st["latency"].observe(latency)
+
+    def snapshot(self, top=TOP_STATEMENTS):
+        with self._lock:
+            endpoints = {
+                name: {
+                    "requests": ep["requests"],
+                    "n_plus_one_requests": ep["n_plus_one"],
+                    "queries_per_request": ep["queries"].summary(),
+                    "sql_time_ms": ep["sql_time"].summary(scale=1000),
+                }
+                for name, ep in self._endpoints.items()
+            }
+
+            statements = sorted(
+                self._statements.items(),
+                key=lambda item: item[1]["latency"].sum,
+                reverse=True,
+            )[:top]
+
+            return {
+                "endpoints": endpoints,
+                "statements": [
+                    {
+                        "sql": sql,
+                        "calls": st["calls"],
+                        "rows": st["rows"],
+                        "total_ms": round(st["latency"].sum * 1000, 3),
+                        "latency_ms": st["latency"].summary(scale=1000),
+                        "endpoints": sorted(st["endpoints"]),
+                    }
+                    for sql, st in statements
+                ],
+            }
+
+
+def get_sql_trace():
+    return current_app.extensions.get("hms_sql_trace")
+
+
+def flush_events(exception=None):
+    events = g.pop("sql_events", None)
+    stats = get_sql_trace()
+    if events and stats is not None:
+        stats.flush(_endpoint(), events)
+
+
+def init_app(app):
+    app.extensions["hms_sql_trace"] = SqlTraceStats()
+
+    # requests flush while the endpoint is still known; bare app contexts
+    # (Celery tasks, scripts) flush when the context ends
+    app.teardown_request(flush_events)
+    app.teardown_appcontext(flush_events)
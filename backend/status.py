@@ -0,0 +1,62 @@
+# backend/status.py
+
+"""
+Appointment status, stored as a small integer in appointments.status.
+
+Every status predicate in SQL is built from this module. Predicates embed
+the integer as a literal (`.sql`), not a bound parameter: SQLite only uses
+a partial index such as `... WHERE status = 1` when the query states the
+same constant.
+
+API responses use the upper-case label (`.label`); legacy spellings
+('booked', 'no_show', 'CANCELLED_BY_ADMIN', ...) are accepted by parse().
+"""
+
+from enum import IntEnum
+
+
+class Status(IntEnum):
+    BOOKED = 1
+    COMPLETED = 2
+    CANCELLED = 3
+    NO_SHOW = 4
+
+    @property
+    def label(self):
+        return self.name
+
+    @property
+    def sql(self):
+        return str(int(self))
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Status from an int, a Status or any legacy/label spelling.
+        Raises ValueError for anything else.
+        """
+        if isinstance(value, int):
+            return cls(value)
+
+        name = str(value).strip().upper()
+        if name.startswith("CANCEL"):
+            return cls.CANCELLED
+        try:
+            return cls[name]
+        except KeyError:
+            raise ValueError(f"Unknown appointment status: {value!r}") from None
+
+
+def legacy_text_case(column="status"):
+    """
+    CASE expression mapping the old free-text spellings to Status values;
+    NULL for anything unrecognized. Used by the status migration.
+    """
+    return f"""
+        CASE
+            WHEN UPPER({column}) = 'BOOKED' THEN {Status.BOOKED.sql}
+            WHEN UPPER({column}) = 'COMPLETED' THEN {Status.COMPLETED.sql}
+            WHEN UPPER({column}) LIKE 'CANCEL%' THEN {Status.CANCELLED.sql}
+            WHEN UPPER({column}) = 'NO_SHOW' THEN {Status.NO_SHOW.sql}
+        END
+    """
@@ -1,7 +1,14 @@
 from backend.celery_app import celery
-from backend.db import get_db
+from backend import counters, idempotency, outbox, refresh_tokens
+from backend.config import OUTBOX_MAX_BATCHES_PER_RUN
+from backend.db import get_db, write_transaction
 from datetime import date,timedelta
-from backend.email_utils import send_email
+from backend.email_utils import send_email, send_emails
+from backend.audit import archive_closed_months
+from backend.no_show import sweep_no_shows
+from backend.rollups import run_rollups
+from backend.snapshot import refresh_snapshot
+from backend.status import Status
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,22 +22,54 @@ logger = logging.getLogger(__name__)
 def send_email_task(to_email, subject, body):
     send_email(to_email, subject, body)
 
+
+@celery.task(name="drain_outbox_task")
+def drain_outbox_task():
+    """
+    Periodic task triggered by Celery Beat.
+
+    - Claims due email_outbox rows in batches
+    - Enqueues ONE send_outbox_batch_task per batch (not per email)
+    """
+
+    batches = outbox.claim_batches(get_db(), OUTBOX_MAX_BATCHES_PER_RUN)
+
+    for ids in batches:
+        send_outbox_batch_task.delay(ids)
+
+    logger.info(
+        "drain_outbox_task | batches=%d | emails=%d",
+        len(batches),
+        sum(len(ids) for ids in batches)
+    )
+
+    return len(batches)
+
+
+@celery.task(name="send_outbox_batch_task")
+def send_outbox_batch_task(ids):
+    """
+    Deliver one claimed outbox batch over a single pooled SMTP session;
+    failures are retried per row with backoff by the next drains, not by Celery.
+    """
+
+    sent, failed = outbox.send_batch(get_db(), ids, send_emails)
+
+    logger.info("send_outbox_batch_task | sent=%d | failed=%d", sent, failed)
+
+    return {"sent": sent, "failed": failed}
+
 @celery.task(name="mark_no_shows_task")
 def mark_no_shows_task():
     """
     Periodic task triggered by Celery Beat.
 
-    CURRENT BEHAVIOR (INTENTIONAL):
-    - No DB access
-    - No updates
-    - No emails
-    - No side effects
-
-    PURPOSE:
-    - Validate Beat → Worker → Task execution pipeline
-    - Provide stable anchor for future NO_SHOW automation
+    - Marks BOOKED appointments past their end time (+ grace) as NO_SHOW
+    - Chunked short transactions, resumable from a persisted watermark
+    - Overlapping runs are skipped via a lease in job_state
     """
-    logger.info("mark_no_shows_task executed (skeleton only)")
+
+    return sweep_no_shows()
 
 @celery.task(name="scan_tomorrow_appointments_task")
 def scan_tomorrow_appointments_task():
@@ -49,11 +88,11 @@ def scan_tomorrow_appointments_task():
     tomorrow = (date.today() + timedelta(days=1)).isoformat()
 
     rows = db.execute(
-        """
+        f"""
         SELECT id
         FROM appointments
         WHERE date = ?
-          AND status = 'BOOKED'
+          AND status = {Status.BOOKED.sql}
         ORDER BY id
         """,
         (tomorrow,)
@@ -73,3 +112,91 @@ def scan_tomorrow_appointments_task():
         "count": len(appointment_ids),
         "appointment_ids": appointment_ids,
     }
+
+
+@celery.task(name="reconcile_stats_task")
+def reconcile_stats_task():
+    """
+    Recompute dashboard counters from raw tables and repair drift.
+
+    - Overwrites stats_counters with freshly computed values
+    - Logs any counter that had drifted
+    """
+
+    drift = counters.reconcile(get_db())
+
+    if drift:
+        logger.warning("reconcile_stats_task | drift=%s", drift)
+    else:
+        logger.info("reconcile_stats_task | no drift")
+
+    return drift
+
+
+@celery.task(name="purge_refresh_tokens_task")
+def purge_refresh_tokens_task():
+    """
+    Delete expired refresh tokens.
+    """
+
+    db = get_db()
+    with write_transaction(db):
+        purged = refresh_tokens.purge_expired(db)
+
+    logger.info("purge_refresh_tokens_task | purged=%d", purged)
+
+    return purged
+
+
+@celery.task(name="refresh_analytics_snapshot_task")
+def refresh_analytics_snapshot_task():
+    """
+    Periodic task triggered by Celery Beat.
+
+    - Copies the live database to the read-only analytics snapshot
+    - Incremental online backup; writers are never blocked
+    - Overlapping runs are skipped via a lease in job_state
+    """
+
+    return refresh_snapshot()
+
+
+@celery.task(name="roll_up_outcomes_task")
+def roll_up_outcomes_task():
+    """
+    Periodic task triggered by Celery Beat.
+
+    - Folds new appointment_audit_logs rows into the daily outcome rollups
+    - Chunked short transactions, resumable from a persisted watermark
+    - Overlapping runs are skipped via a lease in job_state
+    """
+
+    return run_rollups()
+
+
+@celery.task(name="archive_audit_logs_task")
+def archive_audit_logs_task():
+    """
+    Periodic task triggered by Celery Beat.
+
+    - Moves closed months of appointment_audit_logs to the archive file
+    - Only rows the daily rollups have already applied
+    - Chunked short transactions; overlapping runs skipped via a lease
+    """
+
+    return archive_closed_months()
+
+
+@celery.task(name="purge_idempotency_keys_task")
+def purge_idempotency_keys_task():
+    """
+    Delete expired Idempotency-Key responses.
+    """
+
+    db = get_db()
+    with write_transaction(db):
+        purged = idempotency.purge_expired(db)
+
+    logger.info("purge_idempotency_keys_task | purged=%d", purged)
+
+    return purged
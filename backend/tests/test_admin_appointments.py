@@ -48,3 +48,120 @@ def test_admin_can_cancel_appointment(client):
     assert res.status_code == 200
     assert res.get_json()["status"] == "CANCELLED_BY_ADMIN"
 
+
+
+def test_admin_appointments_keyset_pages_and_filters(client):
+    client.post("/patient/register", json={"username": "p_pages", "password": "p123"})
+    login = client.post("/patient/login", json={"username": "p_pages", "password": "p123"})
+    ptoken = login.get_json()["token"]
+
+    for day in range(1, 6):
+        client.post(
+            "/patient/appointments",
+            json={
+                "doctor_id": 2,
+                "start_datetime": f"2030-01-0{day}T09:00:00",
+            },
+            headers=auth_header(ptoken)
+        )
+
+    headers = auth_header(get_admin_token(client))
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/admin/appointments?limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        page = client.get(url, headers=headers).get_json()
+        seen += [item["start_datetime"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+
+    res = client.get(
+        "/admin/appointments?format=ndjson&from=2030-01-02&to=2030-01-04&doctor_id=2",
+        headers=headers
+    )
+    lines = res.get_data(as_text=True).splitlines()
+    assert res.mimetype == "application/x-ndjson"
+    assert len(lines) == 2
+
+    res = client.get("/admin/appointments?cursor=not-a-cursor&limit=2", headers=headers)
+    assert res.status_code == 400
+
+
+def test_admin_stats_track_transitions_without_drift(client):
+    from backend import counters
+    from backend.db import get_db
+
+    client.post("/patient/register", json={"username": "p_stats", "password": "p123"})
+    login = client.post("/patient/login", json={"username": "p_stats", "password": "p123"})
+    ptoken = login.get_json()["token"]
+
+    for hour in (9, 10):
+        client.post(
+            "/patient/appointments",
+            json={"doctor_id": 2, "start_datetime": f"2030-02-01T{hour}:00:00"},
+            headers=auth_header(ptoken)
+        )
+
+    appt_id = client.get(
+        "/patient/appointments", headers=auth_header(ptoken)
+    ).get_json()[0]["appointment_id"]
+    client.patch(f"/patient/appointments/{appt_id}/cancel", headers=auth_header(ptoken))
+
+    stats = client.get("/admin/stats", headers=auth_header(get_admin_token(client))).get_json()
+    assert stats["total_patients"] == 1
+    assert stats["total_appointments"] == 2
+    assert stats["active_appointments"] == 1
+    assert stats["cancelled_appointments"] == 1
+
+    with client.application.app_context():
+        assert counters.reconcile(get_db()) == {}
+
+
+def test_settled_appointments_do_not_transition_again(client):
+    from backend import counters
+    from backend.db import get_db
+
+    client.post("/patient/register", json={"username": "p_settled", "password": "p123"})
+    ptoken = client.post(
+        "/patient/login", json={"username": "p_settled", "password": "p123"}
+    ).get_json()["token"]
+    dtoken = client.post(
+        "/doctor/login", json={"username": "doctor1", "password": "doctor123"}
+    ).get_json()["token"]
+    admin = auth_header(get_admin_token(client))
+
+    for hour in (9, 10):
+        client.post(
+            "/patient/appointments",
+            json={"doctor_id": 2, "start_datetime": f"2030-02-01T{hour}:00:00"},
+            headers=auth_header(ptoken)
+        )
+    first, second = [
+        a["appointment_id"]
+        for a in client.get("/patient/appointments", headers=auth_header(ptoken)).get_json()
+    ]
+
+    # a cancel racing another cancel, or a doctor racing the NO_SHOW sweep
+    assert client.patch(f"/patient/appointments/{first}/cancel", headers=auth_header(ptoken)).status_code == 200
+    assert client.patch(f"/admin/appointments/{first}/cancel", headers=admin).status_code == 409
+    assert client.patch(f"/patient/appointments/{first}/cancel", headers=auth_header(ptoken)).status_code == 409
+
+    assert client.post(f"/doctor/appointments/{second}/no-show", headers=auth_header(dtoken)).status_code == 200
+    assert client.post(f"/doctor/appointments/{second}/complete", headers=auth_header(dtoken)).status_code == 409
+    assert client.patch(f"/admin/appointments/{second}/cancel", headers=admin).status_code == 409
+
+    statuses = [a["status"] for a in client.get("/patient/appointments", headers=auth_header(ptoken)).get_json()]
+    assert statuses == ["CANCELLED", "NO_SHOW"]
+
+    with client.application.app_context():
+        db = get_db()
+        assert counters.reconcile(db) == {}
+        actions = db.execute("SELECT action FROM appointment_audit_logs ORDER BY id").fetchall()
+        assert [a[0] for a in actions] == ["CANCELLED_BY_PATIENT", "NO_SHOW"]
@@ -0,0 +1,176 @@
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+from backend import audit
+from backend.db import get_db
+from backend.init_db import get_db_path
+from backend.rollups import run_rollups
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    path = str(tmp_path / "audit-archive.db")
+    monkeypatch.setattr(audit, "AUDIT_ARCHIVE_PATH", path)
+    return path
+
+
+def admin_header(client):
+    token = client.post(
+        "/admin/login", json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_entries(created_at, entries):
+    live = sqlite3.connect(get_db_path())
+    live.executemany(
+        """
+        INSERT INTO appointment_audit_logs (appointment_id, actor_role, actor_id, action, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [entry + (created_at,) for entry in entries]
+    )
+    live.commit()
+    live.close()
+
+
+def hot_ids():
+    live = sqlite3.connect(get_db_path())
+    ids = [row[0] for row in live.execute("SELECT id FROM appointment_audit_logs ORDER BY id")]
+    live.close()
+    return ids
+
+
+def roll_up(client):
+    with client.application.app_context():
+        run_rollups()
+
+
+def test_lookup_by_appointment_and_actor(client, archive):
+    admin = admin_header(client)
+    with client.application.app_context():
+        db = get_db()
+        audit.record(db, 7, "doctor", 2, "COMPLETED")
+        audit.record_many(db, [(i, "system", 0, "NO_SHOW") for i in range(1, 6)])
+        db.commit()
+
+    items = client.get("/admin/audit-logs?appointment_id=7", headers=admin).get_json()["items"]
+    assert [(i["actor_role"], i["action"]) for i in items] == [("doctor", "COMPLETED")]
+
+    first = client.get("/admin/audit-logs?actor_role=system&actor_id=0&limit=3", headers=admin).get_json()
+    assert [i["appointment_id"] for i in first["items"]] == [5, 4, 3]
+    rest = client.get(
+        f"/admin/audit-logs?actor_role=system&actor_id=0&limit=3&cursor={first['next_cursor']}", headers=admin
+    ).get_json()
+    assert [i["appointment_id"] for i in rest["items"]] == [2, 1]
+    assert rest["next_cursor"] is None
+
+    assert client.get("/admin/audit-logs?actor_role=system", headers=admin).status_code == 400
+    assert client.get("/admin/audit-logs?appointment_id=7&limit=0", headers=admin).status_code == 400
+
+
+def test_closed_months_move_to_the_archive(client, archive):
+    admin = admin_header(client)
+    add_entries("2026-01-10 09:00:00", [(1, "doctor", 2, "COMPLETED"), (2, "admin", 1, "CANCELLED_BY_ADMIN")])
+    add_entries("2026-03-02 09:00:00", [(1, "system", 0, "NO_SHOW")])
+    roll_up(client)
+    add_entries("2026-01-20 09:00:00", [(3, "doctor", 2, "COMPLETED")])  # not rolled up yet
+
+    result = audit.archive_closed_months(today=date(2026, 3, 15))
+    assert result["before"] == "2026-02-01"
+    assert result["moved"] == 2
+    assert len(hot_ids()) == 2
+
+    items = client.get("/admin/audit-logs?appointment_id=1", headers=admin).get_json()["items"]
+    assert [i["action"] for i in items] == ["NO_SHOW", "COMPLETED"]
+
+    lines = client.get("/admin/export/audit-logs?format=ndjson", headers=admin, buffered=True).get_data(as_text=True)
+    exported = [json.loads(line) for line in lines.splitlines()]
+    assert [e["created_at"] for e in exported] == sorted(e["created_at"] for e in exported)
+    assert len(exported) == 4
+
+    roll_up(client)
+    assert audit.archive_closed_months(today=date(2026, 3, 15))["moved"] == 1
+
+
+def test_interrupted_move_is_finished_and_never_shows_twice(client, archive):
+    admin = admin_header(client)
+    add_entries("2026-01-10 09:00:00", [(1, "doctor", 2, "COMPLETED"), (1, "system", 0, "NO_SHOW")])
+    roll_up(client)
+
+    # the archive side of a move committed, the hot-side delete did not
+    audit.archive_closed_months(today=date(2026, 1, 15))  # creates the archive, moves nothing
+    conn = sqlite3.connect(archive)
+    live = sqlite3.connect(get_db_path())
+    conn.executemany(
+        "INSERT INTO appointment_audit_logs VALUES (?, ?, ?, ?, ?, ?)",
+        live.execute("SELECT * FROM appointment_audit_logs").fetchall()
+    )
+    conn.commit()
+    conn.close()
+    live.close()
+
+    items = client.get("/admin/audit-logs?appointment_id=1", headers=admin).get_json()["items"]
+    assert len(items) == 2
+
+    assert audit.archive_closed_months(today=date(2026, 3, 15))["moved"] == 2
+    assert hot_ids() == []
+    assert len(client.get("/admin/audit-logs?appointment_id=1", headers=admin).get_json()["items"]) == 2
+
+
+def test_crash_after_the_archive_copy_loses_nothing(client, archive):
+    admin = admin_header(client)
+    add_entries("2026-01-10 09:00:00", [(1, "doctor", 2, "COMPLETED"), (1, "system", 0, "NO_SHOW")])
+    roll_up(client)
+
+    # the copy commits, then the process dies before the hot-side delete
+    live = sqlite3.connect(get_db_path())
+    live.execute("""
+        CREATE TRIGGER crash BEFORE DELETE ON appointment_audit_logs
+        BEGIN SELECT RAISE(ABORT, 'crashed'); END
+    """)
+    live.commit()
+    with pytest.raises(sqlite3.IntegrityError, match="crashed"):
+        audit.archive_closed_months(today=date(2026, 3, 15))
+
+    archived = sqlite3.connect(archive)
+    assert archived.execute("SELECT COUNT(*) FROM appointment_audit_logs").fetchone()[0] == 2
+    archived.close()
+    assert len(hot_ids()) == 2
+    assert len(client.get("/admin/audit-logs?appointment_id=1", headers=admin).get_json()["items"]) == 2
+
+    live.execute("DROP TRIGGER crash")
+    live.commit()
+    live.close()
+
+    assert audit.archive_closed_months(today=date(2026, 3, 15))["moved"] == 2
+    assert hot_ids() == []
+    assert len(client.get("/admin/audit-logs?appointment_id=1", headers=admin).get_json()["items"]) == 2
+
+
+def test_archive_cutoff(monkeypatch):
+    assert audit.archive_cutoff(date(2026, 1, 15)) == "2025-12-01"
+    monkeypatch.setattr(audit, "AUDIT_HOT_MONTHS", 1)
+    assert audit.archive_cutoff(date(2026, 1, 15)) == "2026-01-01"
+
+
+def test_reads_merge_archive_and_hot_table_without_sorting(client, archive):
+    audit.archive_closed_months()
+    conn = audit.open_reader(archived=True)
+
+    lookups = [
+        ("created_at >= ?", ["2026-01-01"], " ORDER BY created_at, id"),
+        ("appointment_id = ?", [1], " ORDER BY id DESC LIMIT 50"),
+        ("actor_role = ? AND actor_id = ? AND id < ?", ["system", 0, 100], " ORDER BY id DESC LIMIT 50"),
+    ]
+    try:
+        for where, params, order in lookups:
+            sql, copies = audit.union_sql(True, where)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql + order, params * copies)]
+            assert plan[0] == "MERGE (UNION ALL)", plan
+            assert not any("TEMP B-TREE" in detail or detail.startswith("SCAN") for detail in plan), plan
+    finally:
+        conn.close()
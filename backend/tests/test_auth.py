@@ -1,3 +1,11 @@
+import threading
+import time
+
+import pytest
+
+from backend.passwords import KdfBusy, PasswordHasher
+
+
 def test_admin_login_success(client):
     res = client.post(
         "/admin/login",
@@ -21,3 +29,208 @@ def test_patient_register_and_login(client):
     assert res.status_code == 200
     assert "token" in res.get_json()
 
+
+
+def test_verified_tokens_are_cached(client):
+    token = client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client.get("/admin/me", headers=headers)
+    client.get("/admin/me", headers=headers)
+
+    stats = client.get("/admin/metrics/token-cache", headers=headers).get_json()
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 2
+
+
+def test_deactivated_patient_token_is_revoked(client):
+    client.post("/patient/register", json={"username": "p_revoked", "password": "p123"})
+    login = client.post("/patient/login", json={"username": "p_revoked", "password": "p123"})
+    patient_id = login.get_json()["patient_id"]
+    pheaders = {"Authorization": f"Bearer {login.get_json()['token']}"}
+
+    assert client.get("/patient/appointments", headers=pheaders).status_code == 200
+
+    admin_token = client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+    res = client.patch(
+        f"/admin/patients/{patient_id}/deactivate",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert res.status_code == 200
+
+    res = client.get("/patient/appointments", headers=pheaders)
+    assert res.status_code == 401
+    assert res.get_json()["error"] == "Token revoked"
+
+
+def patient_session(client, username):
+    client.post("/patient/register", json={"username": username, "password": "p123"})
+    return client.post("/patient/login", json={"username": username, "password": "p123"}).get_json()
+
+
+def test_refresh_rotates_without_password(client, monkeypatch):
+    login = patient_session(client, "p_refresh")
+    assert login["refresh_token"] and login["expires_in"] > 0
+
+    # refreshing never runs the KDF
+    monkeypatch.setattr("backend.passwords.check_password_hash", None)
+
+    res = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["refresh_token"] != login["refresh_token"]
+
+    me = client.get("/patient/appointments", headers={"Authorization": f"Bearer {body['token']}"})
+    assert me.status_code == 200
+
+    again = client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]})
+    assert again.status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_session(client):
+    login = patient_session(client, "p_reuse")
+    rotated = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]}).get_json()
+
+    # the first token was spent: replaying it ends the whole session
+    res = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert res.status_code == 401
+
+    res = client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert res.status_code == 401
+
+
+def test_logout_and_deactivation_revoke_refresh_tokens(client):
+    first = patient_session(client, "p_logout")
+    second = client.post("/patient/login", json={"username": "p_logout", "password": "p123"}).get_json()
+
+    assert client.post("/auth/logout", json={"refresh_token": first["refresh_token"]}).status_code == 200
+    assert client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]}).status_code == 401
+
+    admin_token = client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+    client.patch(
+        f"/admin/patients/{second['patient_id']}/deactivate",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]}).status_code == 401
+
+
+def test_kdf_executor_caps_pending_work(monkeypatch):
+    release = threading.Event()
+
+    def slow_check(password_hash, password):
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr("backend.passwords.check_password_hash", slow_check)
+    hasher = PasswordHasher(1, max_pending=2, timeout=5)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(hasher.check("h", "p")))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    while hasher.stats()["pending"] < 2:
+        time.sleep(0.001)
+
+    with pytest.raises(KdfBusy):
+        hasher.check("h", "p")
+
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [True, True]
+    stats = hasher.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["pending"] == 0
+    hasher.close()
+
+
+def test_saturated_kdf_returns_503(client, monkeypatch):
+    full = threading.BoundedSemaphore(1)
+    full.acquire()
+    monkeypatch.setattr(client.application.extensions["hms_passwords"], "_slots", full)
+
+    res = client.post("/admin/login", json={"username": "admin", "password": "admin123"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+
+
+def test_logins_waiting_on_the_kdf_hold_no_pooled_connection(client, monkeypatch):
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    def slow_check(password_hash, password):
+        started.release()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr("backend.passwords.check_password_hash", slow_check)
+    pool = client.application.extensions["hms_db_pool"]
+    monkeypatch.setattr(pool, "size", 2)
+    monkeypatch.setattr(pool, "timeout", 0.5)
+
+    def login():
+        with client.application.test_client() as c:
+            statuses.append(c.post("/admin/login", json={"username": "admin", "password": "admin123"}).status_code)
+
+    statuses = []
+    threads = [threading.Thread(target=login) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for _ in threads:
+        assert started.acquire(timeout=5)
+
+    assert client.get("/health").status_code == 200
+
+    release.set()
+    for t in threads:
+        t.join()
+    assert statuses == [200, 200]
+
+
+
+def test_revocation_is_sub_second_and_forgotten_after_token_lifetime():
+    from backend.config import JWT_EXP_SECONDS
+    from backend.token_cache import TokenCache
+
+    cache = TokenCache(10)
+    cache.invalidate_user(7, now=1000.5)
+
+    # issued earlier in the same second: revoked; later in it: accepted
+    assert not cache.put("before", {"sub": "7", "iat": 1000.2, "exp": 2000})
+    assert cache.put("after", {"sub": "7", "iat": 1000.7, "exp": 2000})
+
+    cache.invalidate_user(8, now=1000.5 + JWT_EXP_SECONDS + 1)
+    assert cache.stats()["revoked_users"] == 1
+    assert cache.is_revoked({"sub": "8", "iat": 1000.7})
+
+
+def test_reactivated_patient_can_log_in_again_at_once(client):
+    login = patient_session(client, "p_reactivated")
+    admin = {"Authorization": "Bearer " + client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]}
+
+    client.patch(f"/admin/patients/{login['patient_id']}/deactivate", headers=admin)
+    client.patch(f"/admin/patients/{login['patient_id']}/activate", headers=admin)
+
+    token = client.post(
+        "/patient/login",
+        json={"username": "p_reactivated", "password": "p123"}
+    ).get_json()["token"]
+    res = client.get("/patient/appointments", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
@@ -0,0 +1,45 @@
+import json
+import sqlite3
+
+from bench import datagen, load_test
+
+
+def dataset(path):
+    datagen.generate(str(path), doctors=4, patients=40, appointments=400, seed=7)
+    conn = sqlite3.connect(str(path))
+    rows = conn.execute(
+        "SELECT slot_id, patient_id, status, date FROM appointments ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_datagen_is_reproducible(tmp_path, monkeypatch):
+    monkeypatch.setenv("HMS_DB_PATH", str(tmp_path / "unused.db"))
+
+    first = dataset(tmp_path / "a.db")
+    assert len(first) == 400
+    assert first == dataset(tmp_path / "b.db")
+
+
+def test_load_test_reports_every_operation(tmp_path, monkeypatch):
+    monkeypatch.setenv("HMS_DB_PATH", str(tmp_path / "unused.db"))
+    # config is already imported by other tests; all traffic is from one address
+    monkeypatch.setattr("backend.rate_limit.RATE_LIMIT_ENABLED", False)
+    db_path = str(tmp_path / "bench.db")
+    datagen.generate(db_path, doctors=4, patients=40, appointments=400, seed=7)
+
+    mix = {"login": 1, "book": 3, "list_patient": 3, "list_admin": 1, "cancel": 3, "admin_stats": 1}
+    report = load_test.run(db_path, concurrency=2, duration=1.5, mix=mix)
+
+    assert report["totals"]["errors"] == 0
+    assert report["totals"]["requests"] > 0
+    assert {"login", "book", "list_patient"} <= set(report["operations"])
+    # every successful booking took the write lock in write_transaction
+    booked = report["operations"]["book"]["statuses"].get("201", 0)
+    assert booked > 0
+    assert report["db"]["write_lock_acquired"] >= booked
+
+    saved = load_test.save(report, str(tmp_path / "results"))
+    with open(saved) as f:
+        assert len(load_test.compare(report, json.load(f))) == len(report["operations"]) + 2
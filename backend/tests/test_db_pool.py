@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from backend.db import (
+    ConnectionPool,
+    PoolTimeout,
+    open_connection,
+    write_lock_stats,
+    write_transaction,
+)
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_pool_reuses_and_recycles_connections(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, timeout=0.1, max_uses=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+
+    # second release hits max_uses -> connection is closed and replaced
+    pool.release(first)
+    assert pool.acquire() is not first
+    assert pool.stats()["recycled"] == 1
+
+
+def test_pool_is_bounded_and_times_out(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05, max_uses=100)
+
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    # a waiter is woken as soon as the connection is returned
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    pool.timeout = 1
+    waiter.start()
+    pool.release(held)
+    waiter.join()
+
+    assert got == [held]
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_stats_exposed_to_metrics(client):
+    token = client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+
+    res = client.get("/admin/metrics/db-pool", headers=auth_header(token))
+    assert res.status_code == 200
+
+    stats = res.get_json()
+    # the login request's connection went back to the pool, not closed
+    assert stats["open"] >= 1
+    assert stats["idle"] == stats["open"]
+    assert set(stats["write_lock"]) == {"acquired", "wait_seconds", "max_wait_seconds"}
+
+
+def test_write_transaction_records_lock_waits(tmp_path):
+    conn = open_connection(str(tmp_path / "lock.db"))
+    before = write_lock_stats()
+
+    with write_transaction(conn):
+        conn.execute("CREATE TABLE t (x)")
+
+    after = write_lock_stats()
+    assert after["acquired"] == before["acquired"] + 1
+    assert after["wait_seconds"] >= before["wait_seconds"]
+    conn.close()
@@ -0,0 +1,68 @@
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def get_doctor_token(client):
+    res = client.post(
+        "/doctor/login",
+        json={"username": "doctor1", "password": "doctor123"}
+    )
+    return res.get_json()["token"]
+
+
+def test_bulk_recurring_slots_skip_overlaps(client):
+    headers = auth_header(get_doctor_token(client))
+
+    # an existing 09:00-10:00 slot on Monday 2030-01-07
+    client.post(
+        "/doctor/slots",
+        json={
+            "start_datetime": "2030-01-07T09:00:00",
+            "end_datetime": "2030-01-07T10:00:00",
+        },
+        headers=headers
+    )
+
+    spec = {
+        "start_date": "2030-01-07",
+        "end_date": "2030-01-13",
+        "days_of_week": [0, 2, 4],
+        "start_time": "09:00",
+        "end_time": "12:00",
+        "slot_minutes": 30,
+        "exclude_dates": ["2030-01-09"],
+    }
+
+    res = client.post("/doctor/slots/bulk", json=spec, headers=headers)
+    assert res.status_code == 201
+    body = res.get_json()
+    # Mon + Fri, 6 slots each, minus the two covered by the existing slot
+    assert body["created"] == 10
+    assert body["skipped_overlapping"] == 2
+    assert body["excluded_days"] == 1
+
+    # replaying the same spec overlaps everything
+    res = client.post("/doctor/slots/bulk", json=dict(spec, on_overlap="reject"), headers=headers)
+    assert res.status_code == 409
+    assert res.get_json()["overlapping"] == 12
+
+
+def test_bulk_recurring_slots_validate_spec(client):
+    headers = auth_header(get_doctor_token(client))
+
+    res = client.post(
+        "/doctor/slots/bulk",
+        json={
+            "start_date": "2030-01-07",
+            "end_date": "2031-01-07",
+            "days_of_week": [0, 1, 2, 3, 4, 5, 6],
+            "start_time": "00:00",
+            "end_time": "23:00",
+            "slot_minutes": 5,
+        },
+        headers=headers
+    )
+    assert res.status_code == 400
+
+    res = client.post("/doctor/slots/bulk", json={"start_date": "2030-01-07"}, headers=headers)
+    assert res.status_code == 400
@@ -0,0 +1,135 @@
+import smtplib
+import threading
+
+from backend.email_utils import SmtpPool, build_message
+
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.drop_after = None
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        if self.closed or (self.drop_after is not None and len(self.sent) >= self.drop_after):
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        if msg["To"] == "refused@example.com":
+            raise smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")})
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+def make_pool(**kwargs):
+    FakeSMTP.instances = []
+    kwargs.setdefault("size", 2)
+    return SmtpPool("localhost", 1025, starttls=False, auth=False, smtp_factory=FakeSMTP, **kwargs)
+
+
+def messages(*recipients):
+    return [build_message(to, "s", "b") for to in recipients]
+
+
+def test_sessions_are_reused_across_batches():
+    pool = make_pool()
+
+    assert pool.send_messages(messages("a@x", "b@x")) == [None, None]
+    assert pool.send_messages(messages("c@x")) == [None]
+
+    assert pool.stats()["connects"] == 1
+    assert FakeSMTP.instances[0].sent == ["a@x", "b@x", "c@x"]
+
+
+def test_refused_recipient_keeps_the_session():
+    pool = make_pool()
+
+    results = pool.send_messages(messages("a@x", "refused@example.com", "b@x"))
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], smtplib.SMTPRecipientsRefused)
+    assert pool.stats()["connects"] == 1
+
+
+def test_dropped_session_reconnects_and_retries():
+    pool = make_pool()
+    pool.send_messages(messages("a@x"))
+    FakeSMTP.instances[0].drop_after = 1
+
+    assert pool.send_messages(messages("b@x", "c@x")) == [None, None]
+    assert pool.stats()["connects"] == 2
+    assert FakeSMTP.instances[1].sent == ["b@x", "c@x"]
+
+
+def test_unreachable_server_fails_the_batch_after_one_connect():
+    pool = make_pool()
+    attempts = []
+
+    class UnreachableSMTP(FakeSMTP):
+        def __init__(self, host, port, timeout=None):
+            attempts.append(timeout)
+            raise ConnectionRefusedError("connection refused")
+
+    pool.smtp_factory = UnreachableSMTP
+
+    results = pool.send_messages(messages("a@x", "b@x", "c@x"))
+    assert len(attempts) == 1
+    assert len(results) == 3
+    assert all(isinstance(r, ConnectionRefusedError) for r in results)
+    assert results[0] is results[2]
+
+    pool.send_messages(messages("d@x", "e@x"))
+    assert len(attempts) == 2
+    assert pool.stats()["connects"] == 0
+
+
+def test_idle_and_worn_out_sessions_are_replaced():
+    pool = make_pool(idle_timeout=0)
+    pool.send_messages(messages("a@x"))
+    pool.send_messages(messages("b@x"))
+    assert pool.stats()["connects"] == 2
+    assert FakeSMTP.instances[0].closed
+
+    pool = make_pool(max_messages=2)
+    pool.send_messages(messages("a@x", "b@x", "c@x"))
+    assert pool.stats()["connects"] == 2
+
+
+def test_concurrent_sessions_are_capped():
+    pool = make_pool(size=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    class SlowSMTP(FakeSMTP):
+        def send_message(self, msg):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            threading.Event().wait(0.01)
+            with lock:
+                active[0] -= 1
+
+    pool.smtp_factory = SlowSMTP
+    threads = [
+        threading.Thread(target=pool.send_messages, args=(messages("a@x", "b@x"),))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak[0] <= 2
+    assert pool.stats()["connects"] <= 2
+    assert pool.stats()["messages"] == 16
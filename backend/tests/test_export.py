@@ -0,0 +1,169 @@
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from backend import export
+from backend.init_db import get_db_path
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def admin_header(client):
+    return auth_header(client.post(
+        "/admin/login", json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"])
+
+
+def download(client, url, headers):
+    # buffered: the test client closes the response, releasing the export slot
+    return client.get(url, headers=headers, buffered=True)
+
+
+def book_and_cancel(client, username):
+    doctor = client.post(
+        "/doctor/login", json={"username": "doctor1", "password": "doctor123"}
+    ).get_json()["token"]
+    start = datetime.utcnow() + timedelta(days=1)
+    slot_id = client.post("/doctor/slots", headers=auth_header(doctor), json={
+        "start_datetime": start.isoformat(timespec="seconds"),
+        "end_datetime": (start + timedelta(minutes=30)).isoformat(timespec="seconds"),
+    }).get_json()["slot_id"]
+
+    client.post("/patient/register", json={"username": username, "password": "p123"})
+    patient = auth_header(client.post(
+        "/patient/login", json={"username": username, "password": "p123"}
+    ).get_json()["token"])
+    client.post("/patient/appointments", headers=patient, json={"slot_id": slot_id})
+    appointment_id = client.get(
+        "/patient/appointments", headers=patient
+    ).get_json()[0]["appointment_id"]
+    client.patch(f"/patient/appointments/{appointment_id}/cancel", headers=patient)
+    return appointment_id, start.date()
+
+
+def test_appointments_csv_and_ndjson(client):
+    admin = admin_header(client)
+    appointment_id, day = book_and_cancel(client, "p_export")
+
+    res = download(client, "/admin/export/appointments", admin)
+    assert res.status_code == 200
+    assert res.mimetype == "text/csv"
+    assert res.headers["Content-Disposition"] == "attachment; filename=appointments.csv"
+
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert [r["appointment_id"] for r in rows] == [str(appointment_id)]
+    assert rows[0]["status"] == "CANCELLED"
+    assert rows[0]["patient_username"] == "p_export"
+    assert rows[0]["doctor_username"] == "doctor1"
+
+    res = download(client, f"/admin/export/appointments?format=ndjson&from={day}", admin)
+    assert res.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert [line["appointment_id"] for line in lines] == [appointment_id]
+
+    res = download(client, f"/admin/export/appointments?to={day}", admin)
+    assert res.get_data(as_text=True).splitlines() == [
+        "appointment_id,status,start_datetime,end_datetime,patient_id,"
+        "patient_username,doctor_id,doctor_username,created_at"
+    ]
+
+
+def test_audit_logs_gzip(client):
+    admin = admin_header(client)
+    appointment_id, _ = book_and_cancel(client, "p_export_audit")
+
+    res = download(client, "/admin/export/audit-logs?format=ndjson&gzip=1", admin)
+    assert res.headers["Content-Encoding"] == "gzip"
+
+    lines = gzip.decompress(res.get_data()).decode().splitlines()
+    actions = [json.loads(line)["action"] for line in lines]
+    assert "CANCELLED_BY_PATIENT" in actions
+
+    tomorrow = date.today() + timedelta(days=1)
+    res = download(client, f"/admin/export/audit-logs?format=ndjson&from={tomorrow}", admin)
+    assert res.get_data() == b""
+
+
+def test_bad_parameters(client):
+    admin = admin_header(client)
+
+    assert download(client, "/admin/export/appointments?format=xml", admin).status_code == 400
+    assert download(client, "/admin/export/audit-logs?from=yesterday", admin).status_code == 400
+    assert client.get("/admin/export/appointments").status_code == 401
+
+
+def test_concurrency_cap_and_slot_release(client, monkeypatch):
+    admin = admin_header(client)
+    monkeypatch.setattr(export, "_slots", threading.BoundedSemaphore(1))
+
+    running = client.get("/admin/export/audit-logs", headers=admin, buffered=False)
+    busy = download(client, "/admin/export/audit-logs", admin)
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "30"
+
+    running.close()
+    assert download(client, "/admin/export/audit-logs", admin).status_code == 200
+
+
+def test_failed_query_closes_its_connection(client, monkeypatch):
+    monkeypatch.setattr(export, "_slots", threading.BoundedSemaphore(1))
+    opened = []
+
+    def connect():
+        opened.append(export.open_export_connection(get_db_path()))
+        return opened[-1]
+
+    with client.application.test_request_context():
+        try:
+            export.stream("SELECT nope FROM nowhere", (), ["nope"], "csv", "x", connect=connect)
+        except sqlite3.OperationalError:
+            pass
+        else:
+            raise AssertionError("bad query did not raise")
+
+    try:
+        opened[0].execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        pass
+    else:
+        raise AssertionError("connection left open")
+    assert export._slots.acquire(blocking=False)
+
+
+def test_export_connection_is_read_only(client):
+    conn = export.open_export_connection(get_db_path())
+    try:
+        conn.execute("DELETE FROM appointment_audit_logs")
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("export connection accepted a write")
+    finally:
+        conn.close()
+
+
+def test_export_queries_stream_in_index_order(client):
+    # no temp b-tree: the first rows go out before the last are read
+    conn = export.open_export_connection(get_db_path())
+    statements = [
+        """
+        SELECT a.id FROM appointments a
+        JOIN doctor_slots s ON s.id = a.slot_id
+        JOIN users pu ON pu.id = a.patient_id
+        JOIN users du ON du.id = s.doctor_id
+        WHERE a.date >= ? ORDER BY a.date, a.id
+        """,
+        "SELECT id FROM appointment_audit_logs WHERE created_at >= ? ORDER BY created_at, id",
+    ]
+    try:
+        for sql in statements:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, ("2026-01-01",))]
+            assert not any("TEMP B-TREE" in detail for detail in plan), plan
+    finally:
+        conn.close()
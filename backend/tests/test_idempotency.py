@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import request
+
+from backend.db import get_db, get_pool
+from backend.idempotency import IdempotencyCache
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def patient_header(client, username):
+    client.post("/patient/register", json={"username": username, "password": "p123"})
+    return auth_header(client.post(
+        "/patient/login", json={"username": username, "password": "p123"}
+    ).get_json()["token"])
+
+
+def new_slot(client):
+    doctor = client.post(
+        "/doctor/login", json={"username": "doctor1", "password": "doctor123"}
+    ).get_json()["token"]
+    start = datetime.utcnow() + timedelta(days=1)
+    return client.post("/doctor/slots", headers=auth_header(doctor), json={
+        "start_datetime": start.isoformat(timespec="seconds"),
+        "end_datetime": (start + timedelta(minutes=30)).isoformat(timespec="seconds"),
+    }).get_json()["slot_id"]
+
+
+def with_key(headers, key):
+    return dict(headers, **{"Idempotency-Key": key})
+
+
+def count(client, table):
+    with client.application.app_context():
+        return get_db().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def checkouts(client):
+    with client.application.app_context():
+        return get_pool().stats()["checkouts"]
+
+
+def test_retried_booking_is_replayed_without_database_work(client):
+    patient = patient_header(client, "p_idem")
+    slot_id = new_slot(client)
+
+    first = client.post("/patient/appointments", headers=with_key(patient, "k1"), json={"slot_id": slot_id})
+    assert first.status_code == 201
+
+    before = checkouts(client)
+    retry = client.post("/patient/appointments", headers=with_key(patient, "k1"), json={"slot_id": slot_id})
+    assert checkouts(client) == before
+
+    assert retry.status_code == 201
+    assert retry.data == first.data
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert count(client, "appointments") == 1
+
+    # without a key the same request runs again
+    again = client.post("/patient/appointments", headers=patient, json={"slot_id": slot_id})
+    assert again.status_code == 409
+
+
+def test_legacy_path_retry_creates_no_second_slot(client):
+    patient = patient_header(client, "p_idem_legacy")
+    body = {"doctor_id": 2, "start_datetime": "2030-02-01T10:00:00"}
+
+    slots = count(client, "doctor_slots")
+    for _ in range(3):
+        res = client.post("/patient/appointments", headers=with_key(patient, "legacy-1"), json=body)
+        assert res.status_code == 201
+    assert count(client, "doctor_slots") == slots + 1
+
+
+def test_replay_from_another_process_and_key_reuse(client):
+    patient = patient_header(client, "p_idem_db")
+    slot_id = new_slot(client)
+    client.post("/patient/appointments", headers=with_key(patient, "k2"), json={"slot_id": slot_id})
+
+    # a worker that has not seen the key: one primary-key read
+    client.application.extensions["hms_idempotency"] = IdempotencyCache(10)
+    retry = client.post("/patient/appointments", headers=with_key(patient, "k2"), json={"slot_id": slot_id})
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    other = client.post("/patient/appointments", headers=with_key(patient, "k2"), json={"slot_id": slot_id + 1})
+    assert other.status_code == 422
+
+    stats = client.application.extensions["hms_idempotency"].stats()
+    assert stats["db_hits"] == 1 and stats["hits"] == 1 and stats["conflicts"] == 1
+
+
+def test_cancel_retry_and_keys_are_per_user(client):
+    patient = patient_header(client, "p_idem_cancel")
+    other = patient_header(client, "p_idem_other")
+    client.post("/patient/appointments", headers=patient, json={"slot_id": new_slot(client)})
+    appointment_id = client.get("/patient/appointments", headers=patient).get_json()[0]["appointment_id"]
+
+    url = f"/patient/appointments/{appointment_id}/cancel"
+    first = client.patch(url, headers=with_key(patient, "c1"))
+    retry = client.patch(url, headers=with_key(patient, "c1"))
+    assert first.status_code == retry.status_code == 200
+    assert retry.data == first.data
+
+    # same key, another user: runs on its own (and is refused)
+    assert client.patch(url, headers=with_key(other, "c1")).status_code == 403
+
+
+def test_running_and_abandoned_reservations(client):
+    patient = patient_header(client, "p_idem_lock")
+    with client.application.app_context():
+        db = get_db()
+        user_id = db.execute("SELECT id FROM users WHERE username = 'p_idem_lock'").fetchone()[0]
+        db.execute(
+            """
+            INSERT INTO idempotency_keys (user_id, key, fingerprint, locked_until, expires_at)
+            VALUES (?, 'busy', x'00', datetime('now', '+60 seconds'), datetime('now', '+1 day')),
+                   (?, 'dead', x'00', datetime('now', '-1 seconds'), datetime('now', '+1 day'))
+            """,
+            (user_id, user_id)
+        )
+        db.commit()
+
+    busy = client.post("/patient/appointments", headers=with_key(patient, "busy"), json={"slot_id": new_slot(client)})
+    assert busy.status_code == 409
+
+    taken_over = client.post("/patient/appointments", headers=with_key(patient, "dead"), json={"slot_id": new_slot(client)})
+    assert taken_over.status_code == 201
+    assert "Idempotent-Replayed" not in taken_over.headers
+
+
+def test_booking_applied_but_response_lost_is_not_run_again(client, monkeypatch):
+    patient = patient_header(client, "p_idem_crash")
+    slot_id = new_slot(client)
+
+    # the booking commits, then the worker dies before storing the response
+    def die(self, *args, **kwargs):
+        raise SystemExit("worker killed")
+
+    monkeypatch.setattr("flask.Response.get_data", die)
+    with pytest.raises(SystemExit):
+        client.post("/patient/appointments", headers=with_key(patient, "k-crash"), json={"slot_id": slot_id})
+    monkeypatch.undo()
+
+    retry = client.post("/patient/appointments", headers=with_key(patient, "k-crash"), json={"slot_id": slot_id})
+    assert retry.status_code == 409
+    assert "applied" in retry.get_json()["error"]
+    assert count(client, "appointments") == 1
+
+
+def test_view_leaving_a_transaction_open_is_an_error(client):
+    from backend.idempotency import idempotent
+    from backend.routes import require_role
+
+    @require_role("patient")
+    @idempotent
+    def sloppy():
+        get_db().execute("UPDATE users SET is_active = 1 WHERE id = ?", (request.user_id,))
+        return {"ok": True}
+
+    client.application.add_url_rule("/test/sloppy", "sloppy", sloppy, methods=["POST"])
+    patient = patient_header(client, "p_idem_sloppy")
+
+    with pytest.raises(RuntimeError, match="left a transaction open"):
+        client.post("/test/sloppy", headers=with_key(patient, "k-open"))
+    # the reservation is released: nothing half-done is kept
+    assert count(client, "idempotency_keys") == 0
+
+
+def test_taken_over_reservation_cannot_commit_its_write(client, monkeypatch):
+    from backend import routes_patient
+
+    patient = patient_header(client, "p_idem_slow")
+    slot_id = new_slot(client)
+    changed = routes_patient.appointments_changed
+
+    def taken_over_meanwhile(db, patient_id):
+        # this request outlived IDEMPOTENCY_LOCK_SECONDS and a retry reserved the key
+        db.execute("UPDATE idempotency_keys SET locked_until = datetime('now', '+1 hour')")
+        changed(db, patient_id)
+
+    monkeypatch.setattr(routes_patient, "appointments_changed", taken_over_meanwhile)
+    res = client.post("/patient/appointments", headers=with_key(patient, "k-slow"), json={"slot_id": slot_id})
+    assert res.status_code == 409
+    assert count(client, "appointments") == 0
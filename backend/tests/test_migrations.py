@@ -0,0 +1,200 @@
+import sqlite3
+
+import pytest
+
+from backend import migrations
+from backend.migrations import Migrator, SHADOW_SUFFIX
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "hms.db", isolation_level=None)
+    yield conn
+    conn.close()
+
+
+def legacy_appointments(conn, rows=7):
+    conn.executescript("""
+    CREATE TABLE doctor_slots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doctor_id INTEGER NOT NULL,
+        slot_time TEXT NOT NULL,
+        is_booked INTEGER DEFAULT 0
+    );
+    CREATE TABLE appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER NOT NULL,
+        patient_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'booked',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE UNIQUE INDEX uq_appt_slot_active
+        ON appointments(slot_id) WHERE status IN ('booked', 'BOOKED');
+    """)
+    spellings = ["booked", "BOOKED", "no_show", "NO_SHOW", "completed", "cancelled", "CANCELLED_BY_ADMIN"]
+    for i in range(rows):
+        conn.execute(
+            "INSERT INTO doctor_slots (doctor_id, slot_time, is_booked) VALUES (2, ?, 1)",
+            (f"2030-01-{i + 1:02d}T10:00:00",)
+        )
+        conn.execute(
+            "INSERT INTO appointments (slot_id, patient_id, status) VALUES (?, 1, ?)",
+            (i + 1, spellings[i % len(spellings)])
+        )
+
+
+def test_migrations_apply_once_in_order(conn):
+    applied = migrations.migrate(conn)
+    assert [r["version"] for r in applied] == [v for v, _ in migrations.discover()]
+
+    assert migrations.migrate(conn) == []
+    assert migrations.migrate(conn, dry_run=True) == []
+
+
+def test_dry_run_reports_cost_without_changing_schema(conn):
+    legacy_appointments(conn)
+
+    reports = migrations.migrate(conn, dry_run=True, direct_max_rows=3, chunk_rows=2)
+
+    plan = {(op["op"], op["target"]): op for r in reports for op in r["plan"]}
+    rebuild = plan[("rebuild_table", "appointments")]
+    assert (rebuild["rows"], rebuild["mode"], rebuild["chunks"]) == (7, "online", 4)
+
+    assert migrations.applied_versions(conn) == set()
+    status_type = conn.execute(
+        "SELECT type FROM pragma_table_info('appointments') WHERE name = 'status'"
+    ).fetchone()[0]
+    assert status_type == "TEXT"
+
+
+def test_online_rebuild_converts_legacy_status_in_chunks(conn):
+    legacy_appointments(conn)
+
+    migrations.migrate(conn, direct_max_rows=0, chunk_rows=2)
+
+    rows = conn.execute(
+        "SELECT status, doctor_id, date FROM appointments ORDER BY id"
+    ).fetchall()
+    assert [r[0] for r in rows] == [1, 1, 4, 4, 2, 3, 3]
+    assert rows[0][1:] == (2, "2030-01-01")
+
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+    assert {"uq_appt_slot_active", "idx_appt_booked_end", "idx_appt_doctor_date"} <= names
+    assert not any(SHADOW_SUFFIX in name for name in names)
+
+
+def test_writes_during_online_copy_are_mirrored(conn):
+    conn.executescript("""
+    CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+    CREATE UNIQUE INDEX uq_items_name ON items(name);
+    """)
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, f"item{i}") for i in range(1, 7)])
+
+    m = Migrator(conn, chunk_rows=2, direct_max_rows=0)
+    shadow = "items" + SHADOW_SUFFIX
+    indexes = ["CREATE UNIQUE INDEX uq_items_name ON {table}(name)"]
+    columns = m._prepare_shadow(
+        "items",
+        "CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+    )
+    exprs = ["{row}.id", "UPPER({row}.name)"]
+    high = m._install_triggers("items", shadow, columns, exprs, "id")
+    m._copy_chunk("items", shadow, columns, exprs, "id", 0)
+
+    # writers keep going while the copy is in progress
+    conn.execute("UPDATE items SET name = 'renamed1' WHERE id = 1")  # already copied
+    conn.execute("UPDATE items SET name = 'renamed5' WHERE id = 5")  # not yet copied
+    conn.execute("DELETE FROM items WHERE id = 2")
+    conn.execute("INSERT INTO items VALUES (7, 'item7')")
+    with pytest.raises(sqlite3.IntegrityError, match=r"items\.name"):
+        # the live table keeps its unique index during the copy
+        conn.execute("INSERT INTO items VALUES (8, 'item7')")
+
+    for start in range(2, high + 1, 2):
+        m._copy_chunk("items", shadow, columns, exprs, "id", start)
+    m._transaction(lambda: m._swap("items", shadow, indexes))
+
+    assert conn.execute("SELECT id, name FROM items ORDER BY id").fetchall() == [
+        (1, "RENAMED1"), (3, "ITEM3"), (4, "ITEM4"), (5, "RENAMED5"), (6, "ITEM6"), (7, "ITEM7"),
+    ]
+    assert [r[1] for r in conn.execute("PRAGMA index_list(items)")] == ["uq_items_name"]
+    assert conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'uq_items_name'"
+    ).fetchone()[0] == "CREATE UNIQUE INDEX uq_items_name ON items(name)"
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO items VALUES (8, 'ITEM7')")
+
+
+def test_failed_index_build_at_the_swap_keeps_the_old_table(conn):
+    conn.executescript("""
+    CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+    CREATE UNIQUE INDEX uq_items_name ON items(name);
+    """)
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(1, "a"), (2, "A"), (3, "b")])
+
+    m = Migrator(conn, chunk_rows=2, direct_max_rows=0)
+    with pytest.raises(sqlite3.IntegrityError):
+        # the converted rows collide under the rebuilt unique index
+        m.rebuild_table(
+            "items",
+            "CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+            select={"name": "UPPER({row}.name)"},
+            indexes=["CREATE UNIQUE INDEX uq_items_name ON {table}(name)"],
+        )
+
+    assert conn.execute("SELECT name FROM items ORDER BY id").fetchall() == [("a",), ("A",), ("b",)]
+    assert [r[1] for r in conn.execute("PRAGMA index_list(items)")] == ["uq_items_name"]
+
+
+def test_migrate_restores_foreign_keys(conn):
+    conn.execute("PRAGMA foreign_keys = ON")
+    migrations.migrate(conn)
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    conn.execute("PRAGMA foreign_keys = OFF")
+    migrations.migrate(conn)
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 0
+
+
+def test_row_inserted_as_the_triggers_go_in_is_kept(conn, monkeypatch):
+    conn.executescript("""
+    CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE UNIQUE INDEX uq_items_name ON items(name);
+    """)
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, f"n{i}") for i in range(1, 11)])
+    other = sqlite3.connect(conn.execute("PRAGMA database_list").fetchone()[2], isolation_level=None)
+
+    m = Migrator(conn, chunk_rows=3, direct_max_rows=5)
+    install = m._install_triggers
+
+    def racing_install(*args):
+        # a writer gets in right before the triggers, and during the copy
+        other.execute("INSERT INTO items VALUES (100, 'late')")
+        high = install(*args)
+        other.execute("INSERT INTO items VALUES (101, 'later')")
+        # indexes of the live table are all still there
+        plan = other.execute("EXPLAIN QUERY PLAN SELECT id FROM items INDEXED BY uq_items_name WHERE name = 'x'")
+        assert "uq_items_name" in plan.fetchone()[3]
+        return high
+
+    monkeypatch.setattr(m, "_install_triggers", racing_install)
+    m.create_index("idx_items_name_id", "items", ["name", "id"])
+    other.close()
+
+    assert conn.execute("SELECT COUNT(*), MAX(id) FROM items").fetchone() == (12, 101)
+    assert {r[1] for r in conn.execute("PRAGMA index_list(items)")} == {"uq_items_name", "idx_items_name_id"}
+
+
+def test_create_index_on_large_table_keeps_existing_indexes(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT, kind TEXT);
+    CREATE INDEX idx_items_name ON items(name);
+    """)
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?)", [(i, f"n{i}", "k") for i in range(1, 11)])
+
+    Migrator(conn, chunk_rows=3, direct_max_rows=5).create_index("idx_items_kind", "items", ["kind"])
+
+    indexes = {r[1] for r in conn.execute("PRAGMA index_list(items)")}
+    assert indexes == {"idx_items_name", "idx_items_kind"}
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 10
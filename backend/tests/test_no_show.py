@@ -0,0 +1,116 @@
+from datetime import datetime
+
+from backend import job_state
+from backend.db import get_db
+from backend.no_show import JOB_NAME, mark_no_show_appointments, sweep_no_shows
+from backend.status import Status
+
+
+def add_booked(db, end_datetime, n=1):
+    for _ in range(n):
+        slot_id = db.execute(
+            "INSERT INTO doctor_slots (doctor_id, slot_time, end_time, is_booked) VALUES (2, ?, ?, 1)",
+            (end_datetime, end_datetime)
+        ).lastrowid
+        db.execute(
+            """
+            INSERT INTO appointments (patient_id, slot_id, status, end_datetime)
+            VALUES (1, ?, ?, ?)
+            """,
+            (slot_id, Status.BOOKED, end_datetime)
+        )
+    db.commit()
+
+
+def statuses(db):
+    return {
+        Status(row["status"]).label: row["n"]
+        for row in db.execute("SELECT status, COUNT(*) AS n FROM appointments GROUP BY status")
+    }
+
+
+def test_sweep_marks_in_chunks_and_resumes_from_watermark(client):
+    now = datetime(2030, 1, 10, 12, 0)
+
+    with client.application.app_context():
+        db = get_db()
+        add_booked(db, "2030-01-09T10:00:00", n=7)
+        add_booked(db, "2030-01-10T11:50:00")  # inside the grace period
+        add_booked(db, "2030-01-11T10:00:00")  # future
+
+        # cut off after two chunks: the watermark remembers where
+        assert mark_no_show_appointments(now, 15, chunk_size=3, max_chunks=2) == 6
+        assert job_state.get_watermark(db, JOB_NAME) is not None
+
+        assert mark_no_show_appointments(now, 15, chunk_size=3, max_chunks=2) == 1
+        assert job_state.get_watermark(db, JOB_NAME) is None
+
+        assert mark_no_show_appointments(now, 15, chunk_size=3) == 0
+        assert statuses(db) == {"NO_SHOW": 7, "BOOKED": 2}
+
+        audit = db.execute(
+            """
+            SELECT COUNT(*) FROM appointment_audit_logs
+            WHERE action = 'NO_SHOW' AND actor_role = 'system'
+            """
+        ).fetchone()[0]
+        assert audit == 7
+
+        stats = db.execute("SELECT no_show_appointments FROM stats_counters").fetchone()
+        assert stats["no_show_appointments"] == 7
+
+
+def test_overlapping_runs_are_skipped(client):
+    with client.application.app_context():
+        db = get_db()
+        add_booked(db, "2030-01-09T10:00:00", n=2)
+
+        assert job_state.acquire_lease(db, JOB_NAME, "other-worker", 60)
+        assert sweep_no_shows(datetime(2030, 1, 10))["skipped"] is True
+        assert statuses(db) == {"BOOKED": 2}
+
+        job_state.release_lease(db, JOB_NAME, "other-worker")
+        result = sweep_no_shows(datetime(2030, 1, 10))
+        assert (result["skipped"], result["marked"]) == (False, 2)
+
+        row = db.execute(
+            "SELECT lease_owner, last_run_rows FROM job_state WHERE name = ?",
+            (JOB_NAME,)
+        ).fetchone()
+        assert row["lease_owner"] is None
+        assert row["last_run_rows"] == 2
+
+
+def test_runs_in_the_same_process_do_not_share_the_lease(client):
+    with client.application.app_context():
+        db = get_db()
+        add_booked(db, "2030-01-09T10:00:00")
+
+        first, second = job_state.new_owner(), job_state.new_owner()
+        assert first != second
+        assert job_state.acquire_lease(db, JOB_NAME, first, 60)
+        assert not job_state.acquire_lease(db, JOB_NAME, second, 60)
+        assert job_state.acquire_lease(db, JOB_NAME, first, 60)
+
+        assert sweep_no_shows(datetime(2030, 1, 10))["skipped"] is True
+        assert statuses(db) == {"BOOKED": 1}
+
+
+def test_sweep_query_uses_partial_index(client):
+    with client.application.app_context():
+        plan = " / ".join(
+            row[3] for row in get_db().execute(
+                f"""
+                EXPLAIN QUERY PLAN
+                SELECT id FROM appointments INDEXED BY idx_appt_booked_end
+                WHERE status = {Status.BOOKED.sql}
+                  AND end_datetime < ?
+                  AND (end_datetime, id) > (?, ?)
+                ORDER BY end_datetime, id
+                LIMIT 500
+                """,
+                ("2030-01-01", "", 0)
+            )
+        )
+        assert "idx_appt_booked_end" in plan
+        assert "TEMP B-TREE" not in plan
@@ -0,0 +1,112 @@
+from backend import outbox
+from backend.db import get_db
+from backend.penalties import apply_no_show_penalties
+from backend.status import Status
+
+
+def add_no_show(db, username):
+    patient_id = db.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, 'x', 'patient')",
+        (username,)
+    ).lastrowid
+    slot_id = db.execute(
+        """
+        INSERT INTO doctor_slots (doctor_id, slot_time, is_booked)
+        VALUES (2, '2024-01-01T10:00:00', 1)
+        """
+    ).lastrowid
+    db.execute(
+        """
+        INSERT INTO appointments (slot_id, patient_id, status)
+        VALUES (?, ?, ?)
+        """,
+        (slot_id, patient_id, Status.NO_SHOW)
+    )
+    db.commit()
+
+
+def test_penalties_queue_outbox_rows_once(client):
+    with client.application.app_context():
+        db = get_db()
+        for i in range(3):
+            add_no_show(db, f"noshow{i}@example.com")
+
+        assert apply_no_show_penalties() == 3
+        assert apply_no_show_penalties() == 0
+
+        rows = db.execute(
+            "SELECT to_email, status FROM email_outbox ORDER BY id"
+        ).fetchall()
+        assert [r["to_email"] for r in rows] == [f"noshow{i}@example.com" for i in range(3)]
+        assert {r["status"] for r in rows} == {"pending"}
+
+
+def test_drain_sends_in_batches_and_backs_off_failures(client):
+    with client.application.app_context():
+        db = get_db()
+        for i in range(5):
+            outbox.enqueue(db, "SELECT ?, 's', 'b'", (f"user{i}@example.com",))
+        db.commit()
+
+        batches = outbox.claim_batches(db, max_batches=10, batch_size=2)
+        assert [len(ids) for ids in batches] == [2, 2, 1]
+
+        # claimed rows are leased, not claimable again
+        assert outbox.claim_batches(db, max_batches=10, batch_size=2) == []
+
+        delivered = []
+
+        def send_many(messages):
+            errors = []
+            for to_email, subject, body in messages:
+                if to_email == "user1@example.com":
+                    errors.append(OSError("mailbox unavailable"))
+                else:
+                    delivered.append(to_email)
+                    errors.append(None)
+            return errors
+
+        results = [outbox.send_batch(db, ids, send_many) for ids in batches]
+        assert results == [(1, 1), (2, 0), (1, 0)]
+        assert len(delivered) == 4
+
+        failed = db.execute(
+            """
+            SELECT status, attempts, last_error,
+                   next_attempt_at > datetime('now') AS deferred
+            FROM email_outbox
+            WHERE to_email = 'user1@example.com'
+            """
+        ).fetchone()
+        assert failed["status"] == "pending"
+        assert failed["attempts"] == 1
+        assert failed["last_error"] == "mailbox unavailable"
+        assert failed["deferred"] == 1
+
+        sent = db.execute(
+            "SELECT COUNT(*) FROM email_outbox WHERE status = 'sent'"
+        ).fetchone()[0]
+        assert sent == 4
+
+
+def test_row_fails_permanently_after_max_attempts(client, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+
+    with client.application.app_context():
+        db = get_db()
+        outbox.enqueue(db, "SELECT 'bounce@example.com', 's', 'b'")
+        db.commit()
+        outbox_id = db.execute("SELECT id FROM email_outbox").fetchone()["id"]
+
+        for _ in range(2):
+            db.execute(
+                "UPDATE email_outbox SET status = 'sending' WHERE id = ?",
+                (outbox_id,)
+            )
+            db.commit()
+            outbox.record_results(db, [], [(outbox_id, "550 no such user")])
+
+        row = db.execute(
+            "SELECT status, attempts FROM email_outbox WHERE id = ?", (outbox_id,)
+        ).fetchone()
+        assert (row["status"], row["attempts"]) == ("failed", 2)
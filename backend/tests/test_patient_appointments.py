@@ -75,3 +75,88 @@ def test_patient_can_book_and_cancel(client):
     )
     assert res.status_code == 200
     assert res.get_json()["status"] == "CANCELLED_BY_PATIENT" 
+
+
+def test_concurrent_bookings_of_one_slot_never_double_book(client):
+    import threading
+
+    from backend.db import get_db
+    from backend.routes import make_token
+
+    app = client.application
+    with app.app_context():
+        db = get_db()
+        slot_id = db.execute(
+            "INSERT INTO doctor_slots (doctor_id, slot_time) VALUES (2, '2030-03-01T09:00:00')"
+        ).lastrowid
+        tokens = [
+            make_token(
+                db.execute(
+                    "INSERT INTO users (username, password_hash, role) VALUES (?, 'x', 'patient')",
+                    (f"racer_{i}",)
+                ).lastrowid,
+                "patient"
+            )
+            for i in range(20)
+        ]
+        db.commit()
+
+    statuses = []
+    barrier = threading.Barrier(len(tokens))
+
+    def book(token):
+        c = app.test_client()
+        barrier.wait()
+        res = c.post("/patient/appointments", json={"slot_id": slot_id}, headers=auth_header(token))
+        statuses.append(res.status_code)
+
+    threads = [threading.Thread(target=book, args=(t,)) for t in tokens]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == len(tokens) - 1
+
+    with app.app_context():
+        booked = get_db().execute(
+            "SELECT COUNT(*) FROM appointments WHERE slot_id = ?", (slot_id,)
+        ).fetchone()[0]
+    assert booked == 1
+
+
+def test_availability_reflects_booking_and_cancel(client):
+    client.post("/patient/register", json={"username": "p_avail", "password": "p123"})
+    token = client.post(
+        "/patient/login", json={"username": "p_avail", "password": "p123"}
+    ).get_json()["token"]
+
+    doc_token = client.post(
+        "/doctor/login", json={"username": "doctor1", "password": "doctor123"}
+    ).get_json()["token"]
+    slot_id = client.post(
+        "/doctor/slots",
+        json={"start_datetime": "2030-04-01T09:00:00", "end_datetime": "2030-04-01T09:30:00"},
+        headers=auth_header(doc_token)
+    ).get_json()["slot_id"]
+
+    def free_slots():
+        res = client.get(
+            "/patient/availability?from=2030-04-01&to=2030-04-02&specialization=General Medicine",
+            headers=auth_header(token)
+        )
+        assert res.status_code == 200
+        return [s["slot_id"] for d in res.get_json() for s in d["slots"]]
+
+    assert free_slots() == [slot_id]
+    assert free_slots() == [slot_id]  # served from cache
+
+    client.post("/patient/appointments", json={"slot_id": slot_id}, headers=auth_header(token))
+    assert free_slots() == []
+
+    appt_id = client.get(
+        "/patient/appointments", headers=auth_header(token)
+    ).get_json()[0]["appointment_id"]
+    client.patch(f"/patient/appointments/{appt_id}/cancel", headers=auth_header(token))
+    assert free_slots() == [slot_id]
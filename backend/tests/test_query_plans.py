@@ -0,0 +1,311 @@
+"""
+Query-plan regression suite.
+
+Loads a dataset of realistic size, drives every endpoint and periodic job
+with SQL tracing on, and runs EXPLAIN QUERY PLAN on each distinct statement
+they issued. Statements on hot paths must not SCAN a large table or sort
+through a temp B-tree for ORDER BY.
+"""
+
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from backend import outbox, sql_trace
+from backend.db import ConnectionPool, get_db
+from backend.no_show import sweep_no_shows
+from backend.penalties import apply_no_show_penalties
+from backend.rollups import run_rollups
+from backend.status import Status
+
+DOCTORS = 50
+PATIENTS = 2_000
+SLOTS_PER_DOCTOR = 400  # 20k slots, about half of them booked
+
+LARGE_TABLES = {
+    "users",
+    "doctors",
+    "doctor_slots",
+    "appointments",
+    "appointment_audit_logs",
+    "patient_no_show_penalties",
+    "email_outbox",
+    "refresh_tokens",
+    "resource_versions",
+    "idempotency_keys",
+    "daily_doctor_outcomes",
+    "daily_patient_outcomes",
+}
+
+# Whole-table admin reports: they read everything by design.
+# normalized SQL prefix -> reason
+NOT_HOT = {
+    "SELECT patient_id, COUNT(*) AS penalty_count FROM patient_no_show_penalties":
+        "penalty report over all patients",
+    "SELECT doctor_id, COUNT(*) AS no_show_count FROM appointments":
+        "no-show report over all doctors",
+    "SELECT id, username, is_active, created_at FROM users WHERE role = 'patient'":
+        "unpaginated patient list",
+}
+
+# Sorts over a result already narrowed by an index SEARCH to a few rows.
+# normalized SQL prefix -> reason
+BOUNDED_SORTS = {
+    "SELECT a.id AS appointment_id, a.status AS status, s.slot_time AS start_datetime, u.username":
+        "one patient's own appointments",
+}
+
+# endpoints with no SQL worth checking
+NO_SQL_ENDPOINTS = {
+    "static",
+    "health.health",
+    "prometheus.prometheus_metrics",
+    "metrics.db_pool_stats",
+    "metrics.idempotency_stats",
+    "metrics.kdf_stats",
+    "metrics.response_cache_stats",
+    "metrics.request_latency",
+    "metrics.sql_trace_stats",
+    "metrics.token_cache_stats",
+}
+
+_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def seed_dataset(db):
+    """
+    DOCTORS doctors with SLOTS_PER_DOCTOR half-hour slots each around today,
+    every other slot booked by one of PATIENTS patients.
+    """
+    password = generate_password_hash("x")
+    db.executemany(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'patient')",
+        [(f"patient{i}@example.com", password) for i in range(PATIENTS)]
+    )
+    patient_ids = [r[0] for r in db.execute("SELECT id FROM users WHERE role = 'patient'")]
+
+    for d in range(DOCTORS):
+        doctor_id = db.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'doctor')",
+            (f"doctor{d}@example.com", password)
+        ).lastrowid
+        db.execute(
+            "INSERT INTO doctors (user_id, name, specialization) VALUES (?, ?, ?)",
+            (doctor_id, f"Dr. {d}", ("Cardiology", "Dermatology", "General Medicine")[d % 3])
+        )
+
+        start = datetime.combine(date.today() - timedelta(days=30), datetime.min.time())
+        for i in range(SLOTS_PER_DOCTOR):
+            begin = start + timedelta(hours=9 + (i % 8), days=i // 8)
+            end = begin + timedelta(minutes=30)
+            booked = i % 2
+            slot_id = db.execute(
+                "INSERT INTO doctor_slots (doctor_id, slot_time, end_time, is_booked) VALUES (?, ?, ?, ?)",
+                (doctor_id, begin.isoformat(), end.isoformat(), booked)
+            ).lastrowid
+            if booked:
+                db.execute(
+                    """
+                    INSERT INTO appointments
+                    (patient_id, slot_id, status, end_datetime, doctor_id, date)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        patient_ids[(d * SLOTS_PER_DOCTOR + i) % PATIENTS],
+                        slot_id,
+                        Status.BOOKED,
+                        end.isoformat(),
+                        doctor_id,
+                        begin.date().isoformat(),
+                    )
+                )
+    db.commit()
+
+
+@pytest.fixture
+def traced(client, monkeypatch):
+    """
+    (client, statements): every (sql, endpoint) issued while tracing is on.
+    """
+    app = client.application
+    app.extensions["hms_db_pool"] = ConnectionPool(
+        app.extensions["hms_db_pool"].db_path, size=2, timeout=1, max_uses=10_000, trace=True
+    )
+    monkeypatch.setattr(sql_trace, "SQL_SLOW_MS", float("inf"))
+
+    with app.app_context():
+        seed_dataset(get_db())
+
+    statements = {}
+    record = sql_trace._record
+
+    def capture(cursor, sql, params, elapsed):
+        statements.setdefault(sql_trace.normalize(sql), (sql, sql_trace._endpoint()))
+        return record(cursor, sql, params, elapsed)
+
+    monkeypatch.setattr(sql_trace, "_record", capture)
+    return client, statements
+
+
+def exercise_endpoints(client):
+    """
+    Call every endpoint at least once; returns the endpoints hit.
+    """
+    hit = set()
+
+    def call(method, url, token=None, headers=None, **kwargs):
+        headers = dict(auth_header(token) if token else {}, **(headers or {}))
+        res = client.open(url, method=method, headers=headers, **kwargs)
+        rule = client.application.url_map.bind("localhost").match(url.split("?")[0], method=method)
+        hit.add(rule[0])
+        return res
+
+    admin = call("POST", "/admin/login", json={"username": "admin", "password": "admin123"}).get_json()["token"]
+    doctor = call("POST", "/doctor/login", json={"username": "doctor1", "password": "doctor123"}).get_json()["token"]
+    call("POST", "/patient/register", json={"username": "plans@example.com", "password": "p"})
+    login = call("POST", "/patient/login", json={"username": "plans@example.com", "password": "p"}).get_json()
+    patient = login["token"]
+    refreshed = call("POST", "/auth/refresh", json={"refresh_token": login["refresh_token"]}).get_json()
+    call("POST", "/auth/refresh", json={"refresh_token": login["refresh_token"]})  # reuse
+    call("POST", "/auth/logout", json={"refresh_token": refreshed["refresh_token"]})
+
+    call("GET", "/health")
+    call("GET", "/admin/me", admin)
+    call("GET", "/doctor/me", doctor)
+
+    tomorrow = date.today() + timedelta(days=1)
+    slot = call("POST", "/doctor/slots", doctor, json={
+        "start_datetime": f"{tomorrow}T09:00:00",
+        "end_datetime": f"{tomorrow}T09:30:00",
+    }).get_json()
+    bulk = call("POST", "/doctor/slots/bulk", doctor, json={
+        "start_date": str(tomorrow + timedelta(days=1)),
+        "end_date": str(tomorrow + timedelta(days=7)),
+        "days_of_week": [0, 1, 2, 3, 4, 5, 6],
+        "start_time": "10:00",
+        "end_time": "12:00",
+        "slot_minutes": 30,
+    })
+    assert bulk.status_code == 201, bulk.get_json()
+
+    call("GET", f"/patient/availability?from={tomorrow}", patient)
+    call("GET", f"/patient/availability?specialization=Cardiology&from={tomorrow}", patient)
+    call("POST", "/patient/appointments", patient, json={"slot_id": slot["slot_id"]})
+    for _ in range(2):  # first run, then replay
+        call("POST", "/patient/appointments", patient, json={"slot_id": slot["slot_id"]},
+             headers={"Idempotency-Key": "plans-1"})
+    call("GET", "/patient/appointments", patient)
+
+    appointments = call("GET", "/admin/appointments?limit=50", admin).get_json()["items"]
+    call("GET", "/admin/appointments?status=BOOKED&limit=50", admin)
+    call("GET", "/admin/appointments?doctor_id=3&limit=50", admin)
+    call("GET", f"/admin/appointments?from={tomorrow}&to={tomorrow + timedelta(days=2)}&limit=50", admin)
+
+    mine = [a for a in appointments if a["doctor"]["username"] == "doctor1"]
+    patient_appt = call("GET", "/patient/appointments", patient).get_json()[0]["appointment_id"]
+    call("PATCH", f"/patient/appointments/{patient_appt}/cancel", patient)
+    call("PATCH", f"/admin/appointments/{appointments[0]['appointment_id']}/cancel", admin)
+    if mine:
+        call("POST", f"/doctor/appointments/{mine[0]['appointment_id']}/complete", doctor)
+    call("POST", "/doctor/appointments/1/complete", doctor)
+    call("POST", "/doctor/appointments/1/no-show", doctor)
+
+    call("GET", "/admin/stats", admin)
+    call("GET", "/admin/patients", admin)
+    call("PATCH", "/admin/patients/5/deactivate", admin)
+    call("PATCH", "/admin/patients/5/activate", admin)
+    call("POST", "/admin/doctors/3/blacklist", admin)
+    call("POST", "/admin/doctors/3/unblacklist", admin)
+
+    # exports and audit lookups read through their own connection, outside
+    # the trace; test_export / test_audit check their plans
+    call("GET", f"/admin/export/appointments?from={tomorrow}", admin).close()
+    call("GET", "/admin/export/audit-logs?format=ndjson", admin).close()
+    call("GET", "/admin/audit-logs?appointment_id=1", admin)
+
+    for path in ("no-shows", "penalties", "doctor-no-shows", "db-pool", "token-cache", "kdf", "response-cache", "sql", "requests"):
+        call("GET", f"/admin/metrics/{path}", admin)
+    for query in ("", "?bucket=week&doctor_id=3", f"?from={date.today() - timedelta(days=400)}&bucket=month"):
+        call("GET", f"/admin/metrics/no-show-rate{query}", admin)
+    call("GET", "/admin/metrics/patients/5/no-show-rate?bucket=day", admin)
+    call("GET", "/metrics")
+
+    return hit
+
+
+def exercise_jobs(app):
+    with app.app_context():
+        sweep_no_shows(datetime.now())
+        apply_no_show_penalties()
+        run_rollups()
+        db = get_db()
+        for ids in outbox.claim_batches(db, max_batches=2):
+            outbox.send_batch(db, ids, lambda messages: [None] * len(messages))
+
+
+def partial_indexes(db):
+    return {
+        row[0] for row in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'"
+        )
+    }
+
+
+def plan_problems(db, sql, allow_sort=False):
+    params = [None] * sql.count("?")
+    try:
+        plan = [row[3] for row in sqlite3.Cursor(db).execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except sqlite3.Error:
+        return []  # DDL, PRAGMA, transaction control
+
+    partial = partial_indexes(db)
+    problems = []
+    for detail in plan:
+        scan = _SCAN.match(detail)
+        # a scan of a partial index only visits the rows its WHERE selects
+        if scan and scan.group(1) in LARGE_TABLES and scan.group(2) not in partial:
+            problems.append(detail)
+        # RIGHT PART: rows arrive in index order, only ties are sorted
+        if detail.startswith("USE TEMP B-TREE FOR ORDER BY") and not allow_sort:
+            problems.append(detail)
+    return problems
+
+
+def test_hot_statements_use_indexes(traced):
+    client, statements = traced
+    app = client.application
+
+    hit = exercise_endpoints(client)
+    exercise_jobs(app)
+
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert endpoints - NO_SQL_ENDPOINTS <= hit, "add new endpoints to exercise_endpoints()"
+    assert len(statements) > 30
+
+    failures = []
+    with app.app_context():
+        db = get_db()
+        for normalized, (sql, endpoint) in sorted(statements.items()):
+            if any(normalized.startswith(prefix) for prefix in NOT_HOT):
+                continue
+            allow_sort = any(normalized.startswith(prefix) for prefix in BOUNDED_SORTS)
+            problems = plan_problems(db, sql, allow_sort)
+            if problems:
+                failures.append(f"{endpoint}: {normalized}\n    -> {' / '.join(problems)}")
+
+    assert not failures, "statements without a usable index:\n" + "\n".join(failures)
+
+
+def test_allowlists_are_still_used(traced):
+    client, statements = traced
+    exercise_endpoints(client)
+
+    for prefix in (*NOT_HOT, *BOUNDED_SORTS):
+        assert any(s.startswith(prefix) for s in statements), f"stale NOT_HOT entry: {prefix}"
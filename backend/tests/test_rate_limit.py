@@ -0,0 +1,102 @@
+from backend.rate_limit import SlidingWindowLimiter
+
+
+def test_sliding_window_blocks_and_recovers():
+    limiter = SlidingWindowLimiter(window=60, max_keys=10)
+
+    for _ in range(5):
+        assert limiter.hit("ip:ep", limit=5, now=30.0) == 0
+
+    assert limiter.hit("ip:ep", limit=5, now=30.0) > 0
+
+    # half-way into the next window half of the previous count remains
+    for _ in range(3):
+        assert limiter.hit("ip:ep", limit=5, now=90.0) == 0
+    assert limiter.hit("ip:ep", limit=5, now=90.0) > 0
+
+    # two windows of silence reset the key entirely
+    assert limiter.hit("ip:ep", limit=1, now=200.0) == 0
+
+
+def test_keys_are_capped_and_idle_keys_evicted():
+    limiter = SlidingWindowLimiter(window=60, max_keys=3)
+
+    for i in range(10):
+        limiter.hit(f"ip{i}:ep", limit=5, now=10.0)
+    assert len(limiter) == 3
+
+    limiter.hit("late:ep", limit=5, now=500.0)
+    assert len(limiter) == 1
+
+
+def test_login_endpoint_has_its_own_limit(client):
+    for _ in range(10):
+        client.post("/admin/login", json={"username": "admin", "password": "bad"})
+
+    res = client.post("/admin/login", json={"username": "admin", "password": "admin123"})
+    assert res.status_code == 429
+    assert int(res.headers["Retry-After"]) >= 1
+
+    # other endpoints keep their own budget
+    assert client.get("/health").status_code == 200
+
+
+def test_redis_limiter_falls_back_to_local_when_unreachable():
+    import redis
+    from backend.rate_limit import RedisLimiter
+
+    client = redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.05)
+    limiter = RedisLimiter(client, fallback=SlidingWindowLimiter(window=60))
+
+    assert limiter.hit_many([("ip:ep", 1), ("ip:*", 5)], now=10.0) == [0, 0]
+    assert limiter.hit("ip:ep", limit=1, now=10.0) > 0
+
+
+class ScriptCacheRedis:
+    """
+    Just enough of a Redis client to count round trips: EVALSHA fails
+    with NOSCRIPT until the script has been loaded.
+    """
+
+    def __init__(self):
+        self.round_trips = []
+        self.scripts = set()
+
+    def pipeline(self, transaction=True):
+        return ScriptCachePipeline(self)
+
+    def script_load(self, script):
+        import hashlib
+        self.round_trips.append(["SCRIPT LOAD"])
+        self.scripts.add(hashlib.sha1(script.encode()).hexdigest())
+
+
+class ScriptCachePipeline:
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def evalsha(self, sha, numkeys, *keys_and_args):
+        self.commands.append(sha)
+
+    def execute(self):
+        import redis
+        self.server.round_trips.append(["EVALSHA"] * len(self.commands))
+        if any(sha not in self.server.scripts for sha in self.commands):
+            raise redis.exceptions.NoScriptError("NOSCRIPT No matching script.")
+        return [[1, 0, 1] for _ in self.commands]
+
+
+def test_redis_limiter_checks_in_one_round_trip():
+    from backend.rate_limit import RedisLimiter
+
+    client = ScriptCacheRedis()
+    limiter = RedisLimiter(client, fallback=SlidingWindowLimiter(window=60))
+
+    # the script is loaded once, on NOSCRIPT, then every check is one EVALSHA batch
+    assert limiter.hit_many([("ip:ep", 5), ("ip:*", 50)], now=10.0) == [0, 0]
+    assert client.round_trips == [["EVALSHA", "EVALSHA"], ["SCRIPT LOAD"], ["EVALSHA", "EVALSHA"]]
+
+    client.round_trips.clear()
+    assert limiter.hit_many([("ip:ep", 5), ("ip:*", 50)], now=11.0) == [0, 0]
+    assert client.round_trips == [["EVALSHA", "EVALSHA"]]
@@ -0,0 +1,86 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+from backend.request_metrics import RequestMetrics
+
+
+def test_metrics_endpoint_exposes_latency_histograms(client):
+    client.get("/health")
+    client.get("/health")
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    body = res.get_data(as_text=True)
+
+    assert "# TYPE hms_http_request_duration_seconds histogram" in body
+    assert 'hms_http_request_duration_seconds_count{blueprint="health",endpoint="health.health"} 2' in body
+    assert 'hms_http_requests_total{blueprint="health",endpoint="health.health",method="GET",status="200"} 2' in body
+
+
+def test_worker_snapshots_merge_through_metrics_dir(tmp_path):
+    worker_a = RequestMetrics(str(tmp_path), flush_seconds=0)
+    worker_b = RequestMetrics(str(tmp_path), flush_seconds=0)
+
+    worker_a.observe("patient", "patient.book_appointment", "POST", 201, 0.02, 64)
+    worker_a.maybe_flush()
+    # simulate a second process: its own file name
+    worker_a._path = lambda pid: str(tmp_path / "hms-metrics-other.json")
+    worker_a.maybe_flush()
+
+    worker_b.observe("patient", "patient.book_appointment", "POST", 409, 0.01, 40)
+    merged = worker_b.collect()[("patient", "patient.book_appointment")]
+
+    assert merged["latency"].count == 2
+    assert merged["status"] == {("POST", 201): 1, ("POST", 409): 1}
+
+
+def test_shards_of_finished_threads_are_folded_away():
+    metrics = RequestMetrics()
+
+    for _ in range(20):
+        # one thread per request, as under the Werkzeug dev server
+        t = threading.Thread(target=metrics.observe, args=("health", "health.health", "GET", 200, 0.001, 10))
+        t.start()
+        t.join()
+
+    merged = metrics.snapshot()[("health", "health.health")]
+    assert merged["status"] == {("GET", 200): 20}
+    assert len(metrics._shards) == 0
+
+    metrics.observe("health", "health.health", "GET", 200, 0.001, 10)
+    assert len(metrics._shards) == 1
+    assert metrics.snapshot()[("health", "health.health")]["latency"].count == 21
+
+
+def test_exited_workers_are_folded_into_the_retired_file(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    dead = RequestMetrics(str(tmp_path), flush_seconds=0)
+    dead.observe("health", "health.health", "GET", 200, 0.001, 10)
+    dead.maybe_flush()
+    os.replace(dead._path(os.getpid()), dead._path(exited.pid))
+
+    # a peer on another host sharing the directory is left alone
+    peer = tmp_path / "hms-metrics-otherhost-1.json"
+    peer.write_text((tmp_path / f"hms-metrics-{socket.gethostname()}-{exited.pid}.json").read_text())
+
+    for _ in range(2):  # counts do not go backwards, nor double
+        merged = RequestMetrics(str(tmp_path)).collect()
+        assert merged[("health", "health.health")]["status"] == {("GET", 200): 2}
+
+    assert not os.path.exists(dead._path(exited.pid))
+    assert peer.exists()
+
+
+def test_forked_worker_keeps_its_first_observations():
+    metrics = RequestMetrics()
+    metrics.observe("health", "health.health", "GET", 200, 0.001, 10)
+
+    # as seen in a child forked after the parent served a request
+    metrics._pid = -1
+    metrics.observe("health", "health.health", "GET", 200, 0.001, 10)
+
+    assert metrics.snapshot()[("health", "health.health")]["status"] == {("GET", 200): 1}
@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from backend.db import get_pool
+from backend.response_cache import ResponseCache
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def patient_token(client, username):
+    client.post("/patient/register", json={"username": username, "password": "p123"})
+    return client.post(
+        "/patient/login", json={"username": username, "password": "p123"}
+    ).get_json()["token"]
+
+
+def new_slot(client):
+    doctor = client.post(
+        "/doctor/login", json={"username": "doctor1", "password": "doctor123"}
+    ).get_json()["token"]
+    start = datetime.utcnow() + timedelta(days=1)
+    return client.post("/doctor/slots", headers=auth_header(doctor), json={
+        "start_datetime": start.isoformat(timespec="seconds"),
+        "end_datetime": (start + timedelta(minutes=30)).isoformat(timespec="seconds"),
+    }).get_json()["slot_id"]
+
+
+def checkouts(client):
+    with client.application.app_context():
+        return get_pool().stats()["checkouts"]
+
+
+def test_unchanged_list_is_answered_without_sqlite(client):
+    headers = auth_header(patient_token(client, "p_etag"))
+
+    first = client.get("/patient/appointments", headers=headers)
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and first.headers["Cache-Control"] == "private, no-cache"
+
+    before = checkouts(client)
+    cached = client.get("/patient/appointments", headers=headers)
+    revalidated = client.get("/patient/appointments", headers=dict(headers, **{"If-None-Match": etag}))
+
+    assert cached.status_code == 200 and cached.data == first.data
+    assert revalidated.status_code == 304 and revalidated.headers["ETag"] == etag
+    assert checkouts(client) == before
+
+
+def test_writes_change_only_the_affected_etags(client):
+    mine = auth_header(patient_token(client, "p_etag_mine"))
+    other = auth_header(patient_token(client, "p_etag_other"))
+
+    my_etag = client.get("/patient/appointments", headers=mine).headers["ETag"]
+    other_etag = client.get("/patient/appointments", headers=other).headers["ETag"]
+
+    client.post("/patient/appointments", headers=mine, json={"slot_id": new_slot(client)})
+
+    res = client.get("/patient/appointments", headers=dict(mine, **{"If-None-Match": my_etag}))
+    assert res.status_code == 200
+    assert res.headers["ETag"] != my_etag
+    assert len(res.get_json()) == 1
+
+    res = client.get("/patient/appointments", headers=dict(other, **{"If-None-Match": other_etag}))
+    assert res.status_code == 304
+
+
+def test_patient_list_and_hit_rate_for_admins(client):
+    admin = auth_header(client.post(
+        "/admin/login", json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"])
+    client.post("/patient/register", json={"username": "p_listed", "password": "p123"})
+
+    listing = client.get("/admin/patients", headers=admin)
+    patient_id = listing.get_json()[0]["id"]
+
+    client.patch(f"/admin/patients/{patient_id}/deactivate", headers=admin)
+    after = client.get("/admin/patients", headers=dict(admin, **{"If-None-Match": listing.headers["ETag"]}))
+    assert after.status_code == 200
+    assert after.get_json()[0]["is_active"] == 0
+
+    client.get("/admin/patients", headers=admin)
+    stats = client.get("/admin/metrics/response-cache", headers=admin).get_json()
+    assert stats["hits"] >= 1 and stats["misses"] >= 2
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_other_processes_writes_show_up_after_refresh(tmp_path):
+    path = str(tmp_path / "versions.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE resource_versions (resource TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO resource_versions VALUES ('patients', 1)")
+    conn.commit()
+
+    cache = ResponseCache(max_size=10, refresh_seconds=1)
+    assert cache.versions(lambda: conn, ["patients", "penalties"], now=100) == (1, 0)
+
+    # a write committed by another worker
+    conn.execute("INSERT INTO resource_versions VALUES ('penalties', 2)")
+    conn.commit()
+
+    assert cache.versions(lambda: conn, ["penalties"], now=100.5) == (0,)
+    assert cache.versions(lambda: conn, ["penalties"], now=101) == (2,)
+    conn.close()
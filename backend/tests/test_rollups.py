@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from backend import job_state
+from backend.db import get_db
+from backend.response_cache import get_response_cache
+from backend.rollups import JOB_NAME, roll_up, run_rollups
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def login(client, role, username, password):
+    return auth_header(client.post(
+        f"/{role}/login", json={"username": username, "password": password}
+    ).get_json()["token"])
+
+
+def book(client, doctor, patient, start):
+    slot_id = client.post("/doctor/slots", headers=doctor, json={
+        "start_datetime": start.isoformat(timespec="seconds"),
+        "end_datetime": (start + timedelta(minutes=30)).isoformat(timespec="seconds"),
+    }).get_json()["slot_id"]
+    client.post("/patient/appointments", headers=patient, json={"slot_id": slot_id})
+    return next(
+        a["appointment_id"]
+        for a in client.get("/patient/appointments", headers=patient).get_json()
+        if a["start_datetime"].startswith(start.isoformat(timespec="minutes"))
+    )
+
+
+def outcomes(client):
+    """
+    Two days of one doctor's appointments for one patient:
+    day 1 completed + no-show, day 2 no-show + cancelled.
+    """
+    doctor = login(client, "doctor", "doctor1", "doctor123")
+    client.post("/patient/register", json={"username": "p_rollup", "password": "p123"})
+    patient = login(client, "patient", "p_rollup", "p123")
+
+    day1 = (datetime.utcnow() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    day2 = day1 + timedelta(days=1)
+    ids = [book(client, doctor, patient, start) for start in (day1, day1 + timedelta(hours=1), day2, day2 + timedelta(hours=1))]
+
+    client.post(f"/doctor/appointments/{ids[0]}/complete", headers=doctor)
+    client.post(f"/doctor/appointments/{ids[1]}/no-show", headers=doctor)
+    client.post(f"/doctor/appointments/{ids[2]}/no-show", headers=doctor)
+    client.patch(f"/patient/appointments/{ids[3]}/cancel", headers=patient)
+
+    return day1.date(), day2.date()
+
+
+def test_series_sums_rollups_per_bucket(client):
+    day1, day2 = outcomes(client)
+    admin = login(client, "admin", "admin", "admin123")
+
+    with client.application.app_context():
+        assert run_rollups()["applied"] == 4
+        assert run_rollups()["applied"] == 0
+
+    url = f"/admin/metrics/no-show-rate?from={day1}&to={day2 + timedelta(days=1)}"
+    body = client.get(url, headers=admin).get_json()
+    assert [p["period"] for p in body["series"]] == [str(day1), str(day2)]
+    assert body["series"][0] == {
+        "period": str(day1), "completed": 1, "no_show": 1,
+        "cancelled_by_patient": 0, "cancelled_by_admin": 0, "no_show_rate": 0.5,
+    }
+    assert body["series"][1]["no_show_rate"] == 1.0
+    assert body["series"][1]["cancelled_by_patient"] == 1
+    assert body["totals"]["no_show"] == 2 and body["totals"]["no_show_rate"] == round(2 / 3, 4)
+    assert body["as_of"] is not None
+
+    doctor_id = client.get("/doctor/me", headers=login(client, "doctor", "doctor1", "doctor123")).get_json()["doctor_id"]
+    month = client.get(f"{url}&bucket=month&doctor_id={doctor_id}", headers=admin).get_json()
+    assert month["totals"] == body["totals"]
+    assert all(p["period"].endswith("-01") for p in month["series"])
+
+    other = client.get(f"{url}&doctor_id={doctor_id + 1000}", headers=admin).get_json()
+    assert other["series"] == [] and other["totals"]["no_show_rate"] is None
+
+
+def test_patient_series_and_etag_follow_the_rollups(client):
+    day1, day2 = outcomes(client)
+    admin = login(client, "admin", "admin", "admin123")
+    patient_id = client.get("/admin/patients", headers=admin).get_json()[0]["id"]
+
+    url = f"/admin/metrics/patients/{patient_id}/no-show-rate?from={day1}&to={day2 + timedelta(days=1)}&bucket=week"
+    before = client.get(url, headers=admin)
+    assert before.get_json()["totals"]["no_show"] == 0
+
+    with client.application.app_context():
+        run_rollups()
+        # as if the refresh interval had passed since the job's bump
+        get_response_cache().expire_versions()
+
+    after = client.get(url, headers=dict(admin, **{"If-None-Match": before.headers["ETag"]}))
+    assert after.status_code == 200
+    assert after.get_json()["totals"] == {
+        "completed": 1, "no_show": 2, "cancelled_by_patient": 1, "cancelled_by_admin": 0,
+        "no_show_rate": round(2 / 3, 4),
+    }
+
+
+def test_chunked_run_resumes_from_the_watermark(client):
+    outcomes(client)
+
+    with client.application.app_context():
+        db = get_db()
+        assert roll_up(db, chunk_rows=1, max_chunks=3) == 3
+        first = job_state.get_watermark(db, JOB_NAME)
+        assert roll_up(db, chunk_rows=1, max_chunks=10) == 1
+        assert job_state.get_watermark(db, JOB_NAME) > first
+
+        totals = db.execute(
+            "SELECT SUM(completed), SUM(no_show), SUM(cancelled_by_patient) FROM daily_doctor_outcomes"
+        ).fetchone()
+        assert tuple(totals) == (1, 2, 1)
+
+
+def test_bad_ranges(client):
+    admin = login(client, "admin", "admin", "admin123")
+
+    for query in ("from=2026-13-01", "from=2026-02-01&to=2026-01-01", "from=2000-01-01&to=2026-01-01", "bucket=year"):
+        res = client.get(f"/admin/metrics/no-show-rate?{query}", headers=admin)
+        assert res.status_code == 400, query
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import types
+
+from backend import snapshot
+from backend.db import get_db
+from backend.init_db import get_db_path
+from backend.response_cache import bump, get_response_cache
+
+
+def admin_header(client):
+    token = client.post(
+        "/admin/login", json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_penalty(client, appointment_id):
+    # straight into the live file: no appointment rows to satisfy foreign keys
+    live = sqlite3.connect(get_db_path())
+    live.execute(
+        "INSERT INTO patient_no_show_penalties (appointment_id, patient_id) VALUES (?, 1)",
+        (appointment_id,)
+    )
+    bump(live, "penalties")
+    live.commit()
+    live.close()
+
+    with client.application.app_context():
+        get_response_cache().expire_versions()
+
+
+def test_backup_is_consistent_while_writers_commit(client, tmp_path, monkeypatch):
+    live = sqlite3.connect(get_db_path())
+    live.execute("PRAGMA journal_mode=WAL")  # as set by every pooled connection
+    live.executemany(
+        "INSERT INTO appointment_audit_logs (appointment_id, actor_role, actor_id, action) VALUES (?, 'admin', 1, 'X')",
+        [(i,) for i in range(5000)]
+    )
+    live.commit()
+
+    def commit_between_steps(seconds):
+        live.execute(
+            "INSERT INTO appointment_audit_logs (appointment_id, actor_role, actor_id, action) VALUES (0, 'admin', 1, 'Y')"
+        )
+        live.commit()
+
+    monkeypatch.setattr(snapshot, "ANALYTICS_SNAPSHOT_PAGES_PER_STEP", 5)
+    monkeypatch.setattr(snapshot, "time", types.SimpleNamespace(sleep=commit_between_steps))
+
+    path = str(tmp_path / "analytics.db")
+    result = snapshot.take_snapshot(path=path)
+
+    # never restarted: one step per 5 pages, and none of the later commits copied
+    assert result["steps"] == -(-result["pages"] // 5)
+    copy = snapshot.open_snapshot_connection(path)
+    assert copy.execute("SELECT COUNT(*) FROM appointment_audit_logs WHERE action = 'Y'").fetchone()[0] == 0
+    assert copy.execute("SELECT COUNT(*) FROM appointment_audit_logs").fetchone()[0] == 5000
+    assert copy.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    copy.close()
+    live.close()
+
+    assert not os.path.exists(f"{path}-wal") and not os.path.exists(f"{path}.tmp")
+
+
+def test_metrics_read_the_snapshot_until_it_is_too_old(client, tmp_path, monkeypatch):
+    admin = admin_header(client)
+    monkeypatch.setattr(snapshot, "ANALYTICS_SNAPSHOT_PATH", str(tmp_path / "analytics.db"))
+
+    live = client.get("/admin/metrics/penalties", headers=admin)
+    assert live.headers["X-Snapshot-Age"] == "0"
+
+    with client.application.app_context():
+        assert snapshot.refresh_snapshot()["skipped"] is False
+    add_penalty(client, 1)
+
+    res = client.get("/admin/metrics/penalties", headers=admin)
+    assert res.get_json() == []
+    assert int(res.headers["X-Snapshot-Age"]) <= 1
+
+    monkeypatch.setattr(snapshot, "ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS", -1)
+    res = client.get("/admin/metrics/penalties", headers=admin)
+    assert res.get_json() == [{"patient_id": 1, "penalty_count": 1}]
+    assert res.headers["X-Snapshot-Age"] == "0"
+
+
+def test_refresh_changes_the_etag(client, tmp_path, monkeypatch):
+    admin = admin_header(client)
+    monkeypatch.setattr(snapshot, "ANALYTICS_SNAPSHOT_PATH", str(tmp_path / "analytics.db"))
+
+    with client.application.app_context():
+        snapshot.refresh_snapshot()
+    first = client.get("/admin/metrics/penalties", headers=admin)
+
+    add_penalty(client, 1)
+    with client.application.app_context():
+        snapshot.refresh_snapshot()
+        # as if the refresh interval had passed since the task's bump
+        get_response_cache().expire_versions()
+
+    res = client.get("/admin/metrics/penalties", headers=dict(admin, **{"If-None-Match": first.headers["ETag"]}))
+    assert res.status_code == 200
+    assert res.get_json() == [{"patient_id": 1, "penalty_count": 1}]
+
+
+def test_overlapping_refresh_is_skipped(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "ANALYTICS_SNAPSHOT_PATH", str(tmp_path / "analytics.db"))
+
+    with client.application.app_context():
+        db = get_db()
+        snapshot.job_state.acquire_lease(db, snapshot.JOB_NAME, "other-host:1", 60)
+        assert snapshot.refresh_snapshot() == {"skipped": True}
+        assert snapshot.snapshot_age() is None
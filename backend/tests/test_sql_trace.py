@@ -0,0 +1,41 @@
+import logging
+
+from backend import sql_trace
+from backend.db import ConnectionPool
+
+
+def auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_traced_queries_are_aggregated_per_endpoint(client, monkeypatch, caplog):
+    app = client.application
+    old_pool = app.extensions["hms_db_pool"]
+    app.extensions["hms_db_pool"] = ConnectionPool(
+        old_pool.db_path, size=2, timeout=1, max_uses=100, trace=True
+    )
+    # everything counts as slow, so the plan gets logged
+    monkeypatch.setattr(sql_trace, "SQL_SLOW_MS", 0)
+
+    token = client.post(
+        "/admin/login",
+        json={"username": "admin", "password": "admin123"}
+    ).get_json()["token"]
+
+    with caplog.at_level(logging.WARNING, logger="backend.sql_trace"):
+        client.get("/admin/patients", headers=auth_header(token))
+
+    assert any("slow query" in r.message and "plan=" in r.message for r in caplog.records)
+
+    stats = client.get("/admin/metrics/sql", headers=auth_header(token)).get_json()
+    assert stats["endpoints"]["admin.list_patients"]["requests"] == 1
+
+    login_sql = [s for s in stats["statements"] if "auth.admin_login" in s["endpoints"]]
+    lookup = [s for s in login_sql if s["sql"].startswith("SELECT id, password_hash FROM users")]
+    assert len(lookup) == 1
+    assert lookup[0]["rows"] == 1
+
+
+def test_normalize_collapses_in_lists():
+    assert sql_trace.normalize("SELECT *\n  FROM t WHERE id IN (?, ?,?)") == \
+        "SELECT * FROM t WHERE id IN (?, ...)"
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from backend.init_db import init_db
+from backend.status import Status
+
+
+def test_parse_accepts_legacy_spellings():
+    assert Status.parse("booked") is Status.BOOKED
+    assert Status.parse("NO_SHOW") is Status.NO_SHOW
+    assert Status.parse("CANCELLED_BY_ADMIN") is Status.CANCELLED
+    assert Status.parse(2) is Status.COMPLETED
+    with pytest.raises(ValueError):
+        Status.parse("lost")
+
+
+def test_init_db_converts_legacy_text_statuses(monkeypatch):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    monkeypatch.setenv("HMS_DB_PATH", path)
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER NOT NULL,
+        patient_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'booked',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE UNIQUE INDEX uq_appt_slot_active
+        ON appointments(slot_id) WHERE status IN ('booked', 'BOOKED');
+    INSERT INTO appointments (slot_id, patient_id, status) VALUES
+        (1, 1, 'booked'), (2, 1, 'BOOKED'), (3, 1, 'no_show'), (4, 1, 'NO_SHOW'),
+        (5, 1, 'completed'), (6, 1, 'cancelled'), (7, 1, 'CANCELLED_BY_PATIENT');
+    """)
+    conn.close()
+
+    try:
+        init_db()
+        init_db()  # second run is a no-op
+
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT status FROM appointments ORDER BY id").fetchall()
+        assert [r[0] for r in rows] == [1, 1, 4, 4, 2, 3, 3]
+
+        index_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'uq_appt_slot_active'"
+        ).fetchone()[0]
+        assert index_sql.endswith("WHERE status = 1")
+
+        stats = conn.execute(
+            "SELECT active_appointments, no_show_appointments, cancelled_appointments "
+            "FROM stats_counters"
+        ).fetchone()
+        assert stats == (2, 2, 2)
+
+        plan = conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM appointments "
+            f"WHERE slot_id = ? AND status = {Status.BOOKED.sql}",
+            (1,)
+        ).fetchall()
+        assert "uq_appt_slot_active" in plan[0][3]
+        conn.close()
+    finally:
+        os.unlink(path)
@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from backend.config import JWT_EXP_SECONDS, TOKEN_CACHE_SIZE
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT claims, keyed by token digest.
+
+    - entries live until the token's own `exp`
+    - invalidate_user() drops a user's cached tokens and revokes every
+      token issued to them up to now, so a deactivated patient or a
+      blacklisted doctor cannot keep using an already verified token;
+      times are sub-second, so a token issued later in the same second
+      (after re-activation) is accepted
+    - a revocation is forgotten once every token it covers has expired
+    - revocations are per process, like the cache itself
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+
+        self._entries = OrderedDict()  # digest -> claims
+        self._by_user = {}  # sub -> set(digest)
+        self._revoked_at = {}  # sub -> unix time (float)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token, now=None):
+        now = time.time() if now is None else now
+        digest = self._digest(token)
+
+        with self._lock:
+            claims = self._entries.get(digest)
+
+            if claims is None:
+                self.misses += 1
+                return None
+
+            if claims["exp"] <= now:
+                self._drop(digest)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        """
+        Cache verified claims. Returns False if the token was revoked.
+        """
+        digest = self._digest(token)
+        sub = claims["sub"]
+
+        with self._lock:
+            if self._is_revoked(claims):
+                return False
+
+            self._entries[digest] = claims
+            self._entries.move_to_end(digest)
+            self._by_user.setdefault(sub, set()).add(digest)
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+        return True
+
+    def is_revoked(self, claims):
+        with self._lock:
+            return self._is_revoked(claims)
+
+    def invalidate_user(self, user_id, now=None):
+        sub = str(user_id)
+        now = time.time() if now is None else now
+
+        with self._lock:
+            # tokens issued before these revocations have all expired
+            expired = [s for s, at in self._revoked_at.items() if now - at > JWT_EXP_SECONDS]
+            for s in expired:
+                del self._revoked_at[s]
+
+            self._revoked_at[sub] = now
+
+            for digest in self._by_user.pop(sub, ()):
+                self._entries.pop(digest, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "revoked_users": len(self._revoked_at),
+            }
+
+    # -------------------------
+    # internals
+    # -------------------------
+    def _is_revoked(self, claims):
+        revoked_at = self._revoked_at.get(claims["sub"])
+        return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+    def _drop(self, digest):
+        claims = self._entries.pop(digest)
+        digests = self._by_user.get(claims["sub"])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[claims["sub"]]
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+
+def get_token_cache():
+    return current_app.extensions["hms_token_cache"]
+
+
+def init_app(app):
+    app.extensions["hms_token_cache"] = TokenCache(TOKEN_CACHE_SIZE)
@@ -0,0 +1,129 @@
+"""
+Booking contention benchmark.
+
+N concurrent patients try to book the same slot(s) through the WSGI app
+at the same instant. Verifies there are zero double bookings and reports
+throughput.
+
+    python -m bench.booking_contention --bookers 100 --slots 1
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# benchmark traffic comes from a single address
+os.environ.setdefault("HMS_RATE_LIMIT_ENABLED", "0")
+
+
+def run(bookers, slots, pool_size):
+    os.environ["HMS_DB_POOL_SIZE"] = str(pool_size)
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.environ["HMS_DB_PATH"] = db_path
+
+    from backend.app import create_app
+    from backend.db import get_db
+    from backend.init_db import init_db
+    from backend.routes import make_token
+    from backend.status import Status
+
+    init_db()
+    app = create_app()
+
+    with app.app_context():
+        db = get_db()
+        doctor_id = db.execute("SELECT user_id FROM doctors LIMIT 1").fetchone()[0]
+
+        slot_ids = [
+            db.execute(
+                "INSERT INTO doctor_slots (doctor_id, slot_time) VALUES (?, ?)",
+                (doctor_id, f"2030-01-01T09:{i:02d}:00")
+            ).lastrowid
+            for i in range(slots)
+        ]
+
+        # tokens are minted directly: the benchmark targets booking, not login
+        tokens = []
+        for i in range(bookers):
+            patient_id = db.execute(
+                "INSERT INTO users (username, password_hash, role) VALUES (?, 'x', 'patient')",
+                (f"bench_patient_{i}",)
+            ).lastrowid
+            tokens.append(make_token(patient_id, "patient"))
+        db.commit()
+
+    results = [None] * bookers
+    latencies = [0.0] * bookers
+    barrier = threading.Barrier(bookers)
+
+    def book(i):
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {tokens[i]}"}
+        barrier.wait()
+
+        start = time.perf_counter()
+        res = client.post(
+            "/patient/appointments",
+            json={"slot_id": slot_ids[i % slots]},
+            headers=headers,
+        )
+        latencies[i] = time.perf_counter() - start
+        results[i] = res.status_code
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(bookers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        per_slot = get_db().execute(
+            f"""
+            SELECT slot_id, COUNT(*) AS n
+            FROM appointments
+            WHERE status = {Status.BOOKED.sql}
+            GROUP BY slot_id
+            """
+        ).fetchall()
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+    latencies.sort()
+    return {
+        "bookers": bookers,
+        "slots": slots,
+        "booked": results.count(201),
+        "conflicts": results.count(409),
+        "errors": len([r for r in results if r not in (201, 409)]),
+        "double_bookings": sum(row["n"] - 1 for row in per_slot if row["n"] > 1),
+        "elapsed_s": round(elapsed, 4),
+        "requests_per_s": round(bookers / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bookers", type=int, default=100)
+    parser.add_argument("--slots", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    report = run(args.bookers, args.slots, args.pool_size)
+    for key, value in report.items():
+        print(f"{key:>16}: {value}")
+
+    ok = report["double_bookings"] == 0 and report["booked"] == min(args.slots, args.bookers)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
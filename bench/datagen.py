@@ -0,0 +1,277 @@
+"""
+Synthetic dataset generator.
+
+Builds a database of realistic size and shape, reproducible from a seed:
+
+- doctors across weighted specializations, a few blacklisted
+- lognormal doctor popularity and heavy-tailed patient activity
+- a history of past appointments (mostly COMPLETED, some CANCELLED and
+  NO_SHOW, with audit rows and penalties) and a partly booked future
+- free future slots for every doctor, so a load test has slots to book
+
+All patients and doctors share the password BENCH_PASSWORD.
+
+    python -m bench.datagen --db /tmp/hms_bench.db \\
+        --doctors 500 --patients 50000 --appointments 1000000 --seed 42
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+BENCH_PASSWORD = "bench-pass"
+
+SPECIALIZATIONS = {
+    "General Medicine": 30,
+    "Pediatrics": 12,
+    "Cardiology": 10,
+    "Dermatology": 10,
+    "Orthopedics": 9,
+    "Gynecology": 9,
+    "ENT": 7,
+    "Psychiatry": 7,
+    "Neurology": 6,
+}
+
+DAY_START_HOUR = 9
+SLOTS_PER_DAY = 16  # 09:00-17:00 in half hours
+SLOT_MINUTES = 30
+
+BLACKLISTED_SHARE = 0.02
+FUTURE_DAYS = 28  # at least; more if the busiest doctor needs them
+FUTURE_FILL = 0.6
+FUTURE_SHARE = 0.1  # of appointments, booked into the future
+HISTORY_FILL = 0.85  # booked share of the busiest doctor's past slots
+
+# status mix: past appointments, future appointments
+PAST_STATUSES = {"COMPLETED": 80, "CANCELLED": 13, "NO_SHOW": 7}
+FUTURE_STATUSES = {"BOOKED": 88, "CANCELLED": 12}
+
+# audit row (actor role, action) of an appointment closed in each status
+AUDIT_ACTIONS = {
+    "COMPLETED": ("doctor", "COMPLETED"),
+    "CANCELLED": ("patient", "CANCELLED_BY_PATIENT"),
+    "NO_SHOW": ("system", "NO_SHOW"),
+}
+
+BATCH_ROWS = 50_000
+
+
+def _weighted(rng, table, k):
+    return rng.choices(list(table), weights=list(table.values()), k=k)
+
+
+def _popularity(rng, n, sigma):
+    """
+    n lognormal weights, normalized to sum to 1 and capped at 4x the mean
+    so no single doctor needs an impossible calendar.
+    """
+    weights = [min(rng.lognormvariate(0, sigma), 4.0) for _ in range(n)]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def _split(total, shares):
+    """
+    Integer split of `total` proportional to `shares` (largest remainder).
+    """
+    raw = [total * s for s in shares]
+    counts = [int(r) for r in raw]
+    by_remainder = sorted(range(len(raw)), key=lambda i: raw[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def _slot_time(anchor, offset):
+    """
+    Slot number `offset` of a doctor's calendar, counted from `anchor`
+    (negative offsets are in the past).
+    """
+    day, position = divmod(offset, SLOTS_PER_DAY)
+    begin = datetime.combine(anchor + timedelta(days=day), datetime.min.time())
+    begin += timedelta(hours=DAY_START_HOUR, minutes=position * SLOT_MINUTES)
+    return begin, begin + timedelta(minutes=SLOT_MINUTES)
+
+
+def _insert(conn, sql, rows):
+    for i in range(0, len(rows), BATCH_ROWS):
+        conn.executemany(sql, rows[i:i + BATCH_ROWS])
+
+
+def generate(db_path, doctors, patients, appointments, seed=42, anchor=None):
+    """
+    Create (or extend) the database at `db_path` with a synthetic dataset.
+    Returns row counts and timing.
+    """
+    from werkzeug.security import generate_password_hash
+
+    from backend import counters
+    from backend.init_db import init_db
+    from backend.status import Status
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+
+    os.environ["HMS_DB_PATH"] = db_path
+    init_db()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA foreign_keys=OFF")
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    # --- users -------------------------------------------------------
+    first_user = (conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+    patient_ids = list(range(first_user, first_user + patients))
+    doctor_ids = list(range(first_user + patients, first_user + patients + doctors))
+
+    _insert(conn, "INSERT INTO users (id, username, password_hash, role) VALUES (?, ?, ?, ?)", [
+        (user_id, f"patient{i}@bench.example", password_hash, "patient")
+        for i, user_id in enumerate(patient_ids)
+    ] + [
+        (user_id, f"doctor{i}@bench.example", password_hash, "doctor")
+        for i, user_id in enumerate(doctor_ids)
+    ])
+
+    specializations = _weighted(rng, SPECIALIZATIONS, doctors)
+    _insert(conn, "INSERT INTO doctors (user_id, name, specialization, is_blacklisted) VALUES (?, ?, ?, ?)", [
+        (user_id, f"Dr. Bench {i}", specializations[i], int(rng.random() < BLACKLISTED_SHARE))
+        for i, user_id in enumerate(doctor_ids)
+    ])
+
+    # --- calendars ---------------------------------------------------
+    future_total = int(appointments * FUTURE_SHARE)
+    past_counts = _split(appointments - future_total, _popularity(rng, doctors, 0.5))
+    future_counts = _split(future_total, _popularity(rng, doctors, 0.5))
+
+    # every doctor works the same calendar; the busiest doctor fills
+    # HISTORY_FILL of the past and at most FUTURE_FILL of the future
+    history_days = max(1, -(-max(past_counts) // int(SLOTS_PER_DAY * HISTORY_FILL)))
+    future_days = max(FUTURE_DAYS, -(-max(future_counts) // int(SLOTS_PER_DAY * FUTURE_FILL)))
+    future_slots = future_days * SLOTS_PER_DAY
+
+    # patients: heavy-tailed activity (a few frequent visitors, many one-offs)
+    patient_cum_weights = list(accumulate(rng.paretovariate(1.5) for _ in range(patients)))
+
+    slot_id = (conn.execute("SELECT MAX(id) FROM doctor_slots").fetchone()[0] or 0) + 1
+    appointment_id = (conn.execute("SELECT MAX(id) FROM appointments").fetchone()[0] or 0) + 1
+
+    totals = {"slots": 0, "appointments": 0, "audit_logs": 0, "penalties": 0}
+
+    for d, doctor_id in enumerate(doctor_ids):
+        slots, appts, audits, penalties = [], [], [], []
+
+        # past: only the booked slots; future: the whole calendar from tomorrow
+        past = sorted(rng.sample(range(history_days * SLOTS_PER_DAY), past_counts[d]))
+        future = set(rng.sample(range(future_slots), future_counts[d]))
+
+        calendar = [(o - history_days * SLOTS_PER_DAY, True) for o in past]
+        calendar += [(o + SLOTS_PER_DAY, o in future) for o in range(future_slots)]
+
+        statuses = iter(
+            _weighted(rng, PAST_STATUSES, past_counts[d])
+            + _weighted(rng, FUTURE_STATUSES, future_counts[d])
+        )
+        owners = iter(rng.choices(
+            patient_ids, cum_weights=patient_cum_weights, k=past_counts[d] + future_counts[d]
+        ))
+
+        for offset, taken in calendar:
+            begin, end = _slot_time(anchor, offset)
+            status = Status[next(statuses)] if taken else None
+            slots.append((
+                slot_id, doctor_id, begin.isoformat(), end.isoformat(),
+                int(status not in (None, Status.CANCELLED)),
+            ))
+
+            if status is not None:
+                patient_id = next(owners)
+                appts.append((
+                    appointment_id, slot_id, patient_id, int(status),
+                    end.isoformat(), doctor_id, begin.date().isoformat(),
+                    (begin - timedelta(days=rng.randint(1, 21))).isoformat(sep=" "),
+                ))
+
+                if status is not Status.BOOKED:
+                    role, action = AUDIT_ACTIONS[status.label]
+                    actor_id = {"patient": patient_id, "doctor": doctor_id}.get(role, 0)
+                    audits.append((appointment_id, role, actor_id, action, end.isoformat(sep=" ")))
+                if status is Status.NO_SHOW:
+                    penalties.append((appointment_id, patient_id))
+
+                appointment_id += 1
+            slot_id += 1
+
+        _insert(conn, "INSERT INTO doctor_slots (id, doctor_id, slot_time, end_time, is_booked) VALUES (?, ?, ?, ?, ?)", slots)
+        _insert(conn, """
+            INSERT INTO appointments
+            (id, slot_id, patient_id, status, end_datetime, doctor_id, date, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, appts)
+        _insert(conn, """
+            INSERT INTO appointment_audit_logs
+            (appointment_id, actor_role, actor_id, action, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, audits)
+        _insert(conn, """
+            INSERT INTO patient_no_show_penalties (appointment_id, patient_id, email_sent)
+            VALUES (?, ?, 1)
+        """, penalties)
+
+        totals["slots"] += len(slots)
+        totals["appointments"] += len(appts)
+        totals["audit_logs"] += len(audits)
+        totals["penalties"] += len(penalties)
+
+    conn.commit()
+    counters.reconcile(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    return dict(
+        totals,
+        doctors=doctors,
+        patients=patients,
+        history_days=history_days,
+        future_days=future_days,
+        seed=seed,
+        anchor=anchor.isoformat(),
+        elapsed_s=round(time.perf_counter() - started, 2),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor", type=date.fromisoformat, help="'today' of the dataset (default: today)")
+    parser.add_argument("--force", action="store_true", help="replace an existing database")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists, pass --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.unlink(args.db + suffix)
+
+    report = generate(args.db, args.doctors, args.patients, args.appointments, args.seed, args.anchor)
+    for key, value in report.items():
+        print(f"{key:>16}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
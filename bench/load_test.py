@@ -0,0 +1,401 @@
+"""
+Mixed-workload load test through the WSGI app.
+
+Worker threads play patients and an admin against a copy of a dataset
+built by bench.datagen: login, token refresh, booking, listing,
+cancelling and admin stats in a weighted mix. Reports throughput, latency percentiles per
+operation and time spent waiting for connections and the SQLite write
+lock, and saves the report as JSON so runs can be compared.
+
+    python -m bench.load_test --db /tmp/hms_bench.db --concurrency 16 --duration 30
+    python -m bench.load_test --db /tmp/hms_bench.db --compare bench/results/<earlier>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from bench.datagen import BENCH_PASSWORD
+
+# benchmark traffic comes from a single address
+os.environ.setdefault("HMS_RATE_LIMIT_ENABLED", "0")
+
+DEFAULT_MIX = {
+    "login": 5,
+    "refresh": 5,
+    "book": 15,
+    "list_patient": 30,
+    "list_admin": 15,
+    "cancel": 10,
+    "admin_stats": 20,
+}
+
+SAMPLE_PATIENTS = 2_000
+SAMPLE_FREE_SLOTS = 20_000
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_mix(text):
+    """
+    "login=10,book=20" -> {"login": 10, "book": 20}
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f"unknown operation {name.strip()!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an ascending list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _copy_database(source):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    dst.close()
+    src.close()
+    return path
+
+
+def _sample_workload(db_path, rng):
+    """
+    Patients to play (with their future bookings) and free future slots.
+    """
+    from backend.status import Status
+
+    conn = sqlite3.connect(db_path)
+    today = date.today().isoformat()
+
+    patients = [
+        row[0] for row in conn.execute(
+            "SELECT username FROM users WHERE role = 'patient' AND username LIKE '%@bench.example'"
+        )
+    ]
+    if not patients:
+        raise SystemExit("no bench patients: build the dataset with python -m bench.datagen")
+    patients = rng.sample(patients, min(SAMPLE_PATIENTS, len(patients)))
+
+    free_slots = [
+        row[0] for row in conn.execute(
+            """
+            SELECT s.id
+            FROM doctor_slots s
+            JOIN doctors d ON d.user_id = s.doctor_id
+            WHERE s.is_booked = 0 AND s.slot_time > ? AND d.is_blacklisted = 0
+            """,
+            (today,)
+        )
+    ]
+    rng.shuffle(free_slots)
+    conn.close()
+
+    return patients, free_slots[:SAMPLE_FREE_SLOTS]
+
+
+class Recorder:
+    """
+    Latencies and status codes per operation, shared by all workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, op, status, elapsed):
+        with self._lock:
+            self.latencies[op].append(elapsed)
+            self.statuses[op][status] += 1
+
+    def report(self, elapsed):
+        operations = {}
+        for op in sorted(self.latencies):
+            values = sorted(self.latencies[op])
+            statuses = self.statuses[op]
+            operations[op] = {
+                "count": len(values),
+                "errors": sum(n for code, n in statuses.items() if code >= 500 or code == 0),
+                "rejected": sum(n for code, n in statuses.items() if 400 <= code < 500),
+                "statuses": {str(code): n for code, n in sorted(statuses.items())},
+                "requests_per_s": round(len(values) / elapsed, 1),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p90_ms": round(percentile(values, 90) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        totals = {
+            "requests": len(everything),
+            "errors": sum(o["errors"] for o in operations.values()),
+            "requests_per_s": round(len(everything) / elapsed, 1),
+            "p50_ms": round((percentile(everything, 50) or 0) * 1000, 2),
+            "p99_ms": round((percentile(everything, 99) or 0) * 1000, 2),
+        }
+        return totals, operations
+
+
+class Worker:
+    """
+    One simulated client: a patient session plus an admin token.
+    """
+
+    def __init__(self, app, recorder, rng, patients, free_slots, admin_token, mix):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.rng = rng
+        self.patients = patients
+        self.free_slots = free_slots
+        self.admin_token = admin_token
+        self.ops = list(mix)
+        self.weights = list(mix.values())
+
+        self.token = None
+        self.refresh_token = None
+        self.booked = []
+
+    def request(self, op, method, url, token=None, **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        start = time.perf_counter()
+        try:
+            res = self.client.open(url, method=method, headers=headers, **kwargs)
+            status = res.status_code
+        except Exception:
+            res, status = None, 0
+        self.recorder.record(op, status, time.perf_counter() - start)
+        return res
+
+    def login(self):
+        res = self.request("login", "POST", "/patient/login", json={
+            "username": self.rng.choice(self.patients),
+            "password": BENCH_PASSWORD,
+        })
+        if res is not None and res.status_code == 200:
+            body = res.get_json()
+            self.token, self.refresh_token = body["token"], body["refresh_token"]
+            self.booked = []
+
+    def refresh(self):
+        res = self.request("refresh", "POST", "/auth/refresh", json={"refresh_token": self.refresh_token})
+        if res is not None and res.status_code == 200:
+            body = res.get_json()
+            self.token, self.refresh_token = body["token"], body["refresh_token"]
+
+    def book(self):
+        try:
+            slot_id = self.free_slots.pop()
+        except IndexError:
+            return self.list_patient()
+        self.request("book", "POST", "/patient/appointments", self.token, json={"slot_id": slot_id})
+
+    def list_patient(self):
+        res = self.request("list_patient", "GET", "/patient/appointments", self.token)
+        if res is not None and res.status_code == 200:
+            self.booked = [a["appointment_id"] for a in res.get_json() if a["status"] == "BOOKED"]
+
+    def cancel(self):
+        if not self.booked:
+            return self.list_patient()
+        appointment_id = self.booked.pop(self.rng.randrange(len(self.booked)))
+        self.request("cancel", "PATCH", f"/patient/appointments/{appointment_id}/cancel", self.token)
+
+    def list_admin(self):
+        self.request("list_admin", "GET", "/admin/appointments?limit=50&status=BOOKED", self.admin_token)
+
+    def admin_stats(self):
+        self.request("admin_stats", "GET", "/admin/stats", self.admin_token)
+
+    def run(self, deadline):
+        while time.perf_counter() < deadline:
+            op = self.rng.choices(self.ops, weights=self.weights)[0]
+            if self.token is None or op == "login":
+                self.login()
+                continue
+            getattr(self, op)()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(db_path, concurrency, duration, mix=None, seed=1, pool_size=8, copy=True):
+    os.environ["HMS_DB_POOL_SIZE"] = str(pool_size)
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+
+    work_path = _copy_database(db_path) if copy else db_path
+    os.environ["HMS_DB_PATH"] = work_path
+
+    from backend.app import create_app
+    from backend.db import get_pool, write_lock_stats
+    from backend.init_db import init_db
+
+    try:
+        # datasets built before later migrations are brought up to date
+        init_db()
+        app = create_app()
+        patients, free_slots = _sample_workload(work_path, rng)
+
+        admin = app.test_client().post(
+            "/admin/login", json={"username": "admin", "password": "admin123"}
+        ).get_json()["token"]
+
+        recorder = Recorder()
+        workers = [
+            Worker(app, recorder, random.Random(seed * 1000 + i), patients, free_slots, admin, mix)
+            for i in range(concurrency)
+        ]
+
+        with app.app_context():
+            pool_before = get_pool().stats()
+        lock_before = write_lock_stats()
+
+        started = time.perf_counter()
+        deadline = started + duration
+        threads = [threading.Thread(target=w.run, args=(deadline,)) for w in workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            pool = get_pool().stats()
+            get_pool().close()
+        lock = write_lock_stats()
+    finally:
+        if copy:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(work_path + suffix):
+                    os.unlink(work_path + suffix)
+
+    totals, operations = recorder.report(elapsed)
+
+    return {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "dataset": os.path.abspath(db_path),
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "pool_size": pool_size,
+            "seed": seed,
+            "mix": mix,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "totals": totals,
+        "operations": operations,
+        "db": {
+            "write_lock_acquired": lock["acquired"] - lock_before["acquired"],
+            "write_lock_wait_ms": round((lock["wait_seconds"] - lock_before["wait_seconds"]) * 1000, 2),
+            "write_lock_max_wait_ms": round(lock["max_wait_seconds"] * 1000, 2),
+            "pool_waits": pool["waits"] - pool_before["waits"],
+            "pool_wait_ms": round((pool["wait_seconds"] - pool_before["wait_seconds"]) * 1000, 2),
+            "pool_timeouts": pool["timeouts"] - pool_before["timeouts"],
+        },
+    }
+
+
+def save(report, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    stamp = report["meta"]["started_at"].replace(":", "").replace("-", "")
+    path = os.path.join(directory, f"load_test-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return path
+
+
+def compare(report, baseline):
+    """
+    Lines of per-operation throughput and latency change against `baseline`.
+    """
+    lines = [f"{'operation':<14}{'req/s':>18}{'p50 ms':>20}{'p99 ms':>20}"]
+
+    def delta(key, now, then):
+        if not then.get(key):
+            return f"{now[key]:>20}"
+        change = (now[key] - then[key]) / then[key] * 100
+        return f"{now[key]:>10} ({change:+6.1f}%)"
+
+    rows = [("total", report["totals"], baseline.get("totals", {}))]
+    rows += [
+        (op, stats, baseline.get("operations", {}).get(op, {}))
+        for op, stats in report["operations"].items()
+    ]
+    for name, now, then in rows:
+        lines.append(
+            f"{name:<14}{delta('requests_per_s', now, then):>18}"
+            f"{delta('p50_ms', now, then)}{delta('p99_ms', now, then)}"
+        )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", required=True, help="dataset built by bench.datagen")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, help="e.g. login=10,book=20,list_patient=70")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--in-place", action="store_true", help="write to --db instead of a copy")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for the JSON report")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.db, args.concurrency, args.duration,
+        mix=args.mix, seed=args.seed, pool_size=args.pool_size, copy=not args.in_place,
+    )
+
+    print(json.dumps({"totals": report["totals"], "db": report["db"]}, indent=2))
+    for op, stats in report["operations"].items():
+        print(
+            f"{op:>14}: {stats['count']:>7} req {stats['requests_per_s']:>8}/s"
+            f"  p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}"
+        )
+
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(report, json.load(f))))
+
+    print(f"saved {save(report, args.out)}")
+    return 1 if report["totals"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ type Role = "admin" | "doctor" | "patient" | null
 
 class AuthService {
   private tokenKey = "hms_token"
+  private refreshKey = "hms_refresh_token"
 
   /* ---------------- Token helpers ---------------- */
 
@@ -17,8 +18,34 @@ class AuthService {
     localStorage.setItem(this.tokenKey, token)
   }
 
+  setSession(data: { token: string; refresh_token?: string }) {
+    this.setToken(data.token)
+    if (data.refresh_token) {
+      localStorage.setItem(this.refreshKey, data.refresh_token)
+    }
+  }
+
   clear() {
     localStorage.removeItem(this.tokenKey)
+    localStorage.removeItem(this.refreshKey)
+  }
+
+  /* Access tokens are short-lived: trade the refresh token for a new one */
+  async refresh(): Promise<boolean> {
+    const refreshToken = localStorage.getItem(this.refreshKey)
+    if (!refreshToken) {
+      return false
+    }
+
+    try {
+      const res = await axios.post(`${API_BASE}/auth/refresh`, {
+        refresh_token: refreshToken,
+      })
+      this.setSession(res.data)
+      return true
+    } catch {
+      return false
+    }
   }
 
   isAuthenticated(): boolean {
@@ -37,7 +64,7 @@ class AuthService {
 
   /* ---------------- Session resolution ---------------- */
 
-  async resolveRole(): Promise<Role> {
+  async resolveRole(retry = true): Promise<Role> {
     try {
       await this.adminMe()
       return "admin"
@@ -53,6 +80,10 @@ class AuthService {
       return "patient"
     } catch {}
 
+    if (retry && (await this.refresh())) {
+      return this.resolveRole(false)
+    }
+
     this.clear()
     return null
   }
@@ -88,15 +119,18 @@ class AuthService {
       password,
     })
 
-    const token = res.data.token
-    if (!token) {
+    if (!res.data.token) {
       throw new Error("No token received")
     }
 
-    this.setToken(token)
+    this.setSession(res.data)
   }
 
   adminLogout() {
+    const refreshToken = localStorage.getItem(this.refreshKey)
+    if (refreshToken) {
+      axios.post(`${API_BASE}/auth/logout`, { refresh_token: refreshToken }).catch(() => {})
+    }
     this.clear()
   }
 }